@@ -4,16 +4,17 @@ load_dotenv()
 from langchain_core.messages import HumanMessage
 from langgraph.prebuilt import create_react_agent
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
 from configuracoes.config import CHAT_MODEL
 from tools.tool_mapa_semantico import plotar_mapa_semantico
 from tools.rag_tool import rag_url_resposta_vetorial
 from tools.inspector_tools import inspector_faiss, rag_url_resposta
 from tools.qa_tools import faiss_condicional_qa
 from tools.dataset_tools import salvar_dataset_finetuning
+from memory.curta import CheckpointerSQLite
 
 llm = ChatOpenAI(model=CHAT_MODEL, temperature=0)
-memoria = MemorySaver()
+memoria = CheckpointerSQLite()
+memoria.iniciar_limpeza_periodica()
 
 agenteReact = create_react_agent(
     llm,
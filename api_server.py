@@ -1,23 +1,20 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 import asyncio
+import json
+from contextlib import aclosing
 from dotenv import load_dotenv
 
 # Carrega variáveis de ambiente
 load_dotenv()
 
-from langchain_core.messages import HumanMessage
-from langgraph.prebuilt import create_react_agent
-from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
-from configuracoes.config import CHAT_MODEL
-
-from tools.rag_tool import rag_url_resposta_vetorial
-from tools.inspector_tools import inspector_faiss, rag_url_resposta
-from tools.qa_tools import faiss_condicional_qa
-from tools.dataset_tools import salvar_dataset_finetuning
+from configuracoes.config import CHAT_MODEL, CACHE_SEMANTICO_ATIVO, CACHE_SEMANTICO_FERRAMENTAS_EXCLUIDAS
+from utils.inicializacao import preguicoso, aquecer
+from utils.assincrono import em_thread
+from utils.metricas import rastrear, exportar
 
 # Inicialização do FastAPI
 app = FastAPI(
@@ -35,15 +32,101 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Inicialização do agente
-llm = ChatOpenAI(model=CHAT_MODEL, temperature=0)
-memoria = MemorySaver()
+# Inicialização do agente: LLM, ferramentas, índice e bancos só são carregados no primeiro
+# uso (ou no /ready), para o worker subir rápido; os imports pesados ficam dentro das fábricas
+@preguicoso("agente")
+def obter_agente():
+    from langgraph.prebuilt import create_react_agent
+    from langchain_openai import ChatOpenAI
+    from tools.rag_tool import rag_url_resposta_vetorial
+    from tools.inspector_tools import inspector_faiss, rag_url_resposta
+    from tools.qa_tools import faiss_condicional_qa
+    from tools.dataset_tools import salvar_dataset_finetuning
+    from memory.curta import CheckpointerSQLite
+    from utils.metricas_llm import callback_llm
 
-agente_react = create_react_agent(
-    llm,
-    tools=[rag_url_resposta_vetorial, rag_url_resposta, inspector_faiss, faiss_condicional_qa, salvar_dataset_finetuning],
-    checkpointer=memoria
-)
+    # stream_usage: o streaming também devolve a contagem de tokens para as métricas
+    llm = ChatOpenAI(model=CHAT_MODEL, temperature=0, callbacks=[callback_llm], stream_usage=True)
+    memoria = CheckpointerSQLite()
+    memoria.iniciar_limpeza_periodica()
+
+    return create_react_agent(
+        llm,
+        tools=[rag_url_resposta_vetorial, rag_url_resposta, inspector_faiss, faiss_condicional_qa, salvar_dataset_finetuning],
+        checkpointer=memoria
+    )
+
+# Respostas anteriores reaproveitadas para perguntas semelhantes; invalidado quando o corpus muda
+@preguicoso("cache_semantico")
+def obter_cache_semantico():
+    from memory.semantica import CacheSemantico
+    from utils.rag_memory import obter_rag_memory
+    return CacheSemantico(versao_corpus=lambda: obter_rag_memory().versao)
+
+async def _buscar_cache_semantico(pergunta: str, contexto: str):
+    """Consulta o cache semântico; falhas no cache nunca impedem o agente de responder."""
+    try:
+        cache_semantico = await em_thread(obter_cache_semantico)
+        return await cache_semantico.abuscar(pergunta, contexto)
+    except Exception as e:
+        print(f"[AVISO] Cache semântico indisponível: {e}")
+        return None
+
+async def _salvar_cache_semantico(pergunta: str, resposta: str, contexto: str | None, ferramentas: set[str]):
+    """Não guarda respostas que vieram da web ou de APIs externas."""
+    if contexto is None or ferramentas & set(CACHE_SEMANTICO_FERRAMENTAS_EXCLUIDAS):
+        return
+    try:
+        cache_semantico = await em_thread(obter_cache_semantico)
+        await cache_semantico.asalvar(pergunta, resposta, contexto)
+    except Exception as e:
+        print(f"[AVISO] Falha ao salvar no cache semântico: {e}")
+
+async def _contexto_cache(agente, config, pergunta: str) -> str | None:
+    """
+    Chave de contexto da pergunta no cache semântico: "" se ela se entende sozinha (ou é a
+    primeira da thread); senão o hash da última resposta do agente, para um "e o segundo?"
+    só reaproveitar respostas dadas depois dessa mesma resposta. None desliga o cache.
+    """
+    from langchain_core.messages import AIMessage
+    from memory.semantica import pergunta_autocontida
+    from utils.cache_embeddings import hash_conteudo
+
+    if not CACHE_SEMANTICO_ATIVO:
+        return None
+    if pergunta_autocontida(pergunta):
+        return ""
+    try:
+        estado = await agente.aget_state(config)
+    except Exception as e:
+        print(f"[AVISO] Falha ao consultar o histórico da conversa: {e}")
+        return None
+    for mensagem in reversed(estado.values.get("messages", [])):
+        if isinstance(mensagem, AIMessage) and mensagem.content:
+            return hash_conteudo(str(mensagem.content))
+    return ""
+
+async def _resposta_do_cache(agente, config, pergunta: str, contexto: str | None):
+    """
+    Resposta do cache semântico para a pergunta no seu contexto. No acerto, a pergunta e a
+    resposta são gravadas no checkpoint da thread, para o próximo turno tê-las no histórico
+    como se o agente tivesse respondido.
+    """
+    from langchain_core.messages import HumanMessage, AIMessage
+
+    if contexto is None:
+        return None
+    resposta = await _buscar_cache_semantico(pergunta, contexto)
+    if resposta is None:
+        return None
+    try:
+        await agente.aupdate_state(
+            config, {"messages": [HumanMessage(content=pergunta), AIMessage(content=resposta)]}, as_node="agent"
+        )
+    except Exception as e:
+        print(f"[AVISO] Falha ao gravar a resposta do cache no histórico: {e}")
+        return None
+    return resposta
 
 # Modelos Pydantic
 class ChatRequest(BaseModel):
@@ -58,6 +141,10 @@ class HealthResponse(BaseModel):
     status: str
     message: str
 
+class ReadyResponse(BaseModel):
+    status: str
+    tempos_ms: Dict[str, float]
+
 # Endpoints
 @app.get("/", response_model=HealthResponse)
 async def root():
@@ -69,33 +156,136 @@ async def health_check():
     """Verificação de saúde da API"""
     return HealthResponse(status="healthy", message="API está operacional")
 
+@app.get("/ready", response_model=ReadyResponse)
+async def readiness_check():
+    """
+    Prontidão do worker: carrega agente, índice FAISS, bancos e tokenizador (só na primeira
+    chamada) e responde 503 enquanto algum deles falhar. O /health não carrega nada.
+    """
+    try:
+        tempos = await em_thread(aquecer)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Recursos indisponíveis: {str(e)}")
+    return ReadyResponse(status="ready", tempos_ms={nome: round(t * 1000, 1) for nome, t in tempos.items()})
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat_with_agent(request: ChatRequest):
+async def chat_with_agent(request: ChatRequest, x_rastrear: Optional[str] = Header(default=None)):
     """
     Endpoint principal para chat com o agente
     
     - **message**: Mensagem do usuário
     - **thread_id**: ID da conversa (opcional, padrão: 'default')
+    - header **X-Rastrear: 1**: loga o tempo de cada etapa desta requisição
     """
+    from langchain_core.messages import HumanMessage, ToolMessage
+
+    with rastrear("/chat", ativo=x_rastrear == "1", thread_id=request.thread_id):
+        try:
+            agente_react = await em_thread(obter_agente)
+            config = {'configurable': {"thread_id": request.thread_id}}
+            contexto = await _contexto_cache(agente_react, config, request.message)
+            resposta_cache = await _resposta_do_cache(agente_react, config, request.message, contexto)
+            if resposta_cache is not None:
+                return ChatResponse(response=resposta_cache, thread_id=request.thread_id)
+
+            mensagem = [HumanMessage(content=request.message)]
+            
+            # Processa a mensagem através do agente
+            response_content = ""
+            ferramentas = set()
+            async for evento in agente_react.astream({"messages": mensagem}, config, stream_mode="values"):
+                if evento['messages']:
+                    last_message = evento['messages'][-1]
+                    if isinstance(last_message, ToolMessage):
+                        ferramentas.add(last_message.name)
+                    if hasattr(last_message, 'content'):
+                        response_content = last_message.content
+
+            await _salvar_cache_semantico(request.message, response_content, contexto, ferramentas)
+            
+            return ChatResponse(
+                response=response_content,
+                thread_id=request.thread_id
+            )
+            
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erro ao processar mensagem: {str(e)}")
+
+def _evento_sse(evento: str, dados: dict) -> str:
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+async def _gerar_eventos_chat(request: Request, chat: ChatRequest, rastrear_ativo: bool = False):
+    """Traduz o stream de mensagens do agente em eventos SSE (token, tool_start, tool_end, fim, erro)."""
+    with rastrear("/chat/stream", ativo=rastrear_ativo, thread_id=chat.thread_id):
+        async with aclosing(_eventos_chat(request, chat)) as eventos:
+            async for evento in eventos:
+                yield evento
+
+async def _eventos_chat(request: Request, chat: ChatRequest):
+    from langchain_core.messages import HumanMessage, AIMessageChunk, ToolMessage
+
+    agente_react = await em_thread(obter_agente)
+    config = {'configurable': {"thread_id": chat.thread_id}}
+    contexto = await _contexto_cache(agente_react, config, chat.message)
+    resposta_cache = await _resposta_do_cache(agente_react, config, chat.message, contexto)
+    if resposta_cache is not None:
+        yield _evento_sse("token", {"conteudo": resposta_cache, "no": "cache_semantico"})
+        yield _evento_sse("fim", {"thread_id": chat.thread_id})
+        return
+
+    mensagem = [HumanMessage(content=chat.message)]
+    stream = agente_react.astream({"messages": mensagem}, config, stream_mode="messages")
+    resposta_final = ""
+    ferramentas = set()
     try:
-        config = {'configurable': {"thread_id": request.thread_id}}
-        mensagem = [HumanMessage(content=request.message)]
-        
-        # Processa a mensagem através do agente
-        response_content = ""
-        async for evento in agente_react.astream({"messages": mensagem}, config, stream_mode="values"):
-            if evento['messages']:
-                last_message = evento['messages'][-1]
-                if hasattr(last_message, 'content'):
-                    response_content = last_message.content
-        
-        return ChatResponse(
-            response=response_content,
-            thread_id=request.thread_id
-        )
-        
+        async for chunk, metadata in stream:
+            # Cliente desconectou: interrompe o loop e o aclose() abaixo cancela a execução do agente
+            if await request.is_disconnected():
+                break
+
+            if isinstance(chunk, AIMessageChunk):
+                for tool_call in chunk.tool_call_chunks or []:
+                    if tool_call.get("name"):
+                        yield _evento_sse("tool_start", {"ferramenta": tool_call["name"], "id": tool_call.get("id")})
+                if chunk.content:
+                    resposta_final += chunk.content
+                    yield _evento_sse("token", {"conteudo": chunk.content, "no": metadata.get("langgraph_node")})
+            elif isinstance(chunk, ToolMessage):
+                resposta_final = ""  # só o texto gerado após a última ferramenta é a resposta final
+                ferramentas.add(chunk.name)
+                yield _evento_sse("tool_end", {"ferramenta": chunk.name, "id": chunk.tool_call_id})
+        else:
+            await _salvar_cache_semantico(chat.message, resposta_final, contexto, ferramentas)
+            yield _evento_sse("fim", {"thread_id": chat.thread_id})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao processar mensagem: {str(e)}")
+        yield _evento_sse("erro", {"detalhe": f"Erro ao processar mensagem: {str(e)}"})
+    finally:
+        await stream.aclose()
+
+@app.post("/chat/stream")
+async def chat_stream(chat: ChatRequest, request: Request, x_rastrear: Optional[str] = Header(default=None)):
+    """
+    Chat com o agente via Server-Sent Events: envia os tokens do LLM e o início/fim
+    de cada ferramenta à medida que acontecem, em vez de esperar a resposta final.
+    """
+    return StreamingResponse(
+        _gerar_eventos_chat(request, chat, rastrear_ativo=x_rastrear == "1"),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Métricas no formato do Prometheus: histogramas de duração por componente (api, no,
+    ferramenta, openai, embeddings, rag, faiss, sqlite, http, cache_semantico) e
+    operação, erros e tokens da OpenAI por modelo.
+    """
+    try:
+        conteudo, tipo = exportar()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return Response(content=conteudo, media_type=tipo)
 
 @app.get("/tools")
 async def list_tools():
@@ -0,0 +1,323 @@
+"""
+Benchmark offline do RAG: ingestão, busca, persistência, manuais e inicialização da API.
+
+Roda numa pasta temporária com um cliente de embeddings falso e determinístico (vetores
+agrupados por tópico, derivados do hash do texto) e um LLM stub que chama uma ferramenta
+e responde; nada vai para a rede. O tokenizador é o tiktoken de verdade: a codificação
+precisa estar no cache local dele.
+
+Mede:
+- add_texts: chunks/s a cada etapa de crescimento do índice, e o tempo de _persist e da compactação;
+- query (híbrida, com embedding) e search (só FAISS): p50/p99 em cada tamanho do índice;
+- busca de manuais (MatrizManuais.buscar, perguntas já embedadas): p50/p99 por tamanho da tabela;
+- import do api_server, aquecer() por recurso e /chat com o LLM stub, num processo novo.
+
+O resultado vai para um JSON (com commit e versões) para comparar execuções entre commits.
+
+Uso:
+    python benchmark_rag.py
+    python benchmark_rag.py --tamanhos 1000,5000,20000 --dim 3072 --json resultados/$(git rev-parse --short HEAD).json
+    python benchmark_rag.py --rapido --comparar resultados/anterior.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import numpy as np
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")  # o cliente OpenAI é criado no import
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+TOPICOS = 64
+
+
+class EmbeddingsFalsos:
+    """Substitui client.embeddings: mesmo texto, mesmo vetor; textos do mesmo tópico ficam próximos."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.chamadas = 0
+        self._centros = np.random.default_rng(0).standard_normal((TOPICOS, dim)).astype("float32")
+
+    def vetor(self, texto: str) -> np.ndarray:
+        semente = int.from_bytes(hashlib.sha256(texto.encode()).digest()[:8], "little")
+        ruido = np.random.default_rng(semente).standard_normal(self.dim).astype("float32")
+        return self._centros[semente % TOPICOS] + 0.7 * ruido
+
+    def create(self, model, input, dimensions=None, **kwargs):
+        self.chamadas += 1
+        textos = [input] if isinstance(input, str) else input
+        dados = []
+        for i, texto in enumerate(textos):
+            v = self.vetor(texto)[:dimensions or self.dim]
+            dados.append(types.SimpleNamespace(index=i, embedding=(v / np.linalg.norm(v)).tolist()))
+        return types.SimpleNamespace(data=dados)
+
+
+class EmbeddingsFalsosAsync(EmbeddingsFalsos):
+    async def create(self, *args, **kwargs):
+        return EmbeddingsFalsos.create(self, *args, **kwargs)
+
+
+def instalar_embeddings_falsos(dim: int):
+    import utils.embeddings as modulo
+    modulo.client = types.SimpleNamespace(embeddings=EmbeddingsFalsos(dim))
+    modulo.aclient = types.SimpleNamespace(embeddings=EmbeddingsFalsosAsync(dim))
+
+
+def instalar_llm_stub():
+    """ChatOpenAI vira um modelo que chama faiss_condicional_qa uma vez e então responde."""
+    import langchain_openai
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import AIMessage, ToolMessage
+    from langchain_core.outputs import ChatResult, ChatGeneration
+
+    class LLMStub(BaseChatModel):
+        @property
+        def _llm_type(self):
+            return "stub"
+
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            if any(isinstance(m, ToolMessage) for m in messages):
+                mensagem = AIMessage(content="Resposta do benchmark.")
+            else:
+                pergunta = messages[-1].content
+                mensagem = AIMessage(content="", tool_calls=[
+                    {"name": "faiss_condicional_qa", "args": {"pergunta": pergunta}, "id": "benchmark"}
+                ])
+            return ChatResult(generations=[ChatGeneration(message=mensagem)])
+
+    langchain_openai.ChatOpenAI = lambda *args, **kwargs: LLMStub()
+
+
+def texto_chunk(i: int) -> str:
+    return (f"Manual {i // 50}, seção {i % 50}: para configurar o parâmetro P{i} acesse "
+            f"Cadastros > Módulo {i % 37} e informe o código {1000 + i}. Assunto {i % TOPICOS}.")
+
+
+def _percentis(latencias_ms: list[float]) -> dict:
+    lat = np.array(latencias_ms) if latencias_ms else np.zeros(1)
+    return {"p50_ms": float(np.percentile(lat, 50)), "p99_ms": float(np.percentile(lat, 99)), "n": len(latencias_ms)}
+
+
+def _cronometrar(funcao, argumentos) -> list[float]:
+    latencias = []
+    for args in argumentos:
+        inicio = time.perf_counter()
+        funcao(*args)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return latencias
+
+
+def medir_ingestao_e_busca(tamanhos: list[int], dim: int, lote: int, consultas: int) -> list[dict]:
+    """Cresce o índice etapa a etapa; em cada tamanho mede ingestão, persistência e busca."""
+    from utils.rag_memory import RAGMemory
+
+    rag = RAGMemory(embed_dim=dim)
+    tempos_persist = []
+    persist_original = rag._persist
+
+    def persist_cronometrado(*args, **kwargs):
+        inicio = time.perf_counter()
+        persist_original(*args, **kwargs)
+        tempos_persist.append((time.perf_counter() - inicio) * 1000)
+
+    rag._persist = persist_cronometrado
+    rng = np.random.default_rng(1)
+    etapas = []
+    for tamanho in tamanhos:
+        inicial = rag.index.ntotal
+        tempos_persist.clear()
+        inicio = time.perf_counter()
+        for i in range(inicial, tamanho, lote):
+            rag.add_texts([texto_chunk(j) for j in range(i, min(i + lote, tamanho))], url=f"http://bench/{i // lote}")
+        duracao = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        rag.compactar()
+        compactacao = time.perf_counter() - inicio
+
+        ids = rng.choice(tamanho, min(consultas, tamanho), replace=False)
+        perguntas = [(f"Como configuro o parâmetro do assunto {i % TOPICOS} no módulo {i % 37}?",) for i in ids]
+        exatas = [(f"código {1000 + int(i)}",) for i in ids]
+        vetores = [(rag.embed_text(texto_chunk(int(i))).reshape(1, -1), 3) for i in ids]
+        etapas.append({
+            "chunks": rag.index.ntotal,
+            "backend": type(rag.index.base).__name__,
+            "ingestao_chunks_por_s": (tamanho - inicial) / duracao if duracao else 0.0,
+            "persist": _percentis(tempos_persist),
+            "compactacao_s": compactacao,
+            "query": _percentis(_cronometrar(rag.query, perguntas)),
+            "query_exata": _percentis(_cronometrar(rag.query, exatas)),
+            "search": _percentis(_cronometrar(rag.search, vetores)),
+        })
+        e = etapas[-1]
+        print(f"[{e['chunks']:>7} chunks, {e['backend']}] ingestão {e['ingestao_chunks_por_s']:.0f} chunks/s, "
+              f"_persist p50 {e['persist']['p50_ms']:.2f} ms, compactação {compactacao:.2f} s, "
+              f"query p50/p99 {e['query']['p50_ms']:.2f}/{e['query']['p99_ms']:.2f} ms, "
+              f"exata p50 {e['query_exata']['p50_ms']:.2f} ms, search p50 {e['search']['p50_ms']:.2f} ms")
+    if rag._trava is not None:
+        rag._trava.close()  # libera a trava de escritor para o processo da medição de inicialização
+    return etapas
+
+
+def medir_manuais(tamanhos: list[int], consultas: int) -> list[dict]:
+    """
+    Latência da busca de manuais por tamanho da tabela. Os vetores das perguntas são
+    gerados uma vez, antes de tudo, para medir só a matriz (e não o cache de embeddings).
+    """
+    from utils.embeddings import gerar_embeddings
+    from utils.sqlite_manuais import inserir_manuais_com_embedding, obter_matriz_manuais
+
+    os.makedirs("db", exist_ok=True)
+    vetores = gerar_embeddings([f"Onde fica o manual do módulo {i}?" for i in range(consultas)])
+    matriz = obter_matriz_manuais()
+    resultados = []
+    atual = 0
+    for tamanho in tamanhos:
+        inserir_manuais_com_embedding([(f"Manual do módulo {i}", f"http://bench/manual/{i}") for i in range(atual, tamanho)])
+        atual = tamanho
+        inicio = time.perf_counter()
+        matriz.buscar(vetores[0])  # recarrega a matriz após as inclusões
+        primeira = (time.perf_counter() - inicio) * 1000
+        resultado = {"manuais": tamanho, "primeira_ms": primeira,
+                     **_percentis(_cronometrar(matriz.buscar, [(v,) for v in vetores]))}
+        resultados.append(resultado)
+        print(f"[{tamanho:>7} manuais] busca p50/p99 {resultado['p50_ms']:.2f}/{resultado['p99_ms']:.2f} ms "
+              f"(primeira, com carga: {primeira:.1f} ms)")
+    return resultados
+
+
+def _inicializacao(dim: int, chats: int):
+    """Roda num processo novo (cwd = pasta do benchmark) e imprime o resultado em JSON."""
+    inicio = time.perf_counter()
+    import api_server
+    importacao = time.perf_counter() - inicio
+    instalar_embeddings_falsos(dim)
+    instalar_llm_stub()
+    from utils.inicializacao import aquecer
+    inicio = time.perf_counter()
+    tempos = aquecer()
+    aquecimento = time.perf_counter() - inicio
+
+    from fastapi.testclient import TestClient
+    cliente = TestClient(api_server.app)
+    latencias = []
+    for i in range(chats):
+        inicio = time.perf_counter()
+        r = cliente.post("/chat", json={"message": f"Como configuro o código {1000 + i}?", "thread_id": f"bench-{i}"})
+        r.raise_for_status()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    print(json.dumps({
+        "import_api_server_s": importacao,
+        "aquecer_s": aquecimento,
+        "aquecer_por_recurso_s": tempos,
+        "chat_stub": _percentis(latencias),
+    }))
+
+
+def medir_inicializacao(pasta: str, dim: int, chats: int) -> dict:
+    ambiente = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [RAIZ, os.environ.get("PYTHONPATH")]))}
+    r = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--_inicializacao", "--dim", str(dim), "--chats", str(chats)],
+        cwd=pasta, env=ambiente, capture_output=True, text=True
+    )
+    if r.returncode != 0:
+        print(f"[AVISO] Medição de inicialização falhou:\n{r.stderr[-2000:]}")
+        return {"erro": r.stderr[-2000:]}
+    resultado = json.loads(r.stdout.strip().splitlines()[-1])
+    print(f"import api_server {resultado['import_api_server_s']:.2f} s, aquecer() {resultado['aquecer_s']:.2f} s, "
+          f"/chat (LLM stub) p50 {resultado['chat_stub']['p50_ms']:.1f} ms")
+    return resultado
+
+
+def _metadados(args) -> dict:
+    import faiss
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "data": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "faiss": faiss.__version__, "numpy": np.__version__, "cpus": os.cpu_count(),
+            "parametros": {k: v for k, v in vars(args).items() if not k.startswith("_") and k != "comparar"}}
+
+
+def comparar(atual: dict, anterior: dict):
+    """Variação das latências p50 entre duas execuções, por tamanho."""
+    meta = anterior.get("metadados", {})
+    print(f"\nComparação com {meta.get('commit') or 'sem commit'} de {meta.get('data')} (p50, positivo = mais lento agora):")
+    pares = [("busca", "chunks", ("query", "query_exata", "search", "persist")), ("manuais", "manuais", (None,))]
+    for secao, chave, metricas in pares:
+        antes = {linha[chave]: linha for linha in anterior.get(secao, [])}
+        for linha in atual.get(secao, []):
+            if linha[chave] not in antes:
+                continue
+            for metrica in metricas:
+                a = antes[linha[chave]][metrica]["p50_ms"] if metrica else antes[linha[chave]]["p50_ms"]
+                b = linha[metrica]["p50_ms"] if metrica else linha["p50_ms"]
+                variacao = (b - a) / a if a else 0.0
+                print(f"  {secao} {chave}={linha[chave]} {metrica or 'busca'}: {a:.2f} -> {b:.2f} ms ({variacao:+.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", default="1000,5000,20000", help="tamanhos do índice medidos, em chunks")
+    parser.add_argument("--manuais", default="100,1000,10000", help="tamanhos da tabela de manuais medidos")
+    parser.add_argument("--dim", type=int, default=None, help="dimensão dos embeddings (padrão EMBED_DIM)")
+    parser.add_argument("--lote", type=int, default=50, help="chunks por add_texts (uma página)")
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=20, help="requisições /chat com o LLM stub")
+    parser.add_argument("--rapido", action="store_true", help="tamanhos pequenos, para conferir se tudo roda")
+    parser.add_argument("--json", default="benchmark_resultados.json", help="arquivo de saída")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    parser.add_argument("--_inicializacao", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    from configuracoes.config import EMBED_DIM
+    args.dim = args.dim or EMBED_DIM
+    if args._inicializacao:
+        _inicializacao(args.dim, args.chats)
+        return
+    if args.rapido:
+        args.tamanhos, args.manuais, args.consultas, args.chats = "500,2000", "100,1000", 50, 5
+
+    saida = os.path.abspath(args.json)
+    diretorio_original = os.getcwd()
+    pasta = tempfile.mkdtemp(prefix="benchmark_rag_")
+    os.chdir(pasta)  # todos os caminhos da configuração são relativos
+    try:
+        instalar_embeddings_falsos(args.dim)
+        resultado = {"metadados": _metadados(args)}
+        resultado["busca"] = medir_ingestao_e_busca(
+            [int(t) for t in args.tamanhos.split(",")], args.dim, args.lote, args.consultas
+        )
+        resultado["manuais"] = medir_manuais([int(t) for t in args.manuais.split(",")], args.consultas)
+        resultado["inicializacao"] = medir_inicializacao(pasta, args.dim, args.chats)
+    finally:
+        os.chdir(diretorio_original)
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    pasta_saida = os.path.dirname(saida)
+    if pasta_saida:
+        os.makedirs(pasta_saida, exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados em {saida}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(resultado, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,10 @@ load_dotenv()
 
 # Configurações da API
 API_KEY = os.environ.get("OPENAI_API_KEY")
-EMBED_DIM = 3072  # text-embedding-3-large
+EMBED_DIM_MODELO = 3072  # dimensão nativa do text-embedding-3-large
+# Dimensão usada no índice e nos manuais; o text-embedding-3-* devolve vetores mais curtos
+# (parâmetro "dimensions"). Ao mudar, rode python -m utils.migrar_embeddings
+EMBED_DIM = 3072
 
 # Caminhos dos arquivos
 CAMINHO_FAISS = "faiss/faiss_full_rag.index"
@@ -20,5 +23,99 @@ TOKENIZER_ENCODING = "cl100k_base"
 
 # Configurações de chunking
 MAX_TOKENS_PER_CHUNK = 500
+CHUNK_SOBREPOSICAO_TOKENS = 60  # tokens do fim de um chunk repetidos no início do seguinte
+HTML_TAMANHO_LEITURA = 64 * 1024  # caracteres de HTML entregues ao parser por vez
 DEFAULT_TOP_K = 3
-DEFAULT_SIMILARITY_THRESHOLD = 0.5  # Reduzido de 0.75 para 0.5
\ No newline at end of file
+CONTEXTO_MAX_TOKENS = 1500  # orçamento de tokens do contexto montado para o LLM
+CONTEXTO_MIN_TOKENS_CAUDA = 40  # abaixo disso o último chunk é descartado em vez de cortado
+DEFAULT_SIMILARITY_THRESHOLD = 0.5  # similaridade de cosseno mínima (índice de produto interno sobre vetores normalizados)
+BUSCA_HIBRIDA = True  # funde a busca vetorial com a léxica (FTS5/BM25) por reciprocal rank fusion
+BUSCA_CANDIDATOS = 20  # candidatos de cada busca antes da fusão
+RRF_K = 60  # constante do RRF; maior = posições pesam menos
+BUSCA_EXATA_MAX_TERMOS = 4  # perguntas com até N termos, algum exato (código, campo, "frase"), usam só o FTS
+
+# Configurações de embeddings em lote
+EMBED_BATCH_SIZE = 64  # textos por requisição ao endpoint de embeddings
+EMBED_MAX_CONCORRENCIA = 4  # lotes em voo ao mesmo tempo
+EMBED_MAX_TENTATIVAS = 6
+EMBED_BACKOFF_INICIAL = 1.0  # segundos, dobra a cada tentativa
+EMBED_BACKOFF_MAXIMO = 30.0
+
+# Agrupamento das consultas de requisições concorrentes num só pedido de embeddings
+EMBED_AGRUPAR_MAX_LOTE = 64  # textos por pedido agrupado
+EMBED_AGRUPAR_ESPERA = 0.005  # segundos que o primeiro texto espera por companhia
+
+# Cache persistente de embeddings
+CAMINHO_CACHE_EMBEDDINGS = "cache/embeddings.db"
+EMBED_CACHE_MAX_ITENS = 100_000  # entradas; as menos usadas recentemente são removidas
+
+# Persistência incremental do FAISS
+CAMINHO_SEGMENTOS_FAISS = "faiss/segmentos"
+COMPACTAR_APOS_SEGMENTOS = 16  # segmentos pendentes que disparam a compactação em segundo plano
+RAG_DELTA_MAX_VETORES = 4096  # vetores recentes fora da base; acima disso a base é consolidada em segundo plano
+
+# Vários workers: um único processo escritor publica versões do índice; os workers leitores
+# as abrem mapeadas em memória e enfileiram suas inclusões para o escritor (utils/escritor_indice.py)
+RAG_MODO = os.environ.get("RAG_MODO", "escritor")  # "escritor" (processo único) ou "leitor"
+CAMINHO_VERSOES_FAISS = "faiss/versoes"
+RAG_VERSOES_MANTIDAS = 3
+RAG_INTERVALO_RECARGA = 2.0  # segundos entre verificações de nova versão/segmentos nos leitores
+CAMINHO_FILA_INGESTAO = "faiss/fila_ingestao.db"
+RAG_INTERVALO_FILA = 0.2  # segundos entre leituras da fila pelo escritor
+RAG_ESPERA_INGESTAO = 30  # segundos que um leitor espera o escritor indexar o que enfileirou
+
+# Backend do índice FAISS: "flat" (exato), "ivf_flat", "hnsw" ou "ivf_pq"
+FAISS_INDEX_TIPO = "ivf_flat"
+FAISS_MIN_VETORES_TREINO = 10_000  # abaixo disso os IVF continuam flat (busca exata já é rápida)
+FAISS_IVF_NLIST = 256  # número de listas invertidas
+FAISS_NPROBE = 16  # listas visitadas por consulta (padrão; ajustável por consulta)
+FAISS_HNSW_M = 32
+FAISS_EF_SEARCH = 64  # tamanho da fila de busca do HNSW (padrão; ajustável por consulta)
+FAISS_EF_SEARCH_FILTRADO = 256  # efSearch mínimo nas buscas restritas a um manual/URL/categoria
+FAISS_FILTRO_EXATO_MAX_IDS = 2048  # buscas restritas a até N ids comparam só os vetores deles, sem percorrer o índice
+FAISS_PQ_M = 64  # subquantizadores do PQ; precisa dividir EMBED_DIM
+# Armazenamento dos vetores no FAISS (scalar quantizer) e em manuais.embedding:
+# "nenhuma" (float32), "fp16" (metade) ou "int8" (um quarto). Ao mudar, rode python -m utils.migrar_embeddings
+EMBED_QUANTIZACAO = "nenhuma"
+FAISS_MIN_VETORES_SQ8 = 1000  # vetores para treinar os intervalos do int8; antes disso a base fica float32
+
+# Execução assíncrona das ferramentas
+TOOLS_MAX_THREADS = 8  # pool limitado para FAISS, BeautifulSoup e SQLite fora do event loop
+HTTP_TIMEOUT = 30  # segundos
+HTTP_POOL_MAXSIZE = 16  # conexões mantidas por host na sessão compartilhada
+
+# Cache de páginas das ferramentas de URL
+CAMINHO_CACHE_PAGINAS = "cache/paginas.db"
+PAGINA_CACHE_TTL = 3600  # segundos em que a página é usada sem revalidar; depois, GET condicional
+
+# Cache semântico de respostas (memory/semantica.py)
+CACHE_SEMANTICO_ATIVO = True
+CACHE_SEMANTICO_LIMIAR = 0.95  # similaridade de cosseno mínima entre perguntas
+CACHE_SEMANTICO_TTL = 24 * 3600  # segundos
+CACHE_SEMANTICO_MAX_ITENS = 1000
+# Respostas que usaram estas ferramentas (web, APIs externas) mudam com o tempo e não entram no cache
+CACHE_SEMANTICO_FERRAMENTAS_EXCLUIDAS = ("procura_web",)
+
+# Memória curta das conversas (memory/curta.py)
+CAMINHO_CHECKPOINTS = "db/checkpoints.db"
+CHECKPOINT_TTL = 7 * 24 * 3600  # segundos sem acesso até a conversa expirar
+CHECKPOINT_MAX_THREADS = 5000  # conversas mantidas; as menos recentes saem primeiro
+CHECKPOINT_INTERVALO_LIMPEZA = 600  # segundos entre limpezas em segundo plano
+
+# Armazém de chunks (texto e metadados por id do FAISS; substitui CAMINHO_META, que só é lido para migrar)
+CAMINHO_CHUNKS = "faiss/chunks.db"
+
+# Ingestão em lote de manuais (utils/ingerir_manuais.py)
+CAMINHO_PROGRESSO_INGESTAO = "db/ingestao.db"
+INGESTAO_CONCORRENCIA = 16  # downloads simultâneos
+INGESTAO_PROCESSOS = os.cpu_count() or 2  # processos para parsing e chunking
+INGESTAO_LOTE_PAGINAS = 50  # páginas por lote de embeddings/gravação
+
+# Métricas Prometheus (GET /metrics) e rastreamento por requisição (utils/metricas.py)
+# Com vários workers, defina PROMETHEUS_MULTIPROC_DIR para o /metrics somar todos os processos
+METRICAS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)  # segundos
+RASTREAR_REQUISICOES = os.environ.get("RASTREAR_REQUISICOES") == "1"  # loga os spans de todo /chat; ou só com o header X-Rastrear: 1
+
+# Roteador local de intenções do grafo de raciocínio (workflows/intencoes.py)
+ROTEADOR_LIMIAR = 0.30  # similaridade de cosseno mínima com o centróide da intenção vencedora
+ROTEADOR_MARGEM = 0.05  # vantagem mínima da rota vencedora sobre a outra; abaixo de um dos dois, decide o LLM
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import threading
+import time
+from langgraph.checkpoint.sqlite import SqliteSaver
+from utils.assincrono import em_thread
+from configuracoes.config import (
+    CAMINHO_CHECKPOINTS, CHECKPOINT_TTL, CHECKPOINT_MAX_THREADS, CHECKPOINT_INTERVALO_LIMPEZA
+)
+
+
+class CheckpointerSQLite(SqliteSaver):
+    """
+    Memória curta das conversas: checkpointer do LangGraph em SQLite, em vez do MemorySaver.
+    Sobrevive a reinícios e mantém o uso limitado: threads sem acesso há mais de `ttl`
+    segundos expiram, só as `max_threads` usadas mais recentemente são mantidas, e uma
+    limpeza periódica em segundo plano remove as excedentes e devolve o espaço ao disco.
+    Os métodos assíncronos rodam a implementação síncrona no pool das ferramentas.
+    """
+
+    def __init__(self, caminho: str = CAMINHO_CHECKPOINTS, ttl: float = CHECKPOINT_TTL,
+                 max_threads: int = CHECKPOINT_MAX_THREADS, intervalo_limpeza: float = CHECKPOINT_INTERVALO_LIMPEZA):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        conn = sqlite3.connect(caminho, check_same_thread=False)
+        # Só tem efeito em banco novo; permite devolver páginas livres sem VACUUM completo
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        super().__init__(conn)
+        self.ttl = ttl
+        self.max_threads = max_threads
+        self.intervalo_limpeza = intervalo_limpeza
+        self._parar = threading.Event()
+        self._thread_limpeza = None
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS threads_acesso (
+                thread_id TEXT PRIMARY KEY,
+                ultimo_acesso REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_threads_acesso ON threads_acesso (ultimo_acesso)")
+        self.conn.commit()
+
+    def _tocar(self, thread_id: str):
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT INTO threads_acesso (thread_id, ultimo_acesso) VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET ultimo_acesso = excluded.ultimo_acesso",
+                (thread_id, time.time())
+            )
+
+    def get_tuple(self, config):
+        resultado = super().get_tuple(config)
+        if resultado is not None:
+            self._tocar(str(config["configurable"]["thread_id"]))
+        return resultado
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        resultado = super().put(config, checkpoint, metadata, new_versions)
+        self._tocar(str(config["configurable"]["thread_id"]))
+        return resultado
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM threads_acesso WHERE thread_id = ?", (str(thread_id),))
+
+    def limpar(self) -> int:
+        """Remove threads expiradas e as menos usadas além de `max_threads`. Retorna quantas saíram."""
+        limite = time.time() - self.ttl
+        with self.cursor(transaction=False) as cur:
+            expiradas = [r[0] for r in cur.execute(
+                "SELECT thread_id FROM threads_acesso WHERE ultimo_acesso < ?", (limite,)
+            )]
+            excedentes = [r[0] for r in cur.execute(
+                "SELECT thread_id FROM threads_acesso WHERE ultimo_acesso >= ? "
+                "ORDER BY ultimo_acesso DESC LIMIT -1 OFFSET ?", (limite, self.max_threads)
+            )]
+        removidas = expiradas + excedentes
+        for thread_id in removidas:
+            self.delete_thread(thread_id)
+        if removidas:
+            with self.cursor() as cur:
+                cur.execute("PRAGMA incremental_vacuum")
+            with self.cursor(transaction=False) as cur:
+                cur.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return len(removidas)
+
+    def iniciar_limpeza_periodica(self):
+        """Dispara a limpeza em segundo plano a cada `intervalo_limpeza` segundos."""
+        if self._thread_limpeza is not None:
+            return
+
+        def _loop():
+            while not self._parar.wait(self.intervalo_limpeza):
+                try:
+                    removidas = self.limpar()
+                    if removidas:
+                        print(f"[INFO] Checkpointer: {removidas} conversas removidas")
+                except Exception as e:
+                    print(f"[AVISO] Falha na limpeza do checkpointer: {e}")
+
+        self._thread_limpeza = threading.Thread(target=_loop, name="limpeza-checkpoints", daemon=True)
+        self._thread_limpeza.start()
+
+    def parar_limpeza_periodica(self):
+        self._parar.set()
+
+    async def aget_tuple(self, config):
+        return await em_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        resultados = await em_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for resultado in resultados:
+            yield resultado
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await em_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await em_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await em_thread(self.delete_thread, thread_id)
+
+    async def aget_delta_channel_history(self, *, config, channels):
+        return await em_thread(lambda: self.get_delta_channel_history(config=config, channels=channels))
@@ -1,13 +1,14 @@
-from openai import OpenAI
 from dotenv import load_dotenv
+from utils.embeddings import gerar_embeddings
 
 load_dotenv()
 
 class EmbeddingsGenerator:
     def __init__(self, model: str = "text-embedding-3-large"):
-        self.client = OpenAI()
         self.model = model
 
     def embed(self, text: str) -> list[float]:
-        resp = self.client.embeddings.create(model=self.model, input=text)
-        return resp.data[0].embedding
+        return gerar_embeddings([text], modelo=self.model)[0].tolist()
+
+    def embed_many(self, texts: list[str]) -> list[list[float]]:
+        return gerar_embeddings(texts, modelo=self.model).tolist()
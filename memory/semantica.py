@@ -0,0 +1,148 @@
+import re
+import threading
+import time
+import numpy as np
+import faiss
+from utils.embeddings import gerar_embedding, agerar_embedding
+from utils.metricas import medido
+from configuracoes.config import (
+    EMBED_DIM, CACHE_SEMANTICO_LIMIAR, CACHE_SEMANTICO_TTL, CACHE_SEMANTICO_MAX_ITENS
+)
+
+
+# Palavras que apontam para turnos anteriores ("e esse?", "como faço isso?")
+_REFERENCIAS = frozenset("""
+isso isto disso nisso desse dessa nesse nessa esse essa esses essas ele ela eles elas dele dela
+deles delas aquilo daquilo anterior acima
+""".split())
+_CONECTIVOS_INICIAIS = frozenset("e mas então entao também tambem ok".split())
+
+
+def pergunta_autocontida(pergunta: str) -> bool:
+    """
+    Heurística conservadora: a pergunta se entende sem os turnos anteriores (tem pelo
+    menos 4 palavras, não começa com "e"/"mas"/"então" e não usa pronomes de referência).
+    """
+    palavras = re.findall(r"\w+", pergunta.lower())
+    return len(palavras) >= 4 and palavras[0] not in _CONECTIVOS_INICIAIS and not _REFERENCIAS.intersection(palavras)
+
+
+class CacheSemantico:
+    """
+    Cache de respostas por similaridade de pergunta. As perguntas ficam num índice FAISS
+    de produto interno sobre vetores normalizados (cosseno) e cada id aponta para a resposta
+    final do agente. Entradas expiram por TTL, as menos usadas saem quando passa de
+    `max_itens`, e tudo é descartado quando `versao_corpus()` muda (novos chunks indexados).
+
+    Cada entrada tem um `contexto`: "" para perguntas que se entendem sozinhas, ou uma
+    chave do turno anterior (ver api_server). Só entradas do mesmo contexto são reaproveitadas.
+    """
+
+    def __init__(self, versao_corpus, dim: int = EMBED_DIM, limiar: float = CACHE_SEMANTICO_LIMIAR,
+                 ttl: float = CACHE_SEMANTICO_TTL, max_itens: int = CACHE_SEMANTICO_MAX_ITENS):
+        self.versao_corpus = versao_corpus
+        self.dim = dim
+        self.limiar = limiar
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self.acertos = 0
+        self.faltas = 0
+        self._lock = threading.Lock()
+        self._limpar()
+
+    def _limpar(self):
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+        self.entradas = {}  # id -> {"pergunta", "resposta", "contexto", "criado_em", "ultimo_acesso"}
+        self._proximo_id = 0
+        self._versao = self.versao_corpus()
+
+    @staticmethod
+    def _normalizar(vetor: np.ndarray) -> np.ndarray:
+        vetor = np.asarray(vetor, dtype="float32").reshape(1, -1)
+        return vetor / max(float(np.linalg.norm(vetor)), 1e-12)
+
+    def _remover(self, ids: list[int]):
+        if ids:
+            self.index.remove_ids(np.array(ids, dtype="int64"))
+            for id_ in ids:
+                self.entradas.pop(id_, None)
+
+    def _remover_expirados(self, agora: float):
+        self._remover([i for i, e in self.entradas.items() if agora - e["criado_em"] > self.ttl])
+
+    def _validar_versao(self):
+        versao = self.versao_corpus()
+        if versao != self._versao:
+            self._limpar()
+
+    def _buscar_vetor(self, vetor: np.ndarray, contexto: str = ""):
+        with self._lock:
+            self._validar_versao()
+            agora = time.time()
+            self._remover_expirados(agora)
+            entrada, sim = None, 0.0
+            if self.index.ntotal:
+                # Todas as perguntas acima do limiar, da mais para a menos parecida
+                _, D, I = self.index.range_search(self._normalizar(vetor), self.limiar)
+                for posicao in np.argsort(-D):
+                    candidata = self.entradas.get(int(I[posicao]))
+                    if candidata is not None and candidata["contexto"] == contexto:
+                        entrada, sim = candidata, float(D[posicao])
+                        break
+            if entrada is None:
+                self.faltas += 1
+                return None
+            entrada["ultimo_acesso"] = agora
+            self.acertos += 1
+            print(f"[INFO] Cache semântico: acerto (sim={sim:.3f}) para '{entrada['pergunta'][:60]}'")
+            return entrada["resposta"]
+
+    def _salvar_vetor(self, pergunta: str, vetor: np.ndarray, resposta: str, contexto: str = ""):
+        with self._lock:
+            self._validar_versao()
+            agora = time.time()
+            self._remover_expirados(agora)
+            excedente = len(self.entradas) + 1 - self.max_itens
+            if excedente > 0:
+                menos_usados = sorted(self.entradas, key=lambda i: self.entradas[i]["ultimo_acesso"])[:excedente]
+                self._remover(menos_usados)
+
+            id_ = self._proximo_id
+            self._proximo_id += 1
+            self.index.add_with_ids(self._normalizar(vetor), np.array([id_], dtype="int64"))
+            self.entradas[id_] = {"pergunta": pergunta, "resposta": resposta, "contexto": contexto,
+                                  "criado_em": agora, "ultimo_acesso": agora}
+
+    @medido("cache_semantico", "buscar")
+    def buscar(self, pergunta: str, contexto: str = ""):
+        """Resposta em cache para uma pergunta semelhante feita no mesmo contexto, ou None."""
+        return self._buscar_vetor(gerar_embedding(pergunta), contexto)
+
+    @medido("cache_semantico", "salvar")
+    def salvar(self, pergunta: str, resposta: str, contexto: str = ""):
+        if resposta:
+            self._salvar_vetor(pergunta, gerar_embedding(pergunta), resposta, contexto)
+
+    @medido("cache_semantico", "buscar")
+    async def abuscar(self, pergunta: str, contexto: str = ""):
+        return self._buscar_vetor(await agerar_embedding(pergunta), contexto)
+
+    @medido("cache_semantico", "salvar")
+    async def asalvar(self, pergunta: str, resposta: str, contexto: str = ""):
+        if resposta:
+            self._salvar_vetor(pergunta, await agerar_embedding(pergunta), resposta, contexto)
+
+    def invalidar(self):
+        with self._lock:
+            self._limpar()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            consultas = self.acertos + self.faltas
+            return {
+                "acertos": self.acertos,
+                "faltas": self.faltas,
+                "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+                "itens": len(self.entradas),
+                "max_itens": self.max_itens,
+            }
@@ -1,6 +1,10 @@
 import faiss
 import pickle
 import os
+from utils.indices_faiss import (
+    criar_index, aplicar_parametros_padrao, precisa_migrar, migrar_index, buscar,
+    normalizar, usa_cosseno, migrar_para_cosseno
+)
 
 class FAISSVectorStore:
     def __init__(self, dim: int = 3072, index_path: str = "faiss_index.index", meta_path: str = "faiss_meta.pkl"):
@@ -9,25 +13,29 @@ class FAISSVectorStore:
         self.meta_path = meta_path
 
         if os.path.exists(index_path):
-            self.index = faiss.read_index(index_path)
+            self.index = aplicar_parametros_padrao(faiss.read_index(index_path))
             with open(meta_path, "rb") as f:
                 self.meta = pickle.load(f)
+            if not usa_cosseno(self.index):
+                self.index = migrar_para_cosseno(self.index)
         else:
-            self.index = faiss.IndexFlatL2(dim)
+            self.index = criar_index(dim, "flat", quantizacao="nenhuma")
             self.meta = []
 
     def add(self, texts: list[str], embeddings: list[list[float]]):
         import numpy as np
-        vecs = np.array(embeddings).astype("float32")
+        vecs = normalizar(np.array(embeddings).astype("float32"))
         self.index.add(vecs)
+        if precisa_migrar(self.index):
+            self.index = migrar_index(self.index)
         self.meta.extend(texts)
         self.save()
 
-    def search(self, query_embedding: list[float], k: int = 5):
+    def search(self, query_embedding: list[float], k: int = 5, nprobe: int = None, ef_search: int = None):
         import numpy as np
-        vec = np.array([query_embedding]).astype("float32")
-        D, I = self.index.search(vec, k)
-        results = [self.meta[i] for i in I[0] if i < len(self.meta)]
+        vec = normalizar(np.array([query_embedding]).astype("float32"))
+        D, I = buscar(self.index, vec, k, nprobe=nprobe, ef_search=ef_search)
+        results = [self.meta[i] for i in I[0] if 0 <= i < len(self.meta)]
         return results
 
     def save(self):
@@ -12,6 +12,14 @@ def test_health():
     print(f"Response: {response.json()}")
     print()
 
+def test_ready():
+    """Testa o endpoint de prontidão (carrega os recursos na primeira chamada)"""
+    print("=== Testando Readiness ===")
+    response = requests.get(f"{BASE_URL}/ready")
+    print(f"Status: {response.status_code}")
+    print(f"Response: {response.json()}")
+    print()
+
 def test_tools():
     """Lista as ferramentas disponíveis"""
     print("=== Listando Ferramentas ===")
@@ -46,6 +54,29 @@ def test_chat(message, thread_id="test-thread"):
         print(f"Erro: {response.text}")
     print()
 
+def test_chat_stream(message="Como emitir uma nota fiscal?", thread_id="test-stream"):
+    """Testa o endpoint de chat com streaming (SSE)"""
+    print(f"=== Testando Chat Stream: '{message}' ===")
+
+    payload = {
+        "message": message,
+        "thread_id": thread_id
+    }
+
+    with requests.post(f"{BASE_URL}/chat/stream", json=payload, stream=True) as response:
+        print(f"Status: {response.status_code}")
+        evento = None
+        for linha in response.iter_lines(decode_unicode=True):
+            if linha.startswith("event: "):
+                evento = linha[len("event: "):]
+            elif linha.startswith("data: "):
+                dados = json.loads(linha[len("data: "):])
+                if evento == "token":
+                    print(dados["conteudo"], end="", flush=True)
+                else:
+                    print(f"\n[{evento}] {dados}")
+    print()
+
 def main():
     """Executa todos os testes"""
     print("🚀 Testando API do Agente Multimodal\n")
@@ -53,6 +84,7 @@ def main():
     try:
         # Teste de saúde
         test_health()
+        test_ready()
         
         # Lista ferramentas
         test_tools()
@@ -61,6 +93,9 @@ def main():
         test_chat("Olá! Como você pode me ajudar?")
         test_chat("Como emitir uma nota fiscal?")
         test_chat("Qual é o status de uma nota fiscal transmitida?")
+
+        # Teste de streaming
+        test_chat_stream()
         
     except requests.exceptions.ConnectionError:
         print("❌ Erro: Não foi possível conectar à API.")
@@ -0,0 +1,163 @@
+"""
+Teste de estresse da RAGMemory: várias threads buscando sem parar enquanto outras indexam.
+
+Roda numa pasta temporária, com embeddings determinísticos (a API não é chamada), e
+verifica que:
+- todo id devolvido por uma busca já tem texto no armazém de chunks;
+- o primeiro resultado é o próprio texto consultado (o vetor e o texto não se desalinham);
+- buscas filtradas por URL só devolvem chunks daquela URL;
+- a versão vista por cada leitor nunca diminui;
+- depois de recarregar do disco, índice e armazém têm o mesmo tamanho.
+Mostra também a latência das buscas durante a ingestão.
+
+Uso:
+    python test_concorrencia_rag.py
+    python test_concorrencia_rag.py --leitores 16 --escritores 4 --lotes 100
+"""
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+
+os.environ.setdefault("OPENAI_API_KEY", "teste")  # o cliente OpenAI é criado no import
+
+DIM = 64
+
+
+def embedding_fake(texto: str) -> np.ndarray:
+    semente = int.from_bytes(hashlib.sha256(texto.encode()).digest()[:8], "little")
+    return np.random.default_rng(semente).standard_normal(DIM).astype("float32")
+
+
+def embeddings_fake(textos, *args, **kwargs) -> np.ndarray:
+    if not textos:
+        return np.empty((0, DIM), dtype="float32")
+    return np.vstack([embedding_fake(t) for t in textos])
+
+
+def test_concorrencia(leitores=8, escritores=2, lotes=40, por_lote=25, delta_max=128, compactar_apos=4):
+    """Leitores e escritores simultâneos sobre a mesma RAGMemory"""
+    print(f"=== Estresse: {leitores} leitores, {escritores} escritores, {lotes}x{por_lote} chunks cada ===")
+    import utils.rag_memory as modulo
+    from utils.armazem_chunks import FiltroBusca
+
+    originais = (modulo.gerar_embeddings, modulo.gerar_embedding,
+                 modulo.RAG_DELTA_MAX_VETORES, modulo.COMPACTAR_APOS_SEGMENTOS)
+    modulo.gerar_embeddings = embeddings_fake
+    modulo.gerar_embedding = lambda texto, *a, **k: embedding_fake(texto)
+    # Delta e compactação pequenos, para a consolidação acontecer várias vezes durante o teste
+    modulo.RAG_DELTA_MAX_VETORES = delta_max
+    modulo.COMPACTAR_APOS_SEGMENTOS = compactar_apos
+
+    diretorio_original = os.getcwd()
+    pasta = tempfile.mkdtemp(prefix="estresse_rag_")
+    os.chdir(pasta)  # todos os caminhos da configuração são relativos
+    try:
+        rag = modulo.RAGMemory(embed_dim=DIM)
+        publicados = []
+        lock_publicados = threading.Lock()
+        erros = []
+        latencias = []
+        buscas = [0]
+        parar = threading.Event()
+
+        def escritor(w: int):
+            for lote in range(lotes):
+                textos = [f"escritor {w} lote {lote} chunk {i}" for i in range(por_lote)]
+                rag.add_texts(textos, url=f"http://teste/{w}")
+                with lock_publicados:
+                    publicados.extend(textos)
+
+        def leitor():
+            versao = 0
+            while not parar.is_set():
+                with lock_publicados:
+                    if not publicados:
+                        continue
+                    texto = random.choice(publicados)
+                url = f"http://teste/{texto.split()[1]}"
+                consulta = embedding_fake(texto).reshape(1, -1)
+
+                inicio = time.perf_counter()
+                D, I = rag.search(consulta, 3)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                buscas[0] += 1
+
+                nova_versao = rag.versao
+                if nova_versao < versao:
+                    erros.append(f"versão voltou de {versao} para {nova_versao}")
+                versao = nova_versao
+
+                ids = [int(i) for i in I[0] if i >= 0]
+                chunks = rag.obter_chunks(ids)
+                sem_texto = [i for i in ids if i not in chunks]
+                if sem_texto:
+                    erros.append(f"ids sem chunk no armazém: {sem_texto}")
+                elif not ids or chunks[ids[0]].texto != texto:
+                    erros.append(f"'{texto}' não voltou em primeiro (ids {ids})")
+
+                D, I = rag.search(consulta, 3, filtro=FiltroBusca(url=url))
+                fora = [c.url for c in rag.obter_chunks(I[0]).values() if c.url != url]
+                if fora:
+                    erros.append(f"busca filtrada por {url} devolveu {fora}")
+
+        threads_leitoras = [threading.Thread(target=leitor) for _ in range(leitores)]
+        threads_escritoras = [threading.Thread(target=escritor, args=(w,)) for w in range(escritores)]
+        inicio = time.perf_counter()
+        for t in threads_leitoras + threads_escritoras:
+            t.start()
+        for t in threads_escritoras:
+            t.join()
+        parar.set()
+        for t in threads_leitoras:
+            t.join()
+        duracao = time.perf_counter() - inicio
+
+        esperado = escritores * lotes * por_lote
+        if rag.index.ntotal != esperado:
+            erros.append(f"índice com {rag.index.ntotal} vetores, esperado {esperado}")
+
+        rag.compactar()
+        recarregada = modulo.RAGMemory(embed_dim=DIM)
+        if recarregada.index.ntotal != esperado or recarregada.chunks.total() != esperado:
+            erros.append(
+                f"após recarregar: {recarregada.index.ntotal} vetores e {recarregada.chunks.total()} chunks, esperado {esperado}"
+            )
+        for texto in random.sample(publicados, min(50, len(publicados))):
+            _, I = recarregada.search(embedding_fake(texto).reshape(1, -1), 1)
+            if recarregada.obter_chunks(I[0]).get(int(I[0][0]), None) is None or \
+                    recarregada.obter_chunks(I[0])[int(I[0][0])].texto != texto:
+                erros.append(f"após recarregar, '{texto}' não voltou em primeiro")
+
+        lat = np.array(latencias) if latencias else np.zeros(1)
+        print(f"{esperado} chunks indexados em {duracao:.1f} s; {buscas[0]} buscas concorrentes")
+        print(f"Latência das buscas: p50 {np.percentile(lat, 50):.2f} ms, p99 {np.percentile(lat, 99):.2f} ms, máx {lat.max():.2f} ms")
+        print(f"Erros: {len(erros)}")
+        for erro in erros[:10]:
+            print(f"  - {erro}")
+        print()
+        assert not erros, erros[0]
+    finally:
+        os.chdir(diretorio_original)
+        shutil.rmtree(pasta, ignore_errors=True)
+        (modulo.gerar_embeddings, modulo.gerar_embedding,
+         modulo.RAG_DELTA_MAX_VETORES, modulo.COMPACTAR_APOS_SEGMENTOS) = originais
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leitores", type=int, default=8)
+    parser.add_argument("--escritores", type=int, default=2)
+    parser.add_argument("--lotes", type=int, default=40, help="lotes de add_texts por escritor")
+    parser.add_argument("--por-lote", type=int, default=25, help="chunks por lote")
+    args = parser.parse_args()
+    test_concorrencia(args.leitores, args.escritores, args.lotes, args.por_lote)
+
+
+if __name__ == "__main__":
+    main()
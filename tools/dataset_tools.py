@@ -1,14 +1,12 @@
 import json
-import tiktoken
 from langchain.tools import tool
-from configuracoes.config import API_KEY, DATASET_PATH, TOKENIZER_ENCODING
-from openai import OpenAI
-
-client = OpenAI(api_key=API_KEY)
-tokenizador = tiktoken.get_encoding(TOKENIZER_ENCODING)
+from configuracoes.config import DATASET_PATH
+from utils.tokens import contar_tokens
+from utils.metricas import medido
 
 
 @tool
+@medido("ferramenta", "salvar_dataset_finetuning")
 def salvar_dataset_finetuning(pergunta: str, resposta: str, chunks_contexto: str, url_origem: str = None) -> str:
     """Salva pares pergunta-resposta com contexto para dataset de fine-tuning"""
     registro = {
@@ -16,7 +14,7 @@ def salvar_dataset_finetuning(pergunta: str, resposta: str, chunks_contexto: str
         "contexto": chunks_contexto,
         "resposta": resposta,
         "url_origem": url_origem,
-        "num_tokens_contexto": len(tokenizador.encode(chunks_contexto)),
+        "num_tokens_contexto": contar_tokens(chunks_contexto),
         "hash_contexto": hash(chunks_contexto)
     }
 
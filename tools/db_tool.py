@@ -1,6 +1,8 @@
 from langchain.tools import tool
+from utils.metricas import medido
 
 @tool
+@medido("ferramenta", "procura_db")
 def procura_db(query: str) -> str:
     """
     Procura o banco de dados para responder à pergunta do usuário.
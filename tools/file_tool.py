@@ -1,6 +1,8 @@
 from langchain.tools import tool
+from utils.metricas import medido
 
 @tool
+@medido("ferramenta", "ler_documentos")
 def ler_documentos(file_path: str) -> str:
     """
     Lê documentos de um diretório específico com base na consulta do usuário.
@@ -1,82 +1,109 @@
-import tiktoken
-import requests
-from langchain.tools import tool
-from openai import OpenAI
-from bs4 import BeautifulSoup
-from utils.sqlite_manuais import inserir_manual_com_embedding
-from utils.rag_memory import rag_memory
-from configuracoes.config import API_KEY, TOKENIZER_ENCODING, DEFAULT_TOP_K
-
-client = OpenAI(api_key=API_KEY)
-tokenizador = tiktoken.get_encoding(TOKENIZER_ENCODING)
-
-
-@tool
-def rag_url_resposta(url: str, pergunta: str, k: int = DEFAULT_TOP_K) -> str:
-    """Extrai conteúdo de uma URL e responde perguntas usando RAG"""
+from langchain_core.tools import StructuredTool
+from utils.sqlite_manuais import inserir_manual_com_embedding, ainserir_manual_com_embedding
+from utils.rag_memory import obter_rag_memory
+from utils.armazem_chunks import FiltroBusca
+from utils.cache_paginas import obter_pagina, aobter_pagina
+from utils.chunker_html import dividir_html
+from utils.assincrono import em_thread
+from utils.contexto import montar_contexto
+from configuracoes.config import DEFAULT_TOP_K
+from utils.metricas import medido
+
+
+@medido("ferramenta", "rag_url_resposta")
+def _rag_url_resposta(url: str, pergunta: str, k: int = DEFAULT_TOP_K) -> str:
+    rag_memory = obter_rag_memory()
     # Inserir manual no banco se não existir
+    manual_id = None
     try:
-        inserir_manual_com_embedding(titulo=url.split("/")[-1], url=url)
+        manual_id = inserir_manual_com_embedding(titulo=url.split("/")[-1], url=url)
     except Exception as e:
         print(f"Aviso: {e}")
 
-    # Scraping com headers completos para simular navegador
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
-        "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8",
-        "Accept-Encoding": "gzip, deflate, br",
-        "DNT": "1",
-        "Connection": "keep-alive",
-        "Upgrade-Insecure-Requests": "1",
-        "Sec-Fetch-Dest": "document",
-        "Sec-Fetch-Mode": "navigate",
-        "Sec-Fetch-Site": "none",
-        "Cache-Control": "max-age=0"
-    }
     try:
-        r = requests.get(url, headers=headers, timeout=30)
-        r.raise_for_status()
+        pagina = obter_pagina(url, "pagina-inteira-secoes", dividir_html)
     except Exception as e:
         return f"Erro ao acessar URL: {e}"
 
-    soup = BeautifulSoup(r.text, "html.parser")
-    '''artigo = soup.select_one("div.col-sm-9.kb-article-view-content article#kb-article")
-    
-    if not artigo:
-        return "Não encontrei o artigo na página."'''
+    rag_memory.add_texts(pagina.chunks, manual_id=manual_id, url=url)
 
-    texto = soup.get_text(separator="\n", strip=True)
-    chunks = rag_memory.chunk_text(texto)
-    rag_memory.add_texts(chunks)
+    # Só os chunks desta página entram no contexto, dentro do orçamento de tokens
+    return montar_contexto(rag_memory.consultar(pergunta, k=k, filtro=FiltroBusca(url=url)))
 
-    contexto = "\n\n".join(rag_memory.query(pergunta, k=k))
-    return contexto
 
+@medido("ferramenta", "rag_url_resposta")
+async def _arag_url_resposta(url: str, pergunta: str, k: int = DEFAULT_TOP_K) -> str:
+    rag_memory = await em_thread(obter_rag_memory)
+    manual_id = None
+    try:
+        manual_id = await ainserir_manual_com_embedding(titulo=url.split("/")[-1], url=url)
+    except Exception as e:
+        print(f"Aviso: {e}")
 
-@tool
-def inspector_faiss(pergunta: str, top_n: int = 5) -> str:
-    """Inspeciona o índice FAISS e retorna informações sobre chunks relevantes"""
-    if rag_memory.index.ntotal == 0:
-        return "Índice FAISS vazio. Adicione documentos primeiro."
-    
-    query_emb = rag_memory.embed_text(pergunta).reshape(1, -1)
-    D, I = rag_memory.index.search(query_emb, min(top_n, rag_memory.index.ntotal))
-    
+    try:
+        pagina = await aobter_pagina(url, "pagina-inteira-secoes", dividir_html)
+    except Exception as e:
+        return f"Erro ao acessar URL: {e}"
+
+    await rag_memory.aadd_texts(pagina.chunks, manual_id=manual_id, url=url)
+
+    resultados = await rag_memory.aconsultar(pergunta, k=k, filtro=FiltroBusca(url=url))
+    return await em_thread(montar_contexto, resultados)
+
+
+rag_url_resposta = StructuredTool.from_function(
+    func=_rag_url_resposta,
+    coroutine=_arag_url_resposta,
+    name="rag_url_resposta",
+    description="Extrai conteúdo de uma URL e responde perguntas usando RAG",
+)
+
+
+def _formatar_inspecao(D, I) -> str:
+    rag_memory = obter_rag_memory()
     resultado = f"=== Inspeção FAISS ===\n"
     resultado += f"Total de chunks no índice: {rag_memory.index.ntotal}\n"
     resultado += f"Top {len(I[0])} chunks mais relevantes:\n\n"
-    
-    tokenizador = tiktoken.get_encoding("cl100k_base")
-    
+
+    chunks = rag_memory.obter_chunks(I[0])
     for i, (idx, dist) in enumerate(zip(I[0], D[0])):
-        if idx < len(rag_memory.meta):
-            chunk = rag_memory.meta[idx]
-            similaridade = 1 / (1 + dist)
-            tokens = len(tokenizador.encode(chunk))
+        chunk = chunks.get(int(idx))
+        if chunk is not None:
+            similaridade = float(dist)  # o índice já devolve similaridade de cosseno
             resultado += f"{i+1}. Chunk {idx}:\n"
             resultado += f"   Similaridade: {similaridade:.3f}\n"
-            resultado += f"   Tokens: {tokens}\n"
-            resultado += f"   Preview: {chunk[:150]}...\n\n"
-    
+            resultado += f"   Tokens: {chunk.tokens}\n"
+            resultado += f"   Fonte: {chunk.url or 'desconhecida'}\n"
+            resultado += f"   Preview: {chunk.texto[:150]}...\n\n"
+
     return resultado
+
+
+@medido("ferramenta", "inspector_faiss")
+def _inspector_faiss(pergunta: str, top_n: int = 5) -> str:
+    rag_memory = obter_rag_memory()
+    if rag_memory.index.ntotal == 0:
+        return "Índice FAISS vazio. Adicione documentos primeiro."
+
+    query_emb = rag_memory.embed_text(pergunta).reshape(1, -1)
+    D, I = rag_memory.search(query_emb, min(top_n, rag_memory.index.ntotal))
+    return _formatar_inspecao(D, I)
+
+
+@medido("ferramenta", "inspector_faiss")
+async def _ainspector_faiss(pergunta: str, top_n: int = 5) -> str:
+    rag_memory = await em_thread(obter_rag_memory)
+    if rag_memory.index.ntotal == 0:
+        return "Índice FAISS vazio. Adicione documentos primeiro."
+
+    query_emb = (await rag_memory.aembed_text(pergunta)).reshape(1, -1)
+    D, I = await rag_memory.asearch(query_emb, min(top_n, rag_memory.index.ntotal))
+    return await em_thread(_formatar_inspecao, D, I)
+
+
+inspector_faiss = StructuredTool.from_function(
+    func=_inspector_faiss,
+    coroutine=_ainspector_faiss,
+    name="inspector_faiss",
+    description="Inspeciona o índice FAISS e retorna informações sobre chunks relevantes",
+)
@@ -1,29 +1,25 @@
-import tiktoken
-from langchain.tools import tool
-from openai import OpenAI
-from utils.rag_memory import rag_memory
-from configuracoes.config import API_KEY, TOKENIZER_ENCODING, DEFAULT_TOP_K, DEFAULT_SIMILARITY_THRESHOLD
+from langchain_core.tools import StructuredTool
+from utils.rag_memory import obter_rag_memory
+from utils.armazem_chunks import FiltroBusca
+from utils.assincrono import em_thread
+from utils.contexto import montar_contexto
+from configuracoes.config import DEFAULT_TOP_K, DEFAULT_SIMILARITY_THRESHOLD
+from utils.metricas import medido
 
-client = OpenAI(api_key=API_KEY)
-tokenizador = tiktoken.get_encoding(TOKENIZER_ENCODING)
 
-
-@tool
-def faiss_condicional_qa(pergunta: str, top_n: int = DEFAULT_TOP_K, limiar_similaridade: float = DEFAULT_SIMILARITY_THRESHOLD, mostrar_chunks: bool = False) -> str:
-    """Busca chunks relevantes no índice FAISS com base em limiar de similaridade para QA"""
-    query_emb = rag_memory.embed_text(pergunta).reshape(1, -1)
-    D, I = rag_memory.index.search(query_emb, top_n)
-    
+def _formatar_qa(sims, ids, mostrar_chunks: bool) -> str:
     chunks_para_qa = []
     chunks_para_mostrar = []
+    # Só os chunks devolvidos pela busca são lidos do armazém
+    chunks = obter_rag_memory().obter_chunks(ids)
 
-    for i, dist in zip(I[0], D[0]):
-        similaridade = 1 / (1 + dist)
-        chunk = rag_memory.meta[i]
-        info_chunk = f"Chunk {i}: {chunk[:100]}... Tokens: {len(tokenizador.encode(chunk))} Hash: {hash(chunk)} Similaridade: {similaridade:.2f}"
+    for i, similaridade in zip(ids, sims):
+        chunk = chunks.get(int(i))
+        if chunk is None:
+            continue
+        info_chunk = f"Chunk {i}: {chunk.texto[:100]}... Tokens: {chunk.tokens} Hash: {chunk.hash[:12]} Fonte: {chunk.url or '-'} Similaridade: {similaridade:.2f}"
         
-        if similaridade >= limiar_similaridade:
-            chunks_para_qa.append(chunk)
+        chunks_para_qa.append((float(similaridade), chunk))
         if mostrar_chunks:
             chunks_para_mostrar.append(info_chunk)
     
@@ -34,9 +30,47 @@ def faiss_condicional_qa(pergunta: str, top_n: int = DEFAULT_TOP_K, limiar_simil
         resultado += "\n============================\n"
     
     if chunks_para_qa:
-        contexto_qa = "\n\n".join(chunks_para_qa)
+        contexto_qa = montar_contexto(chunks_para_qa)
         resultado += f"Contexto para QA:\n{contexto_qa}"
     else:
         resultado += "Nenhum chunk passou pelo limiar de similaridade para QA."
     
     return resultado
+
+
+@medido("ferramenta", "faiss_condicional_qa")
+def _faiss_condicional_qa(pergunta: str, top_n: int = DEFAULT_TOP_K, limiar_similaridade: float = DEFAULT_SIMILARITY_THRESHOLD, mostrar_chunks: bool = False,
+                          manual_id: int = None, categoria: str = None) -> str:
+    """
+    Devolve exatamente os chunks com similaridade de cosseno acima do limiar (range_search),
+    no máximo `top_n`, em vez de buscar top_n fixos e filtrar depois.
+    """
+    rag_memory = obter_rag_memory()
+    query_emb = rag_memory.embed_text(pergunta).reshape(1, -1)
+    sims, ids = rag_memory.buscar_por_limiar(
+        query_emb, limiar_similaridade, top_n, filtro=FiltroBusca(manual_id=manual_id, categoria=categoria)
+    )
+    return _formatar_qa(sims, ids, mostrar_chunks)
+
+
+@medido("ferramenta", "faiss_condicional_qa")
+async def _afaiss_condicional_qa(pergunta: str, top_n: int = DEFAULT_TOP_K, limiar_similaridade: float = DEFAULT_SIMILARITY_THRESHOLD, mostrar_chunks: bool = False,
+                                 manual_id: int = None, categoria: str = None) -> str:
+    rag_memory = await em_thread(obter_rag_memory)
+    query_emb = (await rag_memory.aembed_text(pergunta)).reshape(1, -1)
+    sims, ids = await rag_memory.abuscar_por_limiar(
+        query_emb, limiar_similaridade, top_n, filtro=FiltroBusca(manual_id=manual_id, categoria=categoria)
+    )
+    return await em_thread(_formatar_qa, sims, ids, mostrar_chunks)
+
+
+faiss_condicional_qa = StructuredTool.from_function(
+    func=_faiss_condicional_qa,
+    coroutine=_afaiss_condicional_qa,
+    name="faiss_condicional_qa",
+    description=(
+        "Busca no índice FAISS todos os chunks com similaridade de cosseno acima do limiar "
+        "(no máximo top_n) para QA. "
+        "Opcionalmente restringe a busca a um manual (manual_id) ou categoria de intenção (categoria)"
+    ),
+)
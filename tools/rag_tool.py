@@ -1,52 +1,80 @@
-import requests
-from bs4 import BeautifulSoup
-from langchain.tools import tool
-from utils.rag_memory import rag_memory
-from utils.sqlite_manuais import buscar_manual_por_pergunta_vetorial, inserir_manual_com_embedding
+from langchain_core.tools import StructuredTool
+from utils.rag_memory import obter_rag_memory
+from utils.armazem_chunks import FiltroBusca
+from utils.assincrono import em_thread
+from utils.contexto import montar_contexto
+from utils.sqlite_manuais import (
+    buscar_manual_por_pergunta_vetorial, inserir_manual_com_embedding,
+    abuscar_manual_por_pergunta_vetorial, ainserir_manual_com_embedding
+)
+from utils.cache_paginas import obter_pagina, aobter_pagina
+from utils.chunker_html import dividir_artigo
 from configuracoes.config import DEFAULT_TOP_K
+from utils.metricas import medido
 
-@tool
-def rag_url_resposta_vetorial(pergunta: str, url: str = None, k: int = DEFAULT_TOP_K) -> str:
-    """Busca manuais relevantes no banco vetorial e extrai conteúdo de URL para responder perguntas usando RAG"""
+
+@medido("ferramenta", "rag_url_resposta_vetorial")
+def _rag_url_resposta_vetorial(pergunta: str, url: str = None, k: int = DEFAULT_TOP_K) -> str:
+    rag_memory = obter_rag_memory()
     manuais_relevantes = buscar_manual_por_pergunta_vetorial(pergunta)
     if manuais_relevantes:
-        sim, id_, titulo, url_manual = manuais_relevantes[0]
+        sim, manual_id, titulo, url_manual = manuais_relevantes[0]
+        print(f"[INFO] Usando manual mais relevante (sim={sim:.2f}): {titulo}")
+        url = url_manual
+    elif not url:
+        return "Nenhum manual relevante encontrado. Informe um URL."
+    else:
+        manual_id = inserir_manual_com_embedding(titulo=url.split("/")[-1], url=url)
+
+    try:
+        pagina = obter_pagina(url, "kb-article-secoes", dividir_artigo)
+    except Exception as e:
+        return f"Erro ao acessar URL: {e}"
+
+    if not pagina.chunks:
+        return "Não encontrei o artigo na página."
+
+    rag_memory.add_texts(pagina.chunks, manual_id=manual_id, url=url)
+
+    # Busca só nos chunks do manual escolhido; o índice inteiro fica como fallback
+    resultados = rag_memory.consultar(pergunta, k=k, filtro=FiltroBusca(manual_id=manual_id))
+    if not resultados:
+        resultados = rag_memory.consultar(pergunta, k=k)
+    return montar_contexto(resultados)
+
+
+@medido("ferramenta", "rag_url_resposta_vetorial")
+async def _arag_url_resposta_vetorial(pergunta: str, url: str = None, k: int = DEFAULT_TOP_K) -> str:
+    rag_memory = await em_thread(obter_rag_memory)
+    manuais_relevantes = await abuscar_manual_por_pergunta_vetorial(pergunta)
+    if manuais_relevantes:
+        sim, manual_id, titulo, url_manual = manuais_relevantes[0]
         print(f"[INFO] Usando manual mais relevante (sim={sim:.2f}): {titulo}")
         url = url_manual
     elif not url:
         return "Nenhum manual relevante encontrado. Informe um URL."
     else:
-        inserir_manual_com_embedding(titulo=url.split("/")[-1], url=url)
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
-        "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8",
-        "Accept-Encoding": "gzip, deflate, br",
-        "DNT": "1",
-        "Connection": "keep-alive",
-        "Upgrade-Insecure-Requests": "1",
-        "Sec-Fetch-Dest": "document",
-        "Sec-Fetch-Mode": "navigate",
-        "Sec-Fetch-Site": "none",
-        "Cache-Control": "max-age=0"
-    }
+        manual_id = await ainserir_manual_com_embedding(titulo=url.split("/")[-1], url=url)
+
     try:
-        r = requests.get(url, headers=headers, timeout=30)
-        r.raise_for_status()
+        pagina = await aobter_pagina(url, "kb-article-secoes", dividir_artigo)
     except Exception as e:
         return f"Erro ao acessar URL: {e}"
 
-    soup = BeautifulSoup(r.text, "html.parser")
-    artigo = soup.select_one("div.col-sm-9.kb-article-view-content article#kb-article")
-    if not artigo:
+    if not pagina.chunks:
         return "Não encontrei o artigo na página."
 
-    texto = artigo.get_text(separator="\n", strip=True)
-    chunks = rag_memory.chunk_text(texto)
-    rag_memory.add_texts(chunks)
+    await rag_memory.aadd_texts(pagina.chunks, manual_id=manual_id, url=url)
 
-    contexto = "\n\n".join(rag_memory.query(pergunta, k=k))
-    return contexto
+    resultados = await rag_memory.aconsultar(pergunta, k=k, filtro=FiltroBusca(manual_id=manual_id))
+    if not resultados:
+        resultados = await rag_memory.aconsultar(pergunta, k=k)
+    return await em_thread(montar_contexto, resultados)
 
 
+rag_url_resposta_vetorial = StructuredTool.from_function(
+    func=_rag_url_resposta_vetorial,
+    coroutine=_arag_url_resposta_vetorial,
+    name="rag_url_resposta_vetorial",
+    description="Busca manuais relevantes no banco vetorial e extrai conteúdo de URL para responder perguntas usando RAG",
+)
@@ -1,28 +1,31 @@
 import numpy as np
 import random
-import pandas as pd
-import plotly.express as px
-from sklearn.decomposition import PCA
-from sklearn.manifold import TSNE
-from sklearn.metrics.pairwise import cosine_similarity
 from langchain.tools import tool
-from utils.rag_memory import rag_memory
+from utils.rag_memory import obter_rag_memory
 from utils.sqlite_manuais import buscar_manual_por_id
-from openai import OpenAI
-from configuracoes.config import API_KEY
+from utils.metricas import medido
 
 @tool
+@medido("ferramenta", "plotar_mapa_semantico")
 def plotar_mapa_semantico(pergunta: str = None, metodo: str = "pca", limite: int = 1000):
     """
     Gera um mapa interativo do cérebro semântico do agente.
     Integra com o SQLite para mostrar ID, título e URL de cada manual.
     """
+    # pandas, plotly e sklearn só são importados quando o mapa é de fato gerado
+    import pandas as pd
+    import plotly.express as px
+    from sklearn.decomposition import PCA
+    from sklearn.manifold import TSNE
+    from sklearn.metrics.pairwise import cosine_similarity
+
     print("[INFO] Gerando mapa semântico com dados do SQLite...")
+    rag_memory = obter_rag_memory()
 
     # === 1. Extrai embeddings do FAISS ===
     vetores = rag_memory.index.reconstruct_n(0, min(limite, rag_memory.index.ntotal))
     vetores = np.array(vetores)
-    metas = rag_memory.meta[:len(vetores)]
+    metas = rag_memory.chunks.listar(len(vetores))
 
     if len(vetores) == 0:
         return "Nenhum vetor encontrado no FAISS."
@@ -36,23 +39,20 @@ def plotar_mapa_semantico(pergunta: str = None, metodo: str = "pca", limite: int
     # === 3. Monta dados para DataFrame ===
     fontes, ids, titulos, urls, textos = [], [], [], [], []
 
+    manuais = {}  # manual_id -> (titulo, url), uma consulta por manual
     for meta in metas:
-        if isinstance(meta, dict):
-            id_manual = meta.get("id") or "N/A"
-            fonte = meta.get("fonte") or "manual_desconhecido"
-            titulo, url = None, None
-            try:
-                titulo, url = buscar_manual_por_id(id_manual)
-            except Exception:
-                pass
-        else:
-            id_manual, fonte, titulo, url = "N/A", "manual_desconhecido", None, None
-
-        fontes.append(fonte)
-        ids.append(id_manual)
+        titulo, url = None, meta.url
+        if meta.manual_id is not None:
+            if meta.manual_id not in manuais:
+                manual = buscar_manual_por_id(meta.manual_id)
+                manuais[meta.manual_id] = (manual[1], manual[2]) if manual else (None, None)
+            titulo, url = manuais[meta.manual_id][0], manuais[meta.manual_id][1] or url
+
+        fontes.append(titulo or url or "manual_desconhecido")
+        ids.append(meta.manual_id if meta.manual_id is not None else "N/A")
         titulos.append(titulo or "sem título")
         urls.append(url or "sem URL")
-        texto = meta if isinstance(meta, str) else str(meta)
+        texto = meta.texto
         textos.append(texto[:300] + "..." if len(texto) > 300 else texto)
 
     df = pd.DataFrame({
@@ -68,7 +68,6 @@ def plotar_mapa_semantico(pergunta: str = None, metodo: str = "pca", limite: int
     # === 4. Projeta a pergunta e o chunk mais próximo ===
     if pergunta:
         print(f"[INFO] Projetando a pergunta: {pergunta}")
-        client = OpenAI(api_key=API_KEY)
         emb = rag_memory.embed_text(pergunta).reshape(1, -1)
 
         pca_fit = PCA(n_components=2).fit(vetores)
@@ -0,0 +1,229 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+from typing import NamedTuple
+from utils.cache_embeddings import hash_conteudo
+from utils.tokens import contar_tokens
+from utils.metricas import medido
+from configuracoes.config import CAMINHO_CHUNKS
+
+
+class Chunk(NamedTuple):
+    id: int
+    texto: str
+    manual_id: int | None
+    url: str | None
+    tokens: int
+    hash: str
+    categoria: str | None = None
+
+
+class FiltroBusca(NamedTuple):
+    """Restringe a busca vetorial aos chunks de um manual, URL e/ou categoria de intenção."""
+    manual_id: int | None = None
+    url: str | None = None
+    categoria: str | None = None
+
+
+class ArmazemChunks:
+    """
+    Texto e metadados dos chunks em SQLite, com a chave igual ao id do vetor no FAISS.
+    Substitui a lista pickled carregada inteira na memória: só as linhas dos ids
+    devolvidos pela busca são lidas (via mmap do SQLite), e a deduplicação consulta
+    o índice de hashes no banco em vez de um set em RAM. Manual, URL e categoria de
+    intenção ficam indexados para restringir a busca vetorial a um subconjunto.
+    Um índice FTS5 (BM25) sobre o mesmo texto, mantido por triggers, atende a busca
+    léxica; se o SQLite não tiver FTS5, ela só fica desativada. As escritas usam uma
+    conexão protegida por lock; as leituras, uma conexão por thread, que o WAL deixa
+    ler enquanto outra transação grava.
+    """
+
+    def __init__(self, caminho: str = CAMINHO_CHUNKS):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA mmap_size=268435456")
+        # INSERT OR REPLACE só dispara o trigger de DELETE (que limpa o FTS) com isto ligado
+        self._conn.execute("PRAGMA recursive_triggers=ON")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                texto TEXT NOT NULL,
+                manual_id INTEGER,
+                url TEXT,
+                tokens INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                categoria TEXT
+            )
+        """)
+        colunas = {linha[1] for linha in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "categoria" not in colunas:
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN categoria TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_hash ON chunks (hash)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_manual ON chunks (manual_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_url ON chunks (url)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_categoria ON chunks (categoria)")
+        self.fts = self._criar_fts()
+        self._conn.commit()
+
+    def _criar_fts(self) -> bool:
+        existia = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'"
+        ).fetchone() is not None
+        try:
+            self._conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                    texto, content='chunks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            print(f"[AVISO] SQLite sem FTS5 ({e}); busca léxica desativada.")
+            return False
+        self._conn.executescript("""
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_ai AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts (rowid, texto) VALUES (new.id, new.texto);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_ad AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, texto) VALUES ('delete', old.id, old.texto);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_au AFTER UPDATE OF texto ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, texto) VALUES ('delete', old.id, old.texto);
+                INSERT INTO chunks_fts (rowid, texto) VALUES (new.id, new.texto);
+            END;
+        """)
+        if not existia:
+            # Banco anterior ao FTS: indexa os chunks que já estavam lá
+            self._conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+        return True
+
+    def _leitura(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho)
+            conn.execute("PRAGMA mmap_size=268435456")
+            self._local.conn = conn
+        return conn
+
+    def total(self) -> int:
+        """Próximo id livre; os ids são contíguos a partir de 0, como no FAISS."""
+        maximo = self._leitura().execute("SELECT MAX(id) FROM chunks").fetchone()[0]
+        return 0 if maximo is None else maximo + 1
+
+    @medido("sqlite", "chunks_inserir")
+    def inserir(self, inicio: int, textos: list[str], manual_id: int = None, url: str = None,
+                categoria: str = None, origens: list[tuple] = None) -> list[Chunk]:
+        """
+        Grava os chunks com ids a partir de `inicio`, numa única transação. Regravar o mesmo
+        id substitui a linha. `origens` dá (manual_id, url, categoria) por chunk, para lotes
+        com vários manuais; sem ela, todos recebem os mesmos três valores.
+        """
+        if origens is None:
+            origens = [(manual_id, url, categoria)] * len(textos)
+        chunks = [
+            Chunk(inicio + i, texto, m, u, contar_tokens(texto), hash_conteudo(texto), c)
+            for i, (texto, (m, u, c)) in enumerate(zip(textos, origens))
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, texto, manual_id, url, tokens, hash, categoria) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                chunks
+            )
+            self._conn.commit()
+        return chunks
+
+    def atribuir_origem(self, hashes: list[str], manual_id: int = None, url: str = None, categoria: str = None):
+        """Preenche manual/URL/categoria de chunks já indexados que ainda não os têm."""
+        if manual_id is None and url is None and categoria is None:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET manual_id = COALESCE(manual_id, ?), url = COALESCE(url, ?), "
+                "categoria = COALESCE(categoria, ?) WHERE hash = ?",
+                [(manual_id, url, categoria, h) for h in hashes]
+            )
+            self._conn.commit()
+
+    @medido("sqlite", "chunks_filtro")
+    def ids_filtrados(self, filtro: FiltroBusca) -> np.ndarray:
+        """Ids dos chunks que atendem a todos os campos preenchidos do filtro."""
+        condicoes, valores = [], []
+        for coluna, valor in filtro._asdict().items():
+            if valor is not None:
+                condicoes.append(f"{coluna} = ?")
+                valores.append(valor)
+        linhas = self._leitura().execute(
+            f"SELECT id FROM chunks WHERE {' AND '.join(condicoes) or '1'}", valores
+        ).fetchall()
+        return np.fromiter((linha[0] for linha in linhas), dtype="int64", count=len(linhas))
+
+    @medido("sqlite", "chunks_fts")
+    def buscar_texto(self, consulta: str, limite: int, filtro: FiltroBusca = None) -> list[tuple[float, int]]:
+        """
+        Busca léxica: (pontuação BM25, id) dos chunks que casam com a expressão MATCH do
+        FTS5 (ver utils.busca_lexica.consulta_fts), do mais para o menos relevante.
+        """
+        if not self.fts or not consulta:
+            return []
+        condicoes, valores = ["chunks_fts MATCH ?"], [consulta]
+        for coluna, valor in (filtro._asdict().items() if filtro else ()):
+            if valor is not None:
+                condicoes.append(f"chunks.{coluna} = ?")
+                valores.append(valor)
+        linhas = self._leitura().execute(
+            "SELECT chunks_fts.rowid, bm25(chunks_fts) FROM chunks_fts "
+            "JOIN chunks ON chunks.id = chunks_fts.rowid "
+            f"WHERE {' AND '.join(condicoes)} ORDER BY bm25(chunks_fts) LIMIT ?",
+            [*valores, limite]
+        ).fetchall()
+        # O bm25() do SQLite é negativo (menor = melhor); inverte para "maior = melhor"
+        return [(-pontuacao, id_) for id_, pontuacao in linhas]
+
+    def _consultar_em_blocos(self, sql: str, valores: list) -> list[tuple]:
+        # Em blocos para respeitar o limite de parâmetros do SQLite
+        linhas = []
+        conn = self._leitura()
+        for i in range(0, len(valores), 500):
+            bloco = valores[i:i + 500]
+            marcadores = ",".join("?" * len(bloco))
+            linhas.extend(conn.execute(sql.format(marcadores), bloco).fetchall())
+        return linhas
+
+    @medido("sqlite", "chunks_obter")
+    def obter(self, ids) -> dict[int, Chunk]:
+        """Retorna {id: Chunk} para os ids existentes (ids negativos do FAISS são ignorados)."""
+        ids = list(dict.fromkeys(int(i) for i in ids if i >= 0))
+        linhas = self._consultar_em_blocos(
+            "SELECT id, texto, manual_id, url, tokens, hash, categoria FROM chunks WHERE id IN ({})", ids
+        )
+        return {linha[0]: Chunk(*linha) for linha in linhas}
+
+    def textos(self, ids) -> list[str]:
+        """Textos dos ids na ordem recebida, pulando os inexistentes."""
+        chunks = self.obter(ids)
+        return [chunks[int(i)].texto for i in ids if int(i) in chunks]
+
+    def hashes_existentes(self, hashes: list[str]) -> set[str]:
+        linhas = self._consultar_em_blocos(
+            "SELECT DISTINCT hash FROM chunks WHERE hash IN ({})", list(dict.fromkeys(hashes))
+        )
+        return {linha[0] for linha in linhas}
+
+    def listar(self, limite: int) -> list[Chunk]:
+        """Os primeiros `limite` chunks por id (para visualizações do corpus)."""
+        linhas = self._leitura().execute(
+            "SELECT id, texto, manual_id, url, tokens, hash, categoria FROM chunks ORDER BY id LIMIT ?", (limite,)
+        ).fetchall()
+        return [Chunk(*linha) for linha in linhas]
+
+    def truncar(self, total: int):
+        """Remove os chunks com id >= `total` (sem vetor correspondente no índice)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE id >= ?", (total,))
+            self._conn.commit()
@@ -0,0 +1,19 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from configuracoes.config import TOOLS_MAX_THREADS
+
+# Pool limitado para o trabalho bloqueante das ferramentas (FAISS, parsing de HTML, SQLite),
+# para que requisições concorrentes ao /chat não disputem o event loop
+executor_ferramentas = ThreadPoolExecutor(max_workers=TOOLS_MAX_THREADS, thread_name_prefix="ferramentas")
+
+
+async def em_thread(func, *args, **kwargs):
+    """
+    Executa uma função bloqueante no pool das ferramentas e aguarda o resultado. A função
+    roda numa cópia do contexto, para os spans medidos nela entrarem no rastro da requisição.
+    """
+    loop = asyncio.get_running_loop()
+    contexto = contextvars.copy_context()
+    return await loop.run_in_executor(executor_ferramentas, functools.partial(contexto.run, func, *args, **kwargs))
@@ -0,0 +1,114 @@
+"""
+Relatório de recall x latência dos backends FAISS contra a busca exata (flat).
+
+Uso:
+    python -m utils.avaliar_indices                     # vetores do índice atual (versão publicada + segmentos)
+    python -m utils.avaliar_indices --sintetico 50000   # corpus sintético agrupado
+"""
+import argparse
+import json
+import time
+import numpy as np
+from configuracoes.config import EMBED_DIM, FAISS_IVF_NLIST
+from utils.indices_faiss import criar_index, buscar, normalizar
+
+
+def _corpus_sintetico(n: int, dim: int, seed: int = 42) -> np.ndarray:
+    """Vetores agrupados em torno de centróides, mais próximos de embeddings reais que ruído uniforme."""
+    rng = np.random.default_rng(seed)
+    centros = rng.standard_normal((max(16, n // 200), dim)).astype("float32")
+    rotulos = rng.integers(0, len(centros), n)
+    return centros[rotulos] + 0.3 * rng.standard_normal((n, dim)).astype("float32")
+
+
+def _medir(index, consultas: np.ndarray, k: int, **params):
+    latencias = []
+    resultados = []
+    for q in consultas:
+        inicio = time.perf_counter()
+        _, I = buscar(index, q.reshape(1, -1), k, **params)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        resultados.append(I[0])
+    return np.array(resultados), np.array(latencias)
+
+
+def _recall(resultados: np.ndarray, referencia: np.ndarray) -> float:
+    acertos = sum(len(set(r) & set(ref)) for r, ref in zip(resultados, referencia))
+    return acertos / referencia.size
+
+
+def avaliar(vetores: np.ndarray, n_consultas: int = 200, k: int = 10, nlist: int = FAISS_IVF_NLIST) -> list[dict]:
+    rng = np.random.default_rng(0)
+    amostra = rng.choice(len(vetores), min(n_consultas, len(vetores)), replace=False)
+    ruido = 0.05 * vetores.std() * rng.standard_normal((len(amostra), vetores.shape[1])).astype("float32")
+    # Os índices usam produto interno sobre vetores normalizados (cosseno), como o RAGMemory
+    consultas = normalizar(vetores[amostra] + ruido)
+    vetores = normalizar(vetores)
+
+    flat = criar_index(vetores.shape[1], "flat", quantizacao="nenhuma")
+    flat.add(vetores)
+    referencia, lat_flat = _medir(flat, consultas, k)
+    linhas = [{"backend": "flat", "parametro": "-", "recall": 1.0,
+               "p50_ms": float(np.percentile(lat_flat, 50)), "p99_ms": float(np.percentile(lat_flat, 99))}]
+
+    varreduras = {
+        "ivf_flat": [("nprobe", v) for v in (1, 4, 16, 64)],
+        "ivf_pq": [("nprobe", v) for v in (1, 4, 16, 64)],
+        "hnsw": [("ef_search", v) for v in (16, 64, 256)],
+    }
+    for tipo, params in varreduras.items():
+        index = criar_index(vetores.shape[1], tipo, nlist)
+        t0 = time.perf_counter()
+        if not index.is_trained:
+            index.train(vetores)
+        index.add(vetores)
+        construcao = time.perf_counter() - t0
+        for nome, valor in params:
+            resultados, lat = _medir(index, consultas, k, **{nome: valor})
+            linhas.append({
+                "backend": tipo,
+                "parametro": f"{nome}={valor}",
+                "recall": _recall(resultados, referencia),
+                "p50_ms": float(np.percentile(lat, 50)),
+                "p99_ms": float(np.percentile(lat, 99)),
+                "construcao_s": round(construcao, 2),
+            })
+    return linhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sintetico", type=int, default=0, help="gera N vetores sintéticos em vez de usar o índice atual")
+    parser.add_argument("--dim", type=int, default=EMBED_DIM)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--json", help="salva o relatório neste arquivo")
+    args = parser.parse_args()
+
+    if args.sintetico:
+        vetores = _corpus_sintetico(args.sintetico, args.dim)
+    else:
+        # Abre como leitor: versão publicada mais os segmentos, sem disputar a trava com a API
+        from utils.rag_memory import RAGMemory
+        index = RAGMemory(modo="leitor").index
+        vetores = index.reconstruct_n(0, index.ntotal)
+        if not len(vetores):
+            parser.error("índice FAISS vazio; use --sintetico N")
+
+    # Com corpus pequeno o nlist padrão deixaria listas vazias; usa ~sqrt(n)
+    nlist = args.nlist or min(FAISS_IVF_NLIST, max(4, int(np.sqrt(len(vetores)))))
+    linhas = avaliar(vetores, args.consultas, args.k, nlist)
+
+    print(f"Corpus: {len(vetores)} vetores de dimensão {vetores.shape[1]}, k={args.k}, nlist={nlist}\n")
+    print(f"{'backend':<10} {'parâmetro':<14} {'recall@k':>9} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    for l in linhas:
+        print(f"{l['backend']:<10} {l['parametro']:<14} {l['recall']:>9.3f} {l['p50_ms']:>10.3f} {l['p99_ms']:>10.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"n": len(vetores), "dim": int(vetores.shape[1]), "k": args.k, "nlist": nlist, "resultados": linhas}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import re
+from configuracoes.config import RRF_K, BUSCA_EXATA_MAX_TERMOS
+
+# Palavras frequentes demais para ajudar no BM25 de perguntas em linguagem natural
+STOPWORDS = frozenset("""
+a o as os um uma uns umas de do da dos das no na nos nas em por para pra com sem sob sobre
+e ou que se como qual quais quando onde porque porquê é ser ter tem são foi há eu voce você
+me meu minha isso esse essa este esta aquele aquela ao aos à às pelo pela pelos pelas mais
+menos muito já não sim faço fazer posso pode consigo
+""".split())
+
+_ASPAS = re.compile(r'"([^"]+)"')
+# Termo: palavra, ou identificador com . / - > entre partes (CFOP 5.102, NCM 8471.30.12, menus a/b)
+_TERMO = re.compile(r"\w+(?:(?:[./\-]+|\s*>\s*)\w+)*")
+
+
+def _frase(texto: str) -> str:
+    return '"' + texto.replace('"', '""') + '"'
+
+
+def _eh_identificador(termo: str) -> bool:
+    # Números soltos de um ou dois dígitos ("passo 2") são comuns demais para contar como código
+    com_digito = any(ch.isdigit() for ch in termo) and len(termo) >= 3
+    return com_digito or bool(re.search(r"\w(?:[./\-_]+|\s*>\s*)\w", termo))
+
+
+def termos(texto: str) -> list[str]:
+    """Frases entre aspas e termos da pergunta, sem stopwords e sem repetição."""
+    encontrados = _ASPAS.findall(texto)
+    resto = _ASPAS.sub(" ", texto)
+    encontrados += [t for t in _TERMO.findall(resto) if t.lower() not in STOPWORDS]
+    return list(dict.fromkeys(t.strip() for t in encontrados if t.strip()))
+
+
+def eh_consulta_exata(texto: str) -> bool:
+    """
+    Pergunta curta centrada em termos exatos (códigos, nomes de campo, caminhos de menu
+    ou frases entre aspas), que a busca léxica resolve sem embedding.
+    """
+    encontrados = termos(texto)
+    if not encontrados or len(encontrados) > BUSCA_EXATA_MAX_TERMOS:
+        return False
+    return bool(_ASPAS.search(texto)) or any(_eh_identificador(t) for t in encontrados)
+
+
+def consulta_fts(texto: str, todos: bool = False) -> str | None:
+    """
+    Expressão MATCH do FTS5: cada termo vira uma frase (o tokenizador separa "5.102" em
+    "5" "102" e a frase exige os dois em sequência). `todos` exige todos os termos; senão
+    qualquer um basta e o BM25 ordena.
+    """
+    encontrados = termos(texto)
+    if not encontrados:
+        return None
+    return (" AND " if todos else " OR ").join(_frase(t) for t in encontrados)
+
+
+def fundir_rrf(rankings: list[list[int]], k: int = RRF_K) -> list[tuple[float, int]]:
+    """Reciprocal rank fusion: (pontuação, id) somando 1/(k + posição) de cada ranking, maior primeiro."""
+    pontuacao = {}
+    for ranking in rankings:
+        for posicao, id_ in enumerate(ranking, start=1):
+            pontuacao[id_] = pontuacao.get(id_, 0.0) + 1.0 / (k + posicao)
+    return sorted(((p, id_) for id_, p in pontuacao.items()), reverse=True)
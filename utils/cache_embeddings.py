@@ -0,0 +1,107 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from utils.inicializacao import preguicoso
+from configuracoes.config import CAMINHO_CACHE_EMBEDDINGS, EMBED_CACHE_MAX_ITENS
+
+
+def hash_conteudo(texto: str) -> str:
+    """Hash estável (SHA-256) do conteúdo, igual entre processos e reinícios."""
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+class CacheEmbeddings:
+    """
+    Cache em disco de embeddings, endereçado por hash do conteúdo + modelo.
+    Remove as entradas menos usadas recentemente quando passa de `max_itens`.
+    """
+
+    def __init__(self, caminho: str = CAMINHO_CACHE_EMBEDDINGS, max_itens: int = EMBED_CACHE_MAX_ITENS):
+        self.caminho = caminho
+        self.max_itens = max_itens
+        self.acertos = 0
+        self.faltas = 0
+        self._lock = threading.Lock()
+
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                hash TEXT NOT NULL,
+                modelo TEXT NOT NULL,
+                vetor BLOB NOT NULL,
+                ultimo_acesso REAL NOT NULL,
+                PRIMARY KEY (hash, modelo)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_acesso ON embeddings (ultimo_acesso)")
+        self._conn.commit()
+
+    def obter_muitos(self, hashes: list[str], modelo: str) -> dict[str, np.ndarray]:
+        """Retorna {hash: vetor} para os hashes presentes no cache."""
+        encontrados = {}
+        unicos = list(dict.fromkeys(hashes))
+        with self._lock:
+            # Consulta em blocos para respeitar o limite de parâmetros do SQLite
+            for i in range(0, len(unicos), 500):
+                bloco = unicos[i:i + 500]
+                marcadores = ",".join("?" * len(bloco))
+                rows = self._conn.execute(
+                    f"SELECT hash, vetor FROM embeddings WHERE modelo = ? AND hash IN ({marcadores})",
+                    (modelo, *bloco)
+                ).fetchall()
+                for h, blob in rows:
+                    encontrados[h] = np.frombuffer(blob, dtype="float32")
+            if encontrados:
+                agora = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET ultimo_acesso = ? WHERE hash = ? AND modelo = ?",
+                    [(agora, h, modelo) for h in encontrados]
+                )
+                self._conn.commit()
+            self.acertos += len(encontrados)
+            self.faltas += len(unicos) - len(encontrados)
+        return encontrados
+
+    def salvar_muitos(self, itens: dict[str, np.ndarray], modelo: str):
+        """Grava {hash: vetor} no cache e aplica o limite de tamanho."""
+        if not itens:
+            return
+        agora = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (hash, modelo, vetor, ultimo_acesso) VALUES (?, ?, ?, ?)",
+                [(h, modelo, np.asarray(v, dtype="float32").tobytes(), agora) for h, v in itens.items()]
+            )
+            total = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if total > self.max_itens:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY ultimo_acesso ASC LIMIT ?)",
+                    (total - self.max_itens,)
+                )
+            self._conn.commit()
+
+    def estatisticas(self) -> dict:
+        """Contadores de acertos/faltas desde o início do processo e tamanho atual."""
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        consultas = self.acertos + self.faltas
+        return {
+            "acertos": self.acertos,
+            "faltas": self.faltas,
+            "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+            "itens": total,
+            "max_itens": self.max_itens,
+        }
+
+
+@preguicoso("cache_embeddings")
+def obter_cache_embeddings() -> CacheEmbeddings:
+    return CacheEmbeddings()
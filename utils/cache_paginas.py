@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+from utils.http import sessao, cliente_async
+from utils.cache_embeddings import hash_conteudo
+from utils.assincrono import em_thread
+from utils.inicializacao import preguicoso
+from utils.metricas import medido
+from configuracoes.config import CAMINHO_CACHE_PAGINAS, PAGINA_CACHE_TTL, HTTP_TIMEOUT
+
+
+class Pagina(NamedTuple):
+    chunks: list[str]
+
+
+class CachePaginas:
+    """
+    Cache em disco dos chunks de cada página, por (url, extrator).
+    Guarda ETag/Last-Modified para revalidação com GET condicional.
+    """
+
+    def __init__(self, caminho: str = CAMINHO_CACHE_PAGINAS):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS paginas (
+                url TEXT NOT NULL,
+                extrator TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                hash_html TEXT,
+                chunks TEXT NOT NULL,
+                verificado_em REAL NOT NULL,
+                PRIMARY KEY (url, extrator)
+            )
+        """)
+        self._conn.commit()
+
+    def obter(self, url: str, extrator: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, hash_html, chunks, verificado_em FROM paginas WHERE url = ? AND extrator = ?",
+                (url, extrator)
+            ).fetchone()
+        if not row:
+            return None
+        etag, last_modified, hash_html, chunks, verificado_em = row
+        return {
+            "etag": etag, "last_modified": last_modified, "hash_html": hash_html,
+            "pagina": Pagina(json.loads(chunks)), "verificado_em": verificado_em,
+        }
+
+    def salvar(self, url: str, extrator: str, etag: str, last_modified: str, hash_html: str, pagina: Pagina):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO paginas (url, extrator, etag, last_modified, hash_html, chunks, verificado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, extrator, etag, last_modified, hash_html,
+                 json.dumps(pagina.chunks, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+
+    def marcar_verificado(self, url: str, extrator: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE paginas SET verificado_em = ? WHERE url = ? AND extrator = ?",
+                (time.time(), url, extrator)
+            )
+            self._conn.commit()
+
+
+@preguicoso("cache_paginas")
+def obter_cache_paginas() -> CachePaginas:
+    return CachePaginas()
+
+
+def _headers_condicionais(entrada) -> dict:
+    headers = {}
+    if entrada:
+        if entrada["etag"]:
+            headers["If-None-Match"] = entrada["etag"]
+        if entrada["last_modified"]:
+            headers["If-Modified-Since"] = entrada["last_modified"]
+    return headers
+
+
+def _fresca(entrada) -> bool:
+    return entrada is not None and time.time() - entrada["verificado_em"] < PAGINA_CACHE_TTL
+
+
+def _processar(url: str, extrator: str, entrada, html: str, etag, last_modified, dividir) -> Pagina:
+    """Divide o HTML baixado em chunks, reaproveitando o cache se o conteúdo não mudou."""
+    hash_html = hash_conteudo(html)
+    if entrada and entrada["hash_html"] == hash_html:
+        pagina = entrada["pagina"]
+    else:
+        pagina = Pagina(list(dividir(html)))
+    obter_cache_paginas().salvar(url, extrator, etag, last_modified, hash_html, pagina)
+    return pagina
+
+
+@medido("http", "pagina")
+def obter_pagina(url: str, extrator: str, dividir) -> Pagina:
+    """
+    Devolve os chunks da página. Dentro de PAGINA_CACHE_TTL não acessa a rede;
+    depois revalida com ETag/Last-Modified e só reprocessa se o conteúdo mudou.
+    `extrator` identifica a função `dividir` (html -> chunks) no cache.
+    """
+    entrada = obter_cache_paginas().obter(url, extrator)
+    if _fresca(entrada):
+        return entrada["pagina"]
+
+    r = sessao.get(url, headers=_headers_condicionais(entrada), timeout=HTTP_TIMEOUT)
+    if r.status_code == 304 and entrada:
+        obter_cache_paginas().marcar_verificado(url, extrator)
+        return entrada["pagina"]
+    r.raise_for_status()
+    return _processar(url, extrator, entrada, r.text, r.headers.get("ETag"), r.headers.get("Last-Modified"), dividir)
+
+
+@medido("http", "pagina")
+async def aobter_pagina(url: str, extrator: str, dividir) -> Pagina:
+    """Versão assíncrona de obter_pagina; parsing e tokenização rodam no pool de threads."""
+    entrada = await em_thread(lambda: obter_cache_paginas().obter(url, extrator))
+    if _fresca(entrada):
+        return entrada["pagina"]
+
+    r = await cliente_async().get(url, headers=_headers_condicionais(entrada))
+    if r.status_code == 304 and entrada:
+        await em_thread(lambda: obter_cache_paginas().marcar_verificado(url, extrator))
+        return entrada["pagina"]
+    r.raise_for_status()
+    return await em_thread(
+        _processar, url, extrator, entrada, r.text, r.headers.get("ETag"), r.headers.get("Last-Modified"), dividir
+    )
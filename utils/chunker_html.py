@@ -0,0 +1,205 @@
+"""
+Divisão de páginas em chunks respeitando a estrutura do HTML.
+
+O HTML é entregue aos poucos a um parser lxml com alvo (eventos start/data/end, sem
+montar a árvore), que devolve blocos de texto (títulos, parágrafos, itens de lista,
+linhas de tabela) na ordem do documento. Os blocos são agrupados em chunks de até
+MAX_TOKENS_PER_CHUNK tokens; cada título abre um chunk novo e o fim do chunk anterior
+é repetido no início do seguinte (CHUNK_SOBREPOSICAO_TOKENS). Tudo é gerador: só o
+bloco e o chunk em montagem ficam em memória.
+"""
+from typing import Callable, Iterable, Iterator
+from lxml import etree
+from utils.tokens import obter_tokenizador, contar_tokens
+from configuracoes.config import MAX_TOKENS_PER_CHUNK, CHUNK_SOBREPOSICAO_TOKENS, HTML_TAMANHO_LEITURA
+
+TITULOS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+BLOCOS = TITULOS | {
+    "p", "li", "dt", "dd", "tr", "pre", "blockquote", "figcaption", "caption",
+    "div", "section", "article", "header", "footer", "main", "aside", "nav",
+    "ul", "ol", "dl", "table", "thead", "tbody", "form", "br", "hr", "body",
+}
+IGNORADOS = {"script", "style", "noscript", "template", "head", "svg"}
+
+Bloco = tuple[bool, str]  # (é título, texto)
+
+
+def seletor_kb_article(tag: str, atributos) -> bool:
+    """Raiz dos artigos da base de conhecimento (article#kb-article)."""
+    return tag == "article" and atributos.get("id") == "kb-article"
+
+
+class _ColetorBlocos:
+    """Alvo do parser lxml: acumula o texto entre fronteiras de bloco, dentro da raiz escolhida."""
+
+    def __init__(self, raiz: Callable[[str, dict], bool] | None):
+        self.raiz = raiz
+        self.profundidade_raiz = 0 if raiz is None else None
+        self.profundidade = 0
+        self.ignorando = 0
+        self.em_titulo = False
+        self.pedacos = []
+        self.blocos = []
+
+    def _fechar_bloco(self):
+        texto = " ".join("".join(self.pedacos).split())
+        self.pedacos = []
+        if texto:
+            self.blocos.append((self.em_titulo, texto))
+
+    def start(self, tag, atributos):
+        self.profundidade += 1
+        if self.ignorando or tag in IGNORADOS:
+            self.ignorando += 1
+            return
+        if self.profundidade_raiz is None:
+            if self.raiz(tag, atributos):
+                self.profundidade_raiz = self.profundidade
+            return
+        if tag in BLOCOS:
+            self._fechar_bloco()
+            self.em_titulo = tag in TITULOS
+        elif tag in ("td", "th"):
+            self.pedacos.append(" ")
+
+    def end(self, tag):
+        self.profundidade -= 1
+        if self.ignorando:
+            self.ignorando -= 1
+            return
+        if self.profundidade_raiz is None:
+            return
+        if tag in BLOCOS:
+            self._fechar_bloco()
+            self.em_titulo = False
+        if self.raiz is not None and self.profundidade < self.profundidade_raiz:
+            # Saiu da raiz: o resto do documento não interessa (até outra raiz igual)
+            self.profundidade_raiz = None
+
+    def data(self, texto):
+        if not self.ignorando and self.profundidade_raiz is not None:
+            self.pedacos.append(texto)
+
+    def close(self):
+        self._fechar_bloco()
+
+
+def extrair_blocos(html: str, raiz: Callable[[str, dict], bool] = None,
+                   tamanho_leitura: int = HTML_TAMANHO_LEITURA) -> Iterator[Bloco]:
+    """
+    Percorre o HTML em pedaços de `tamanho_leitura` e gera (é_título, texto) por bloco.
+    Com `raiz`, só o conteúdo dos elementos aceitos por raiz(tag, atributos) é considerado.
+    """
+    coletor = _ColetorBlocos(raiz)
+    parser = etree.HTMLParser(target=coletor, remove_comments=True)
+    for i in range(0, len(html), tamanho_leitura):
+        parser.feed(html[i:i + tamanho_leitura])
+        yield from coletor.blocos
+        coletor.blocos = []
+    parser.close()
+    yield from coletor.blocos
+
+
+def blocos_de_texto(texto: str) -> Iterator[Bloco]:
+    """Trata cada linha não vazia de um texto puro como um parágrafo."""
+    for linha in texto.splitlines():
+        linha = linha.strip()
+        if linha:
+            yield False, linha
+
+
+def _janelas(texto: str, max_tokens: int, sobreposicao: int) -> Iterator[str]:
+    """Divide um único bloco maior que o limite em janelas de tokens sobrepostas."""
+    tokenizador = obter_tokenizador()
+    tokens = tokenizador.encode(texto)
+    passo = max(max_tokens - sobreposicao, 1)
+    for i in range(0, len(tokens), passo):
+        yield tokenizador.decode(tokens[i:i + max_tokens])
+        if i + max_tokens >= len(tokens):
+            break
+
+
+def _cauda(partes: list[tuple[str, int]], sobreposicao: int) -> list[tuple[str, int]]:
+    """Últimos blocos inteiros que cabem em `sobreposicao` tokens; se nem o último cabe, o fim dele."""
+    cauda, total = [], 0
+    for texto, tokens in reversed(partes):
+        if total + tokens > sobreposicao:
+            break
+        cauda.insert(0, (texto, tokens))
+        total += tokens
+    if not cauda and partes and sobreposicao > 0:
+        tokenizador = obter_tokenizador()
+        fim = tokenizador.decode(tokenizador.encode(partes[-1][0])[-sobreposicao:]).strip()
+        if fim:
+            cauda = [(fim, contar_tokens(fim))]
+    return cauda
+
+
+def dividir_blocos(blocos: Iterable[Bloco], max_tokens: int = MAX_TOKENS_PER_CHUNK,
+                   sobreposicao: int = CHUNK_SOBREPOSICAO_TOKENS) -> Iterator[str]:
+    """
+    Agrupa blocos em chunks de até `max_tokens`. Um título fecha o chunk atual e abre
+    outro; quando um chunk enche, o seguinte recomeça com o título da seção e os
+    últimos `sobreposicao` tokens do anterior. Blocos maiores que o limite viram janelas.
+    """
+    partes: list[tuple[str, int]] = []
+    total = 0
+    novos = False  # há conteúdo além do título e da sobreposição herdados?
+    titulo = None
+
+    def recomecar(cabeca: list[tuple[str, int]]):
+        nonlocal partes, total, novos
+        partes, total, novos = cabeca, sum(t + 1 for _, t in cabeca), False
+
+    for eh_titulo, texto in blocos:
+        tokens = contar_tokens(texto)
+        if eh_titulo:
+            if novos:
+                yield "\n".join(t for t, _ in partes)
+            recomecar([])
+            # Títulos enormes (markup errado) seguem como bloco comum
+            titulo = (texto, tokens) if tokens < max_tokens // 2 else None
+            if titulo:
+                recomecar([titulo])
+                continue
+
+        pedacos = [(texto, tokens)]
+        if tokens > max_tokens:
+            # As janelas já se sobrepõem entre si; só o título da seção é repetido nelas
+            espaco = max_tokens - 1 - (titulo[1] + 1 if titulo else 0)
+            pedacos = [(j, contar_tokens(j)) for j in _janelas(texto, espaco, sobreposicao)]
+
+        for n, (texto_peca, tokens_peca) in enumerate(pedacos):
+            if n > 0 or (total + tokens_peca + 1 > max_tokens and novos):
+                if novos:
+                    yield "\n".join(t for t, _ in partes)
+                cabeca = _cauda(partes, sobreposicao) if n == 0 else []
+                if titulo and titulo not in cabeca:
+                    cabeca = [titulo] + cabeca
+                # O que foi herdado cede espaço ao bloco novo se não couber junto
+                while cabeca and sum(t + 1 for _, t in cabeca) + tokens_peca + 1 > max_tokens:
+                    cabeca.pop(0)
+                recomecar(cabeca)
+            partes.append((texto_peca, tokens_peca))
+            total += tokens_peca + 1
+            novos = True
+
+    if novos:
+        yield "\n".join(t for t, _ in partes)
+
+
+def dividir_html(html: str, raiz: Callable[[str, dict], bool] = None, max_tokens: int = MAX_TOKENS_PER_CHUNK,
+                 sobreposicao: int = CHUNK_SOBREPOSICAO_TOKENS) -> Iterator[str]:
+    """Gera os chunks de uma página (ou só do conteúdo sob `raiz`)."""
+    return dividir_blocos(extrair_blocos(html, raiz), max_tokens, sobreposicao)
+
+
+def dividir_artigo(html: str) -> Iterator[str]:
+    """Chunks só do conteúdo de article#kb-article (páginas de manual da base de conhecimento)."""
+    return dividir_html(html, raiz=seletor_kb_article)
+
+
+def dividir_texto(texto: str, max_tokens: int = MAX_TOKENS_PER_CHUNK,
+                  sobreposicao: int = CHUNK_SOBREPOSICAO_TOKENS) -> Iterator[str]:
+    """Gera os chunks de um texto puro, quebrando por linhas."""
+    return dividir_blocos(blocos_de_texto(texto), max_tokens, sobreposicao)
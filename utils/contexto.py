@@ -0,0 +1,54 @@
+from utils.armazem_chunks import Chunk
+from utils.tokens import obter_tokenizador, contar_tokens
+from configuracoes.config import CONTEXTO_MAX_TOKENS, CONTEXTO_MIN_TOKENS_CAUDA
+
+SEPARADOR = "\n\n"
+
+
+def _linha_chave(linha: str) -> str:
+    return " ".join(linha.split()).lower()
+
+
+def _cortar(texto: str, max_tokens: int) -> str:
+    tokenizador = obter_tokenizador()
+    return tokenizador.decode(tokenizador.encode(texto)[:max_tokens])
+
+
+def montar_contexto(resultados: list[tuple[float, Chunk]], max_tokens: int = CONTEXTO_MAX_TOKENS,
+                    min_tokens_cauda: int = CONTEXTO_MIN_TOKENS_CAUDA) -> str:
+    """
+    Monta o contexto para o LLM a partir de (pontuação, Chunk), do mais ao menos relevante,
+    sem passar de `max_tokens`. Usa a contagem de tokens gravada na ingestão (só reconta
+    chunks alterados), descarta chunks repetidos e linhas já incluídas por outro chunk
+    (a sobreposição entre janelas vizinhas) e corta o último chunk que não couber inteiro,
+    se sobrarem pelo menos `min_tokens_cauda` tokens (o primeiro é sempre cortado, nunca omitido).
+    """
+    partes = []
+    usados = 0
+    hashes_vistos = set()
+    linhas_vistas = set()
+    custo_separador = contar_tokens(SEPARADOR)
+
+    for _, chunk in sorted(resultados, key=lambda r: -r[0]):
+        if chunk.hash in hashes_vistos:
+            continue
+        hashes_vistos.add(chunk.hash)
+
+        linhas = chunk.texto.splitlines()
+        novas = [l for l in linhas if not l.strip() or _linha_chave(l) not in linhas_vistas]
+        if not any(l.strip() for l in novas):
+            continue
+        texto = "\n".join(novas).strip()
+        tokens = chunk.tokens if len(novas) == len(linhas) else contar_tokens(texto)
+
+        restante = max_tokens - usados - (custo_separador if partes else 0)
+        if tokens > restante:
+            if restante >= min_tokens_cauda or not partes:
+                partes.append(_cortar(texto, restante))
+            break
+
+        partes.append(texto)
+        usados += tokens + (custo_separador if len(partes) > 1 else 0)
+        linhas_vistas.update(_linha_chave(l) for l in novas if l.strip())
+
+    return SEPARADOR.join(partes)
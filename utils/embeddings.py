@@ -0,0 +1,243 @@
+import asyncio
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+from configuracoes.config import (
+    API_KEY, EMBED_DIM, EMBED_DIM_MODELO, EMBEDDING_MODEL, EMBED_BATCH_SIZE, EMBED_MAX_CONCORRENCIA,
+    EMBED_MAX_TENTATIVAS, EMBED_BACKOFF_INICIAL, EMBED_BACKOFF_MAXIMO,
+    EMBED_AGRUPAR_MAX_LOTE, EMBED_AGRUPAR_ESPERA
+)
+from utils.cache_embeddings import obter_cache_embeddings, hash_conteudo
+from utils.inicializacao import preguicoso
+from utils.assincrono import em_thread
+from utils.metricas import medir, medido, registrar_tokens
+
+client = OpenAI(api_key=API_KEY)
+aclient = AsyncOpenAI(api_key=API_KEY)
+
+# Erros transitórios que justificam nova tentativa com backoff
+ERROS_TRANSITORIOS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+# Só pede vetores encurtados quando EMBED_DIM é menor que a dimensão nativa do modelo
+DIMENSOES = {"dimensions": EMBED_DIM} if EMBED_DIM != EMBED_DIM_MODELO else {}
+
+
+def _chave_cache(modelo: str) -> str:
+    # Vetores encurtados não podem sair do cache como se fossem os de dimensão nativa
+    return f"{modelo}@{EMBED_DIM}" if DIMENSOES else modelo
+
+
+def _tempo_espera(erro: Exception, tentativa: int) -> float:
+    """Calcula a espera antes da próxima tentativa, respeitando o Retry-After da API quando houver."""
+    resposta = getattr(erro, "response", None)
+    if resposta is not None:
+        retry_after = resposta.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), EMBED_BACKOFF_MAXIMO)
+            except ValueError:
+                pass
+    espera = EMBED_BACKOFF_INICIAL * (2 ** tentativa)
+    return min(espera, EMBED_BACKOFF_MAXIMO) * (0.5 + random.random() / 2)
+
+
+def _embed_lote(lote: list[str], modelo: str) -> np.ndarray:
+    """Envia um lote ao endpoint de embeddings, com backoff exponencial em rate limit."""
+    for tentativa in range(EMBED_MAX_TENTATIVAS):
+        try:
+            with medir("openai", modelo, textos=len(lote)) as span:
+                resp = client.embeddings.create(model=modelo, input=lote, **DIMENSOES)
+                span["tokens"] = _contar_tokens(resp, modelo)
+            break
+        except ERROS_TRANSITORIOS as e:
+            if tentativa == EMBED_MAX_TENTATIVAS - 1:
+                raise
+            espera = _tempo_espera(e, tentativa)
+            print(f"[AVISO] Embeddings: {type(e).__name__}, nova tentativa em {espera:.1f}s")
+            time.sleep(espera)
+    return _matriz_da_resposta(resp)
+
+
+def _contar_tokens(resp, modelo: str) -> int:
+    tokens = getattr(getattr(resp, "usage", None), "prompt_tokens", 0) or 0
+    registrar_tokens(modelo, prompt=tokens)
+    return tokens
+
+
+def _matriz_da_resposta(resp) -> np.ndarray:
+    # A API não garante a ordem da resposta; reordena pelo índice de entrada
+    dados = sorted(resp.data, key=lambda d: d.index)
+    return np.array([d.embedding for d in dados], dtype="float32")
+
+
+def _embed_sem_cache(textos: list[str], modelo: str, batch_size: int, max_concorrencia: int) -> np.ndarray:
+    """Embeda textos na API em lotes, com no máximo `max_concorrencia` lotes em voo."""
+    lotes = [textos[i:i + batch_size] for i in range(0, len(textos), batch_size)]
+    if len(lotes) == 1:
+        return _embed_lote(lotes[0], modelo)
+
+    with ThreadPoolExecutor(max_workers=min(max_concorrencia, len(lotes))) as executor:
+        matrizes = list(executor.map(lambda lote: _embed_lote(lote, modelo), lotes))
+    return np.vstack(matrizes)
+
+
+class AgrupadorEmbeddings:
+    """
+    Junta os textos avulsos (consultas) de chamadas concorrentes num único pedido à API.
+
+    O primeiro texto que chega espera até `max_espera` segundos por outros, ou até o
+    lote encher; o lote vai para a API em outra thread (no máximo `max_concorrencia` em
+    voo) e cada chamador recebe o seu vetor pelo Future devolvido em `enviar`. Textos
+    repetidos no mesmo lote são enviados uma vez só.
+    """
+
+    def __init__(self, max_lote: int = EMBED_AGRUPAR_MAX_LOTE, max_espera: float = EMBED_AGRUPAR_ESPERA,
+                 max_concorrencia: int = EMBED_MAX_CONCORRENCIA):
+        self.max_lote = max_lote
+        self.max_espera = max_espera
+        self._fila = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_concorrencia, thread_name_prefix="embeddings")
+        threading.Thread(target=self._despachar, name="agrupador-embeddings", daemon=True).start()
+
+    def enviar(self, texto: str, modelo: str = EMBEDDING_MODEL) -> Future:
+        """Future com o embedding de `texto` (use asyncio.wrap_future para aguardar no event loop)."""
+        futuro = Future()
+        self._fila.put((texto, modelo, futuro))
+        return futuro
+
+    def _coletar(self) -> list:
+        pedidos = [self._fila.get()]
+        limite = time.monotonic() + self.max_espera
+        while len(pedidos) < self.max_lote:
+            restante = limite - time.monotonic()
+            try:
+                pedidos.append(self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait())
+            except queue.Empty:
+                break
+        return pedidos
+
+    def _despachar(self):
+        while True:
+            por_modelo = {}
+            for texto, modelo, futuro in self._coletar():
+                por_modelo.setdefault(modelo, {}).setdefault(texto, []).append(futuro)
+            for modelo, futuros_por_texto in por_modelo.items():
+                self._executor.submit(self._resolver, modelo, futuros_por_texto)
+
+    @staticmethod
+    def _resolver(modelo: str, futuros_por_texto: dict[str, list[Future]]):
+        try:
+            matriz = _embed_lote(list(futuros_por_texto), modelo)
+        except Exception as e:
+            for futuros in futuros_por_texto.values():
+                for futuro in futuros:
+                    futuro.set_exception(e)
+            return
+        for vetor, futuros in zip(matriz, futuros_por_texto.values()):
+            for futuro in futuros:
+                futuro.set_result(vetor)
+
+
+@preguicoso("agrupador_embeddings")
+def obter_agrupador_embeddings() -> AgrupadorEmbeddings:
+    return AgrupadorEmbeddings()
+
+
+def _separar_faltantes(textos: list[str], modelo: str):
+    """Consulta o cache; devolve (hashes, vetores encontrados, {hash: texto} a embedar)."""
+    hashes = [hash_conteudo(t) for t in textos]
+    vetores = obter_cache_embeddings().obter_muitos(hashes, _chave_cache(modelo))
+
+    # Textos repetidos dentro da mesma chamada são enviados uma única vez
+    faltantes = {}
+    for h, t in zip(hashes, textos):
+        if h not in vetores and h not in faltantes:
+            faltantes[h] = t
+    return hashes, vetores, faltantes
+
+
+def _completar(hashes: list[str], vetores: dict, faltantes: dict, novos: np.ndarray, modelo: str) -> np.ndarray:
+    if faltantes:
+        novos_por_hash = dict(zip(faltantes.keys(), novos))
+        obter_cache_embeddings().salvar_muitos(novos_por_hash, _chave_cache(modelo))
+        vetores.update(novos_por_hash)
+    return np.vstack([vetores[h] for h in hashes])
+
+
+@medido("embeddings", "lote")
+def gerar_embeddings(textos: list[str], modelo: str = EMBEDDING_MODEL,
+                     batch_size: int = EMBED_BATCH_SIZE,
+                     max_concorrencia: int = EMBED_MAX_CONCORRENCIA) -> np.ndarray:
+    """
+    Gera embeddings para vários textos. Consulta antes o cache em disco e só envia
+    à API os textos inéditos, em lotes concorrentes. Retorna uma matriz float32 (len(textos), dim).
+    """
+    if not textos:
+        return np.empty((0, EMBED_DIM), dtype="float32")
+
+    hashes, vetores, faltantes = _separar_faltantes(textos, modelo)
+    novos = None
+    if faltantes:
+        novos = _embed_sem_cache(list(faltantes.values()), modelo, batch_size, max_concorrencia)
+    return _completar(hashes, vetores, faltantes, novos, modelo)
+
+
+@medido("embeddings", "consulta")
+def gerar_embedding(texto: str, modelo: str = EMBEDDING_MODEL) -> np.ndarray:
+    """Gera o embedding de um único texto; fora do cache, vai à API junto com os de outras requisições."""
+    hashes, vetores, faltantes = _separar_faltantes([texto], modelo)
+    novos = None
+    if faltantes:
+        novos = obter_agrupador_embeddings().enviar(texto, modelo).result()[None]
+    return _completar(hashes, vetores, faltantes, novos, modelo)[0]
+
+
+async def _aembed_lote(lote: list[str], modelo: str, semaforo: asyncio.Semaphore) -> np.ndarray:
+    """Versão assíncrona de _embed_lote, usando o cliente AsyncOpenAI."""
+    async with semaforo:
+        for tentativa in range(EMBED_MAX_TENTATIVAS):
+            try:
+                with medir("openai", modelo, textos=len(lote)) as span:
+                    resp = await aclient.embeddings.create(model=modelo, input=lote, **DIMENSOES)
+                    span["tokens"] = _contar_tokens(resp, modelo)
+                break
+            except ERROS_TRANSITORIOS as e:
+                if tentativa == EMBED_MAX_TENTATIVAS - 1:
+                    raise
+                espera = _tempo_espera(e, tentativa)
+                print(f"[AVISO] Embeddings: {type(e).__name__}, nova tentativa em {espera:.1f}s")
+                await asyncio.sleep(espera)
+    return _matriz_da_resposta(resp)
+
+
+@medido("embeddings", "lote")
+async def agerar_embeddings(textos: list[str], modelo: str = EMBEDDING_MODEL,
+                            batch_size: int = EMBED_BATCH_SIZE,
+                            max_concorrencia: int = EMBED_MAX_CONCORRENCIA) -> np.ndarray:
+    """Versão assíncrona de gerar_embeddings: a API e o cache em SQLite (no pool de threads) não bloqueiam o event loop."""
+    if not textos:
+        return np.empty((0, EMBED_DIM), dtype="float32")
+
+    hashes, vetores, faltantes = await em_thread(_separar_faltantes, textos, modelo)
+    novos = None
+    if faltantes:
+        pendentes = list(faltantes.values())
+        semaforo = asyncio.Semaphore(max_concorrencia)
+        lotes = [pendentes[i:i + batch_size] for i in range(0, len(pendentes), batch_size)]
+        matrizes = await asyncio.gather(*(_aembed_lote(lote, modelo, semaforo) for lote in lotes))
+        novos = np.vstack(matrizes)
+    return await em_thread(_completar, hashes, vetores, faltantes, novos, modelo)
+
+
+@medido("embeddings", "consulta")
+async def agerar_embedding(texto: str, modelo: str = EMBEDDING_MODEL) -> np.ndarray:
+    """Versão assíncrona de gerar_embedding: cache no pool de threads e agrupador aguardados sem bloquear o event loop."""
+    hashes, vetores, faltantes = await em_thread(_separar_faltantes, [texto], modelo)
+    novos = None
+    if faltantes:
+        novos = (await asyncio.wrap_future(obter_agrupador_embeddings().enviar(texto, modelo)))[None]
+    return (await em_thread(_completar, hashes, vetores, faltantes, novos, modelo))[0]
@@ -0,0 +1,77 @@
+"""
+Processo escritor do índice FAISS para a API com vários workers.
+
+Os workers rodam com RAG_MODO=leitor: abrem a versão publicada do índice mapeada em
+memória e enfileiram o que precisam indexar em CAMINHO_FILA_INGESTAO. Este processo é
+o único que grava: consome a fila em lotes (RAGMemory.add_lote) e, a cada compactação,
+publica uma nova versão que os leitores adotam sozinhos. Com um único worker em modo
+escritor, a própria API atende a fila (ver obter_rag_memory) e este processo é dispensado.
+
+Uso:
+    RAG_MODO=leitor gunicorn -c gunicorn.conf.py api_server:app
+    python -m utils.escritor_indice
+"""
+import argparse
+import signal
+import threading
+import time
+from utils.fila_ingestao import FilaIngestao
+from utils.rag_memory import RAGMemory
+from configuracoes.config import RAG_INTERVALO_FILA
+
+LIMPAR_A_CADA = 3600  # segundos entre remoções de pedidos antigos da fila
+
+
+def processar_pendentes(rag: RAGMemory, fila: FilaIngestao) -> int:
+    """Indexa os pedidos pendentes num único lote; retorna quantos pedidos foram concluídos."""
+    pedidos = fila.pendentes()
+    if not pedidos:
+        return 0
+    ids = [id_ for id_, _ in pedidos]
+    documentos = [tuple(doc) for _, docs in pedidos for doc in docs]
+    try:
+        novos = rag.add_lote(documentos)
+    except Exception as e:
+        print(f"[ERRO] Falha ao indexar os pedidos {ids}: {e}")
+        fila.concluir(ids, None, erro=f"{type(e).__name__}: {e}")
+    else:
+        fila.concluir(ids, rag.index.ntotal)
+        print(f"[INFO] {len(ids)} pedidos, {novos} chunks novos; índice com {rag.index.ntotal} vetores")
+    return len(ids)
+
+
+def atender_fila(rag: RAGMemory, fila: FilaIngestao, parar: threading.Event, intervalo: float = RAG_INTERVALO_FILA):
+    """Consome a fila até `parar`; também roda numa thread da API em modo escritor (obter_rag_memory)."""
+    ultima_limpeza = 0.0
+    while not parar.is_set():
+        try:
+            if not processar_pendentes(rag, fila):
+                parar.wait(intervalo)
+            if time.monotonic() - ultima_limpeza > LIMPAR_A_CADA:
+                fila.limpar()
+                ultima_limpeza = time.monotonic()
+        except Exception as e:
+            print(f"[AVISO] Falha ao ler a fila de ingestão: {e}")
+            parar.wait(intervalo)
+
+
+def executar(parar: threading.Event, intervalo: float = RAG_INTERVALO_FILA):
+    rag = RAGMemory(modo="escritor")  # ignora RAG_MODO herdado dos workers
+    print(f"[INFO] Escritor do índice pronto ({rag.index.ntotal} vetores)")
+    atender_fila(rag, FilaIngestao(), parar, intervalo)
+    # Publica o que ficou só em segmentos antes de sair
+    rag.compactar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--intervalo", type=float, default=RAG_INTERVALO_FILA, help="segundos entre consultas à fila vazia")
+    args = parser.parse_args()
+    parar = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: parar.set())
+    signal.signal(signal.SIGINT, lambda *_: parar.set())
+    executar(parar, args.intervalo)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from configuracoes.config import CAMINHO_FILA_INGESTAO
+
+
+class FilaIngestao:
+    """
+    Pedidos de indexação dos workers leitores para o processo escritor, em SQLite.
+    Cada pedido guarda os documentos (textos, manual_id, url, categoria); ao concluí-lo,
+    o escritor registra o total de vetores do índice, que o leitor espera enxergar.
+    """
+
+    def __init__(self, caminho: str = CAMINHO_FILA_INGESTAO):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pedidos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                documentos TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                ntotal INTEGER,
+                erro TEXT
+            )
+        """)
+        self._conn.commit()
+
+    def enfileirar(self, documentos: list[tuple[list[str], int, str, str]]) -> int:
+        with self._lock:
+            c = self._conn.execute(
+                "INSERT INTO pedidos (documentos, criado_em) VALUES (?, ?)",
+                (json.dumps(documentos, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+            return c.lastrowid
+
+    def pendentes(self, limite: int = 100) -> list[tuple[int, list]]:
+        with self._lock:
+            linhas = self._conn.execute(
+                "SELECT id, documentos FROM pedidos WHERE ntotal IS NULL AND erro IS NULL ORDER BY id LIMIT ?", (limite,)
+            ).fetchall()
+        return [(id_, json.loads(documentos)) for id_, documentos in linhas]
+
+    def concluir(self, ids: list[int], ntotal: int, erro: str = None):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE pedidos SET ntotal = ?, erro = ? WHERE id = ?", [(ntotal, erro, id_) for id_ in ids]
+            )
+            self._conn.commit()
+
+    def situacao(self, id_: int) -> tuple[int | None, str | None]:
+        """(ntotal, erro) do pedido; ambos None enquanto o escritor não o processou."""
+        with self._lock:
+            linha = self._conn.execute("SELECT ntotal, erro FROM pedidos WHERE id = ?", (id_,)).fetchone()
+        return linha if linha else (None, "pedido inexistente")
+
+    def limpar(self, idade: float = 24 * 3600):
+        """Remove pedidos concluídos há mais de `idade` segundos."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM pedidos WHERE (ntotal IS NOT NULL OR erro IS NOT NULL) AND criado_em < ?",
+                (time.time() - idade,)
+            )
+            self._conn.commit()
@@ -0,0 +1,40 @@
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from configuracoes.config import HTTP_TIMEOUT, HTTP_POOL_MAXSIZE
+
+# Headers completos para simular navegador
+HEADERS_NAVEGADOR = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
+    "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8",
+    "Accept-Encoding": "gzip, deflate, br",
+    "DNT": "1",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1",
+    "Sec-Fetch-Dest": "document",
+    "Sec-Fetch-Mode": "navigate",
+    "Sec-Fetch-Site": "none",
+    "Cache-Control": "max-age=0"
+}
+
+# Sessão síncrona compartilhada: reaproveita conexões keep-alive entre as ferramentas
+sessao = requests.Session()
+sessao.headers.update(HEADERS_NAVEGADOR)
+_adaptador = HTTPAdapter(pool_connections=HTTP_POOL_MAXSIZE, pool_maxsize=HTTP_POOL_MAXSIZE)
+sessao.mount("http://", _adaptador)
+sessao.mount("https://", _adaptador)
+
+_cliente_async = None
+
+
+def cliente_async() -> httpx.AsyncClient:
+    """Cliente HTTP assíncrono compartilhado (pool de conexões reaproveitado entre requisições)."""
+    global _cliente_async
+    if _cliente_async is None or _cliente_async.is_closed:
+        _cliente_async = httpx.AsyncClient(
+            headers=HEADERS_NAVEGADOR, timeout=HTTP_TIMEOUT, follow_redirects=True,
+            limits=httpx.Limits(max_connections=HTTP_POOL_MAXSIZE, max_keepalive_connections=HTTP_POOL_MAXSIZE)
+        )
+    return _cliente_async
+
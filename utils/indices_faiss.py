@@ -0,0 +1,218 @@
+import math
+import threading
+import numpy as np
+import faiss
+from configuracoes.config import (
+    FAISS_INDEX_TIPO, FAISS_IVF_NLIST, FAISS_HNSW_M, FAISS_PQ_M, FAISS_NPROBE,
+    FAISS_EF_SEARCH, FAISS_EF_SEARCH_FILTRADO, FAISS_FILTRO_EXATO_MAX_IDS, FAISS_MIN_VETORES_TREINO, FAISS_MIN_VETORES_SQ8,
+    EMBED_QUANTIZACAO
+)
+from utils.quantizacao import validar_quantizacao
+
+TIPOS_INDEX = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+# Como cada vetor é guardado: float32 inteiro ou scalar quantizer de 16/8 bits
+CODIFICACOES = {"nenhuma": "Flat", "fp16": "SQfp16", "int8": "SQ8"}
+
+_lock_mapa_direto = threading.Lock()
+
+
+def descricao_factory(tipo: str, nlist: int = FAISS_IVF_NLIST, quantizacao: str = EMBED_QUANTIZACAO) -> str:
+    """Traduz o tipo e a quantização configurados para a string do faiss.index_factory."""
+    validar_quantizacao(quantizacao)
+    codificacao = CODIFICACOES[quantizacao]
+    if tipo == "flat":
+        return codificacao
+    if tipo == "ivf_flat":
+        return f"IVF{nlist},{codificacao}"
+    if tipo == "hnsw":
+        return f"HNSW{FAISS_HNSW_M}" if quantizacao == "nenhuma" else f"HNSW{FAISS_HNSW_M},{codificacao}"
+    if tipo == "ivf_pq":
+        return f"IVF{nlist},PQ{FAISS_PQ_M}"  # o PQ já comprime; a quantização escalar não se aplica
+    raise ValueError(f"Tipo de índice FAISS desconhecido: {tipo}. Use um de {TIPOS_INDEX}.")
+
+
+def minimo_para_treino(tipo: str, quantizacao: str = EMBED_QUANTIZACAO) -> int:
+    """Quantidade de vetores a partir da qual o backend aproximado (ou quantizado) compensa o flat float32."""
+    if tipo in ("ivf_flat", "ivf_pq"):
+        return FAISS_MIN_VETORES_TREINO
+    if quantizacao == "int8":
+        return FAISS_MIN_VETORES_SQ8  # os intervalos do SQ8 são treinados nos vetores
+    if tipo == "hnsw" or quantizacao == "fp16":
+        return 1  # não exige treino
+    return 0
+
+
+def aplicar_parametros_padrao(index, nprobe: int = FAISS_NPROBE, ef_search: int = FAISS_EF_SEARCH):
+    """Ajusta nprobe/efSearch padrão do índice (também após ler do disco)."""
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except (RuntimeError, AttributeError):
+        pass
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+    return index
+
+
+def normalizar(vetores: np.ndarray) -> np.ndarray:
+    """Cópia em float32 com norma L2 unitária: com ela, produto interno = similaridade de cosseno."""
+    vetores = np.array(np.atleast_2d(vetores), dtype="float32", order="C", copy=True)
+    faiss.normalize_L2(vetores)
+    return vetores
+
+
+def usa_cosseno(index) -> bool:
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+
+def criar_index(dim: int, tipo: str = FAISS_INDEX_TIPO, nlist: int = FAISS_IVF_NLIST,
+                quantizacao: str = EMBED_QUANTIZACAO):
+    """
+    Cria um índice vazio do backend configurado (os IVF e o int8 ainda precisam de treino).
+    A métrica é produto interno: os vetores devem entrar e ser consultados normalizados,
+    e as distâncias devolvidas já são similaridades de cosseno (maior = mais parecido).
+    """
+    index = faiss.index_factory(dim, descricao_factory(tipo, nlist, quantizacao), faiss.METRIC_INNER_PRODUCT)
+    return aplicar_parametros_padrao(index)
+
+
+def migrar_para_cosseno(index, nlist: int = FAISS_IVF_NLIST):
+    """Reconstrói um índice L2 antigo como produto interno sobre os vetores normalizados, mantendo os ids."""
+    tipo = "flat" if isinstance(index, faiss.IndexFlat) else FAISS_INDEX_TIPO
+    novo = criar_index(index.d, tipo, nlist)
+    if index.ntotal:
+        vetores = normalizar(index.reconstruct_n(0, index.ntotal))
+        if not novo.is_trained:
+            novo.train(vetores)
+        novo.add(vetores)
+    print(f"[INFO] Índice FAISS convertido de L2 para cosseno ({descricao_factory(tipo, nlist)}, {novo.ntotal} vetores)")
+    return novo
+
+
+def precisa_migrar(index, tipo: str = FAISS_INDEX_TIPO, ntotal: int = None,
+                   quantizacao: str = EMBED_QUANTIZACAO) -> bool:
+    """
+    True se o índice ainda é flat float32, o alvo configurado é outro (backend aproximado
+    ou quantizado) e já há vetores suficientes (`ntotal`, padrão o do índice) para ele.
+    """
+    return (
+        descricao_factory(tipo, quantizacao=quantizacao) != "Flat"
+        and isinstance(index, faiss.IndexFlat)
+        and (index.ntotal if ntotal is None else ntotal) >= minimo_para_treino(tipo, quantizacao)
+    )
+
+
+def migrar_index(index_flat, tipo: str = FAISS_INDEX_TIPO, nlist: int = FAISS_IVF_NLIST,
+                 quantizacao: str = EMBED_QUANTIZACAO):
+    """
+    Reconstrói os vetores do índice flat, treina o backend configurado (com a quantização
+    configurada) e os adiciona na mesma ordem, preservando os ids sequenciais usados pela meta.
+    """
+    vetores = index_flat.reconstruct_n(0, index_flat.ntotal)
+    novo = criar_index(index_flat.d, tipo, nlist, quantizacao)
+    if not novo.is_trained:
+        novo.train(vetores)
+    novo.add(vetores)
+    print(f"[INFO] Índice FAISS migrado de Flat para {descricao_factory(tipo, nlist, quantizacao)} ({novo.ntotal} vetores)")
+    return novo
+
+
+def _extrair_ivf(index):
+    try:
+        return faiss.extract_index_ivf(index)
+    except (RuntimeError, AttributeError):
+        return None
+
+
+def parametros_busca(index, nprobe: int = None, ef_search: int = None, ids_permitidos: np.ndarray = None):
+    """
+    Monta SearchParameters por consulta, sem alterar o padrão do índice.
+    Com `ids_permitidos`, só esses ids têm a distância calculada (IDSelectorBatch). No IVF o
+    nprobe cresce na proporção inversa da fração permitida (metade dos ids, o dobro de
+    listas), até nlist; no HNSW o efSearch sobe para compensar os vizinhos descartados.
+    Allow-lists pequenas nem chegam aqui: `buscar` as compara direto (ver _buscar_subconjunto).
+    """
+    seletor = None
+    if ids_permitidos is not None:
+        seletor = faiss.IDSelectorBatch(np.ascontiguousarray(ids_permitidos, dtype="int64"))
+
+    ivf = _extrair_ivf(index)
+    if ivf is not None and (nprobe is not None or seletor is not None):
+        nprobe = nprobe or ivf.nprobe
+        if seletor is not None:
+            fracao = max(len(ids_permitidos), 1) / max(ivf.ntotal, 1)
+            params = faiss.SearchParametersIVF(sel=seletor, nprobe=min(ivf.nlist, math.ceil(nprobe / fracao)))
+        else:
+            params = faiss.SearchParametersIVF(nprobe=nprobe)
+    elif hasattr(index, "hnsw") and (ef_search is not None or seletor is not None):
+        if seletor is not None:
+            params = faiss.SearchParametersHNSW(sel=seletor, efSearch=max(ef_search or 0, FAISS_EF_SEARCH_FILTRADO))
+        else:
+            params = faiss.SearchParametersHNSW(efSearch=ef_search)
+    elif seletor is not None:
+        params = faiss.SearchParameters(sel=seletor)
+    else:
+        return None
+    params.seletor = seletor  # o SearchParameters não mantém o seletor vivo do lado Python
+    return params
+
+
+def _subconjunto_pequeno(ids_permitidos: np.ndarray | None) -> bool:
+    return ids_permitidos is not None and len(ids_permitidos) <= FAISS_FILTRO_EXATO_MAX_IDS
+
+
+def _vetores_por_id(index, ids: np.ndarray) -> np.ndarray:
+    """Vetores (reconstruídos) dos ids; o IVF ganha o mapa direto id -> lista no primeiro uso."""
+    ivf = _extrair_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        with _lock_mapa_direto:
+            if ivf.direct_map.type == faiss.DirectMap.NoMap:
+                ivf.make_direct_map()
+    return index.reconstruct_batch(np.ascontiguousarray(ids, dtype="int64"))
+
+
+def _buscar_subconjunto(index, consultas: np.ndarray, k: int, ids: np.ndarray):
+    """Busca exata só entre os `ids`: reconstrói os vetores deles e compara com faiss.knn."""
+    ids = np.asarray(ids, dtype="int64")
+    D, posicoes = faiss.knn(np.ascontiguousarray(consultas, dtype="float32"), _vetores_por_id(index, ids), k,
+                            metric=index.metric_type)
+    return D, np.where(posicoes >= 0, ids[posicoes], -1)
+
+
+def buscar(index, consultas: np.ndarray, k: int, nprobe: int = None, ef_search: int = None,
+           ids_permitidos: np.ndarray = None):
+    """index.search com nprobe/efSearch e filtro de ids opcionais por consulta. Retorna (D, I)."""
+    if ids_permitidos is not None and len(ids_permitidos) == 0:
+        n = len(consultas)
+        vazio = -np.inf if usa_cosseno(index) else np.inf
+        return np.full((n, k), vazio, dtype="float32"), np.full((n, k), -1, dtype="int64")
+    if _subconjunto_pequeno(ids_permitidos):
+        return _buscar_subconjunto(index, consultas, k, ids_permitidos)
+    params = parametros_busca(index, nprobe, ef_search, ids_permitidos)
+    if params is None:
+        return index.search(consultas, k)
+    return index.search(consultas, k, params=params)
+
+
+def buscar_por_limiar(index, consulta: np.ndarray, limiar: float, max_resultados: int,
+                      nprobe: int = None, ef_search: int = None, ids_permitidos: np.ndarray = None):
+    """
+    range_search para uma consulta: devolve (similaridades, ids) de todos os vetores com
+    similaridade acima de `limiar`, da maior para a menor, limitados a `max_resultados`.
+    """
+    if ids_permitidos is not None and len(ids_permitidos) == 0:
+        return np.empty(0, dtype="float32"), np.empty(0, dtype="int64")
+    consulta = consulta.reshape(1, -1)
+    if _subconjunto_pequeno(ids_permitidos):
+        D, I = _buscar_subconjunto(index, consulta, len(ids_permitidos), ids_permitidos)
+        D, I = D[0], I[0]
+        # Mesmo critério do range_search: acima do limiar no produto interno, abaixo no L2
+        dentro = (D > limiar) if usa_cosseno(index) else (D < limiar)
+        return D[dentro][:max_resultados], I[dentro][:max_resultados]
+    params = parametros_busca(index, nprobe, ef_search, ids_permitidos)
+    if params is None:
+        lims, D, I = index.range_search(consulta, limiar)
+    else:
+        lims, D, I = index.range_search(consulta, limiar, params=params)
+    D, I = D[lims[0]:lims[1]], I[lims[0]:lims[1]]
+    ordem = np.argsort(-D, kind="stable")[:max_resultados]
+    return D[ordem], I[ordem]
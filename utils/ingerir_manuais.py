@@ -0,0 +1,253 @@
+"""
+Ingestão em lote de manuais, fora das requisições de chat.
+
+As páginas são baixadas em paralelo (cliente HTTP assíncrono compartilhado), divididas
+em chunks num pool de processos e indexadas em lotes: um lote de embeddings, um
+segmento FAISS e uma transação em `manuais` e no armazém de chunks por lote. O
+progresso por URL fica em CAMINHO_PROGRESSO_INGESTAO, então uma execução interrompida
+continua de onde parou; os chunks também vão para o cache de páginas das ferramentas.
+
+Pode rodar com a API no ar: se outro processo já é o escritor do índice (a API em modo
+escritor ou utils.escritor_indice), os lotes vão pela fila de ingestão e cada URL só é
+marcada como concluída depois que o escritor a indexa.
+
+Uso:
+    python -m utils.ingerir_manuais urls.txt                          # uma URL por linha
+    python -m utils.ingerir_manuais --sitemap https://site/sitemap.xml --contendo /kb/
+    python -m utils.ingerir_manuais urls.txt --categoria contabilidade --json relatorio.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from lxml import etree
+from utils.http import cliente_async
+from utils.assincrono import em_thread
+from utils.cache_embeddings import hash_conteudo
+from utils.cache_paginas import obter_cache_paginas, Pagina
+from utils.chunker_html import dividir_artigo, dividir_html
+from utils.rag_memory import RAGMemory, EscritorOcupado, validar_categoria
+from utils.sqlite_manuais import inserir_manuais_com_embedding
+from configuracoes.config import (
+    RAG_MODO, CAMINHO_PROGRESSO_INGESTAO, INGESTAO_CONCORRENCIA, INGESTAO_PROCESSOS, INGESTAO_LOTE_PAGINAS
+)
+
+# Mesmas chaves do cache de páginas usadas pelas ferramentas, que passam a achar as páginas prontas
+EXTRATORES = {
+    "kb-article-secoes": dividir_artigo,
+    "pagina-inteira-secoes": dividir_html,
+}
+
+
+class Progresso:
+    """Situação de cada URL já processada (ok, vazia ou erro)."""
+
+    def __init__(self, caminho: str = CAMINHO_PROGRESSO_INGESTAO):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ingestao (
+                url TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                chunks INTEGER NOT NULL DEFAULT 0,
+                erro TEXT,
+                atualizado_em REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def concluidas(self) -> set[str]:
+        """URLs que não precisam ser refeitas (as com erro são tentadas de novo)."""
+        return {linha[0] for linha in self._conn.execute("SELECT url FROM ingestao WHERE status != 'erro'")}
+
+    def registrar(self, linhas: list[tuple[str, str, int, str | None]]):
+        """Grava (url, status, chunks, erro) de um lote numa única transação."""
+        agora = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO ingestao (url, status, chunks, erro, atualizado_em) VALUES (?, ?, ?, ?, ?)",
+            [(*linha, agora) for linha in linhas]
+        )
+        self._conn.commit()
+
+
+def ler_urls(caminho: str) -> list[str]:
+    with open(caminho, encoding="utf-8") as f:
+        return [linha.strip() for linha in f if linha.strip() and not linha.startswith("#")]
+
+
+async def urls_do_sitemap(url: str) -> list[str]:
+    """URLs de um sitemap.xml, seguindo sitemaps de índice."""
+    r = await cliente_async().get(url)
+    r.raise_for_status()
+    raiz = etree.fromstring(r.content, etree.XMLParser(resolve_entities=False, no_network=True))
+    locs = [e.text.strip() for e in raiz.iter("{*}loc") if e.text]
+    if etree.QName(raiz).localname != "sitemapindex":
+        return locs
+    urls = []
+    for sitemap in locs:
+        urls.extend(await urls_do_sitemap(sitemap))
+    return urls
+
+
+def _dividir(extrator: str, html: str) -> list[str]:
+    # Roda nos processos do pool: parsing e tokenização não disputam o GIL com os downloads
+    return list(EXTRATORES[extrator](html))
+
+
+def _titulo(url: str) -> str:
+    # Mesmo título que as ferramentas dão a manuais novos
+    return url.rstrip("/").split("/")[-1]
+
+
+def abrir_rag() -> RAGMemory:
+    """Escritor do índice, ou leitor que entrega os lotes pela fila se outro processo já escreve."""
+    if RAG_MODO == "escritor":
+        try:
+            return RAGMemory(modo="escritor")
+        except EscritorOcupado:
+            print("[INFO] Outro processo já é o escritor do índice; os lotes serão indexados por ele via fila.")
+    return RAGMemory(modo="leitor")
+
+
+def _gravar_lote(rag: RAGMemory, paginas: list[dict], extrator: str, categoria: str | None,
+                 progresso: Progresso) -> int:
+    """Grava manuais, chunks/vetores, cache de páginas e progresso de um lote; retorna os chunks novos."""
+    com_chunks = [p for p in paginas if p["chunks"]]
+    novos = 0
+    if com_chunks:
+        ids = inserir_manuais_com_embedding([(_titulo(p["url"]), p["url"]) for p in com_chunks])
+        # Sem o escritor, o lote falha e as URLs ficam sem progresso, para a próxima execução refazê-las
+        novos = rag.add_lote(
+            [(p["chunks"], ids.get(p["url"]), p["url"], categoria) for p in com_chunks], exigir_indexacao=True
+        )
+    cache = obter_cache_paginas()
+    for p in paginas:
+        cache.salvar(p["url"], extrator, p["etag"], p["last_modified"], p["hash_html"], Pagina(p["chunks"]))
+    progresso.registrar([(p["url"], "ok" if p["chunks"] else "vazia", len(p["chunks"]), None) for p in paginas])
+    return novos
+
+
+async def ingerir(urls: list[str], extrator: str = "kb-article-secoes", categoria: str = None,
+                  concorrencia: int = INGESTAO_CONCORRENCIA, processos: int = INGESTAO_PROCESSOS,
+                  lote: int = INGESTAO_LOTE_PAGINAS, refazer: bool = False) -> dict:
+    """Baixa, divide e indexa as URLs; retorna o resumo da execução."""
+    validar_categoria(categoria)
+    inicio = time.perf_counter()
+    progresso = Progresso()
+    urls = list(dict.fromkeys(urls))
+    total = len(urls)
+    if not refazer:
+        feitas = progresso.concluidas()
+        urls = [u for u in urls if u not in feitas]
+
+    rag = await em_thread(abrir_rag)  # carrega o índice antes de abrir os downloads
+    resumo = {"urls": total, "puladas": total - len(urls), "ok": 0, "vazias": 0, "erros": 0,
+              "chunks": 0, "chunks_novos": 0, "gravacao_s": 0.0}
+    semaforo = asyncio.Semaphore(concorrencia)
+    loop = asyncio.get_running_loop()
+
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        async def processar(url: str) -> dict:
+            try:
+                async with semaforo:
+                    r = await cliente_async().get(url)
+                    r.raise_for_status()
+                chunks = await loop.run_in_executor(pool, _dividir, extrator, r.text)
+                return {"url": url, "chunks": chunks, "etag": r.headers.get("ETag"),
+                        "last_modified": r.headers.get("Last-Modified"), "hash_html": hash_conteudo(r.text)}
+            except Exception as e:
+                return {"url": url, "erro": f"{type(e).__name__}: {e}"}
+
+        async def gravar(paginas: list[dict]):
+            t0 = time.perf_counter()
+            resumo["chunks_novos"] += await em_thread(_gravar_lote, rag, paginas, extrator, categoria, progresso)
+            resumo["gravacao_s"] += time.perf_counter() - t0
+            feitas = resumo["ok"] + resumo["vazias"] + resumo["erros"]
+            print(f"[INFO] {feitas}/{len(urls)} páginas, {resumo['chunks_novos']} chunks novos")
+
+        pendentes = []
+        for tarefa in asyncio.as_completed([processar(u) for u in urls]):
+            pagina = await tarefa
+            if "erro" in pagina:
+                resumo["erros"] += 1
+                print(f"[AVISO] {pagina['url']}: {pagina['erro']}")
+                await em_thread(progresso.registrar, [(pagina["url"], "erro", 0, pagina["erro"])])
+                continue
+            resumo["ok" if pagina["chunks"] else "vazias"] += 1
+            resumo["chunks"] += len(pagina["chunks"])
+            pendentes.append(pagina)
+            if len(pendentes) >= lote:
+                await gravar(pendentes)
+                pendentes = []
+        if pendentes:
+            await gravar(pendentes)
+
+    # Deixa a base FAISS compactada ao fim de uma carga grande (no modo leitor, isso é com o escritor)
+    if not rag.somente_leitura:
+        await em_thread(rag.compactar)
+    await cliente_async().aclose()
+
+    duracao = time.perf_counter() - inicio
+    processadas = resumo["ok"] + resumo["vazias"] + resumo["erros"]
+    resumo.update({
+        "duracao_s": duracao,
+        "paginas_por_s": processadas / duracao if duracao else 0.0,
+        "chunks_por_s": resumo["chunks"] / duracao if duracao else 0.0,
+    })
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("arquivo", nargs="?", help="arquivo com uma URL por linha")
+    parser.add_argument("--sitemap", action="append", default=[], help="sitemap.xml (pode repetir)")
+    parser.add_argument("--contendo", help="só URLs que contêm este trecho")
+    parser.add_argument("--limite", type=int, help="no máximo N URLs")
+    parser.add_argument("--pagina-inteira", action="store_true", help="indexa a página toda, não só article#kb-article")
+    parser.add_argument("--categoria", help="categoria de intenção dos chunks ingeridos")
+    parser.add_argument("--concorrencia", type=int, default=INGESTAO_CONCORRENCIA)
+    parser.add_argument("--processos", type=int, default=INGESTAO_PROCESSOS)
+    parser.add_argument("--lote", type=int, default=INGESTAO_LOTE_PAGINAS, help="páginas por lote de gravação")
+    parser.add_argument("--refazer", action="store_true", help="reprocessa URLs já concluídas")
+    parser.add_argument("--json", help="salva o resumo neste arquivo")
+    args = parser.parse_args()
+    if not args.arquivo and not args.sitemap:
+        parser.error("informe um arquivo de URLs e/ou --sitemap")
+
+    async def executar():
+        urls = ler_urls(args.arquivo) if args.arquivo else []
+        for sitemap in args.sitemap:
+            urls.extend(await urls_do_sitemap(sitemap))
+        if args.contendo:
+            urls = [u for u in urls if args.contendo in u]
+        if args.limite:
+            urls = urls[:args.limite]
+        return await ingerir(
+            urls, "pagina-inteira-secoes" if args.pagina_inteira else "kb-article-secoes", args.categoria,
+            args.concorrencia, args.processos, args.lote, args.refazer
+        )
+
+    try:
+        resumo = asyncio.run(executar())
+    except TimeoutError as e:
+        raise SystemExit(f"[ERRO] {e}")
+    print(
+        f"{resumo['ok']} páginas indexadas, {resumo['vazias']} sem conteúdo, {resumo['erros']} com erro, "
+        f"{resumo['puladas']} já concluídas\n"
+        f"{resumo['chunks']} chunks ({resumo['chunks_novos']} novos) em {resumo['duracao_s']:.1f} s: "
+        f"{resumo['paginas_por_s']:.1f} páginas/s, {resumo['chunks_por_s']:.1f} chunks/s "
+        f"({resumo['gravacao_s']:.1f} s em embeddings e gravação)"
+    )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resumo, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
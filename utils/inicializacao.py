@@ -0,0 +1,50 @@
+import functools
+import threading
+import time
+
+# Recursos pesados (índice FAISS, bancos, tokenizador, agente) registrados por nome.
+# Nada é carregado no import: cada um nasce no primeiro uso ou quando o /ready chama aquecer()
+RECURSOS = {}
+
+
+def preguicoso(nome: str):
+    """
+    Decorator para fábricas de singletons: a fábrica roda uma única vez, no primeiro
+    acesso (protegida por lock), e as chamadas seguintes devolvem a mesma instância.
+    """
+    def decorador(fabrica):
+        lock = threading.Lock()
+        instancia = []
+
+        @functools.wraps(fabrica)
+        def obter():
+            if not instancia:
+                with lock:
+                    if not instancia:
+                        instancia.append(fabrica())
+            return instancia[0]
+
+        obter.carregado = lambda: bool(instancia)
+        RECURSOS[nome] = obter
+        return obter
+
+    return decorador
+
+
+def aquecer() -> dict[str, float]:
+    """Carrega todos os recursos registrados e retorna o tempo (s) de cada um."""
+    tempos = {}
+    # Carregar um recurso pode importar módulos que registram outros; repete até não sobrar nenhum
+    pendentes = list(RECURSOS)
+    while pendentes:
+        for nome in pendentes:
+            inicio = time.perf_counter()
+            RECURSOS[nome]()
+            tempos[nome] = time.perf_counter() - inicio
+        pendentes = [nome for nome in RECURSOS if nome not in tempos]
+    return tempos
+
+
+def estado() -> dict[str, bool]:
+    """Quais recursos já foram carregados neste processo."""
+    return {nome: obter.carregado() for nome, obter in RECURSOS.items()}
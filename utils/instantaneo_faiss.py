@@ -0,0 +1,97 @@
+import numpy as np
+import faiss
+from utils.indices_faiss import buscar, buscar_por_limiar, precisa_migrar, migrar_index
+from configuracoes.config import FAISS_INDEX_TIPO
+
+
+class Instantaneo:
+    """
+    Estado imutável do índice publicado para as buscas: a base (qualquer backend) e um
+    delta flat com os vetores mais recentes, cujos ids continuam a numeração da base.
+
+    Nenhum dos dois é alterado depois de publicado. Uma escrita gera um novo
+    Instantaneo copiando só o delta (pequeno) e a troca de referência é atômica, então
+    as buscas nunca esperam a ingestão nem enxergam um índice pela metade. Quando o
+    delta cresce, `consolidado()` o incorpora numa cópia da base.
+    """
+
+    __slots__ = ("base", "delta")
+
+    def __init__(self, base, delta=None):
+        self.base = base
+        self.delta = delta
+
+    @property
+    def ntotal(self) -> int:
+        return self.base.ntotal + (self.delta.ntotal if self.delta is not None else 0)
+
+    @property
+    def d(self) -> int:
+        return self.base.d
+
+    @property
+    def tamanho_delta(self) -> int:
+        return self.delta.ntotal if self.delta is not None else 0
+
+    def com_vetores(self, vetores: np.ndarray) -> "Instantaneo":
+        """Novo instantâneo com `vetores` (já normalizados) anexados ao fim."""
+        if self.delta is None:
+            delta = faiss.IndexFlat(self.base.d, self.base.metric_type)
+        else:
+            delta = faiss.clone_index(self.delta)
+        delta.add(vetores)
+        return Instantaneo(self.base, delta)
+
+    def consolidado(self, tipo: str = FAISS_INDEX_TIPO) -> "Instantaneo":
+        """Novo instantâneo sem delta, migrando a base para `tipo` se já houver vetores para o treino."""
+        if not self.tamanho_delta:
+            base = self.base
+        else:
+            base = faiss.clone_index(self.base)
+            base.add(self.delta.reconstruct_n(0, self.delta.ntotal))
+        if precisa_migrar(base, tipo):
+            base = migrar_index(base, tipo)
+        return Instantaneo(base)
+
+    def reconstruct_n(self, inicio: int, n: int) -> np.ndarray:
+        partes = []
+        fim = inicio + n
+        if inicio < self.base.ntotal:
+            partes.append(self.base.reconstruct_n(inicio, min(fim, self.base.ntotal) - inicio))
+        if fim > self.base.ntotal and self.tamanho_delta:
+            de = max(inicio - self.base.ntotal, 0)
+            partes.append(self.delta.reconstruct_n(de, min(fim - self.base.ntotal, self.delta.ntotal) - de))
+        return np.vstack(partes) if partes else np.empty((0, self.d), dtype="float32")
+
+    def _dividir_ids(self, ids_permitidos: np.ndarray | None):
+        if ids_permitidos is None:
+            return None, None
+        offset = self.base.ntotal
+        return ids_permitidos[ids_permitidos < offset], ids_permitidos[ids_permitidos >= offset] - offset
+
+    def buscar(self, consultas: np.ndarray, k: int, nprobe: int = None, ef_search: int = None,
+               ids_permitidos: np.ndarray = None):
+        """Busca na base e no delta e junta os k mais parecidos. Retorna (D, I) com ids globais."""
+        ids_base, ids_delta = self._dividir_ids(ids_permitidos)
+        D, I = buscar(self.base, consultas, k, nprobe=nprobe, ef_search=ef_search, ids_permitidos=ids_base)
+        if not self.tamanho_delta:
+            return D, I
+        Dd, Id = buscar(self.delta, consultas, k, ids_permitidos=ids_delta)
+        Id = np.where(Id >= 0, Id + self.base.ntotal, -1)
+        D, I = np.hstack([D, Dd]), np.hstack([I, Id])
+        ordem = np.argsort(-D, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(D, ordem, axis=1), np.take_along_axis(I, ordem, axis=1)
+
+    def buscar_por_limiar(self, consulta: np.ndarray, limiar: float, max_resultados: int,
+                          nprobe: int = None, ef_search: int = None, ids_permitidos: np.ndarray = None):
+        """range_search na base e no delta; (similaridades, ids) do mais para o menos parecido."""
+        ids_base, ids_delta = self._dividir_ids(ids_permitidos)
+        D, I = buscar_por_limiar(
+            self.base, consulta, limiar, max_resultados, nprobe=nprobe, ef_search=ef_search, ids_permitidos=ids_base
+        )
+        if not self.tamanho_delta:
+            return D, I
+        Dd, Id = buscar_por_limiar(self.delta, consulta, limiar, max_resultados, ids_permitidos=ids_delta)
+        D, I = np.concatenate([D, Dd]), np.concatenate([I, Id + self.base.ntotal])
+        ordem = np.argsort(-D, kind="stable")[:max_resultados]
+        return D[ordem], I[ordem]
@@ -0,0 +1,95 @@
+"""
+Mede o custo de subir um worker: tempo de import de cada módulo (em processo novo,
+via `python -X importtime`) e, opcionalmente, o tempo de aquecer os recursos preguiçosos.
+
+Uso:
+    python -m utils.medir_inicializacao                      # api_server e módulos de ferramentas
+    python -m utils.medir_inicializacao api_server --top 15  # maiores imports de um módulo
+    python -m utils.medir_inicializacao --aquecer            # inclui o tempo do /ready
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+MODULOS_PADRAO = [
+    "api_server",
+    "tools.rag_tool",
+    "tools.inspector_tools",
+    "tools.qa_tools",
+    "tools.dataset_tools",
+    "tools.tool_mapa_semantico",
+]
+
+
+def medir_import(modulo: str) -> dict:
+    """Importa o módulo num interpretador limpo e devolve o total e os imports mais caros (ms)."""
+    inicio = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        capture_output=True, text=True
+    )
+    parede = (time.perf_counter() - inicio) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {modulo}:\n{proc.stderr[-2000:]}")
+
+    # Linhas no formato "import time: self [us] | cumulative | nome", com o nome indentado pela profundidade
+    imports = []
+    for linha in proc.stderr.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        proprio, cumulativo, nome = linha[len("import time:"):].split("|")
+        nivel = (len(nome) - len(nome.lstrip()) - 1) // 2
+        imports.append((nome.strip(), nivel, int(cumulativo) / 1000))
+
+    total = next((c for n, nivel, c in imports if n == modulo and nivel == 0), 0.0)
+    # Imports diretos do módulo, para o relatório mostrar de onde vem o custo
+    diretos = [(n, c) for n, nivel, c in imports if nivel == 1]
+    return {"modulo": modulo, "import_ms": total, "processo_ms": parede, "maiores": sorted(diretos, key=lambda x: -x[1])}
+
+
+def medir_aquecimento(modulo: str) -> dict:
+    """Importa o módulo e chama aquecer(), devolvendo o tempo de cada recurso (ms)."""
+    codigo = (
+        "import json, time\n"
+        f"import {modulo}\n"
+        "from utils.inicializacao import aquecer\n"
+        "print(json.dumps({k: v * 1000 for k, v in aquecer().items()}))\n"
+    )
+    proc = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Falha ao aquecer {modulo}:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modulos", nargs="*", default=MODULOS_PADRAO)
+    parser.add_argument("--top", type=int, default=5, help="quantos imports mais caros listar por módulo")
+    parser.add_argument("--aquecer", action="store_true", help="mede também o aquecimento dos recursos (/ready)")
+    parser.add_argument("--json", action="store_true", help="saída em JSON")
+    args = parser.parse_args()
+
+    relatorio = []
+    for modulo in args.modulos:
+        medida = medir_import(modulo)
+        medida["maiores"] = medida["maiores"][:args.top]
+        if args.aquecer:
+            medida["aquecimento_ms"] = medir_aquecimento(modulo)
+        relatorio.append(medida)
+
+    if args.json:
+        print(json.dumps(relatorio, indent=2, ensure_ascii=False))
+        return
+
+    for medida in relatorio:
+        print(f"{medida['modulo']}: import {medida['import_ms']:.0f} ms (processo completo {medida['processo_ms']:.0f} ms)")
+        for nome, ms in medida["maiores"]:
+            print(f"    {nome:<40} {ms:8.1f} ms")
+        for nome, ms in medida.get("aquecimento_ms", {}).items():
+            print(f"    aquecer {nome:<32} {ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
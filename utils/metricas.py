@@ -0,0 +1,128 @@
+import contextvars
+import functools
+import inspect
+import os
+import time
+from contextlib import contextmanager
+from configuracoes.config import METRICAS_BUCKETS, RASTREAR_REQUISICOES
+
+try:
+    import prometheus_client
+except ImportError:  # sem o pacote os spans só alimentam o rastreamento por requisição
+    prometheus_client = None
+
+if prometheus_client is not None:
+    DURACAO = prometheus_client.Histogram(
+        "spartacus_duracao_segundos", "Duração das operações (nós, ferramentas, OpenAI, FAISS, SQLite, HTTP)",
+        ["componente", "operacao"], buckets=METRICAS_BUCKETS
+    )
+    ERROS = prometheus_client.Counter(
+        "spartacus_erros", "Operações que terminaram em exceção", ["componente", "operacao"]
+    )
+    TOKENS = prometheus_client.Counter(
+        "spartacus_openai_tokens", "Tokens consumidos na API da OpenAI", ["modelo", "tipo"]
+    )
+
+# Spans da requisição atual: (início, duração, componente, operação, atributos, erro).
+# A lista é compartilhada pelas cópias do contexto (tarefas asyncio, em_thread)
+_rastro = contextvars.ContextVar("rastro", default=None)
+
+
+def registrar(componente: str, operacao: str, inicio: float, duracao: float, erro: bool = False,
+              atributos: dict = None):
+    """Grava um span já medido (inicio em time.perf_counter()) no histograma e no rastro da requisição."""
+    if prometheus_client is not None:
+        DURACAO.labels(componente, operacao).observe(duracao)
+        if erro:
+            ERROS.labels(componente, operacao).inc()
+    rastro = _rastro.get()
+    if rastro is not None:
+        rastro.append((inicio, duracao, componente, operacao, atributos or {}, erro))
+
+
+def registrar_tokens(modelo: str, **tokens: int):
+    """Soma tokens por tipo (prompt, completion, ...) no contador do modelo."""
+    if prometheus_client is None:
+        return
+    for tipo, quantidade in tokens.items():
+        if quantidade:
+            TOKENS.labels(modelo, tipo).inc(quantidade)
+
+
+@contextmanager
+def medir(componente: str, operacao: str, **atributos):
+    """
+    Span em volta de um bloco. Devolve o dicionário de atributos, para o bloco anotar o
+    span (tokens, tamanho do lote) antes de ele ser registrado.
+    """
+    inicio = time.perf_counter()
+    erro = False
+    try:
+        yield atributos
+    except Exception:
+        erro = True
+        raise
+    finally:
+        registrar(componente, operacao, inicio, time.perf_counter() - inicio, erro, atributos)
+
+
+def medido(componente: str, operacao: str = None):
+    """Decorator de `medir` para funções e corrotinas; a operação padrão é o nome da função."""
+    def decorador(func):
+        nome = operacao or func.__name__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def envolvida(*args, **kwargs):
+                with medir(componente, nome):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def envolvida(*args, **kwargs):
+                with medir(componente, nome):
+                    return func(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+def _formatar_rastro(rastro: list) -> str:
+    rastro = sorted(rastro, key=lambda span: span[0])
+    origem = rastro[0][0] if rastro else 0.0
+    linhas = ["[TRACE]"]
+    for inicio, duracao, componente, operacao, atributos, erro in rastro:
+        extras = " ".join(f"{k}={v}" for k, v in atributos.items())
+        linhas.append(
+            f"    +{(inicio - origem) * 1000:9.1f} ms {duracao * 1000:9.1f} ms  {componente} {operacao}"
+            f"{' ' + extras if extras else ''}{' ERRO' if erro else ''}"
+        )
+    return "\n".join(linhas)
+
+
+@contextmanager
+def rastrear(operacao: str, ativo: bool = False, **atributos):
+    """
+    Span raiz de uma requisição (componente "api"). Com `ativo` ou RASTREAR_REQUISICOES,
+    loga ao final todos os spans medidos dentro dela, em ordem de início. Os `atributos`
+    (ex.: thread_id) só aparecem no log, nunca como label da métrica.
+    """
+    rastro = [] if ativo or RASTREAR_REQUISICOES else None
+    # Cada requisição roda na sua própria tarefa/contexto; basta limpar ao sair
+    _rastro.set(rastro)
+    try:
+        with medir("api", operacao, **atributos):
+            yield
+    finally:
+        _rastro.set(None)
+        if rastro is not None:
+            print(_formatar_rastro(rastro))
+
+
+def exportar() -> tuple[bytes, str]:
+    """(corpo, content-type) do /metrics; com PROMETHEUS_MULTIPROC_DIR, soma todos os workers."""
+    if prometheus_client is None:
+        raise RuntimeError("prometheus_client não está instalado (pip install prometheus-client).")
+    registro = prometheus_client.REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registro = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    return prometheus_client.generate_latest(registro), prometheus_client.CONTENT_TYPE_LATEST
@@ -0,0 +1,57 @@
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from utils.metricas import registrar, registrar_tokens
+
+
+def _tokens(response) -> tuple[int, int]:
+    """(prompt, completion) do llm_output da OpenAI ou, no streaming, do usage_metadata da mensagem."""
+    uso = (response.llm_output or {}).get("token_usage") or {}
+    if uso:
+        return uso.get("prompt_tokens", 0), uso.get("completion_tokens", 0)
+    for geracoes in response.generations:
+        for geracao in geracoes:
+            metadados = getattr(getattr(geracao, "message", None), "usage_metadata", None)
+            if metadados:
+                return metadados.get("input_tokens", 0), metadados.get("output_tokens", 0)
+    return 0, 0
+
+
+class MetricasLLM(BaseCallbackHandler):
+    """
+    Mede cada chamada ao modelo de chat (componente "openai", operação = modelo) e soma os
+    tokens da resposta. Passe em `callbacks` na criação do ChatOpenAI.
+    """
+
+    run_inline = True  # roda no contexto de quem chamou o modelo, para entrar no rastro da requisição
+
+    def __init__(self):
+        self._inicios = {}
+
+    def _iniciar(self, run_id, serialized, kwargs):
+        parametros = kwargs.get("invocation_params") or {}
+        modelo = parametros.get("model") or parametros.get("model_name") or (serialized or {}).get("name") or "llm"
+        self._inicios[run_id] = (time.perf_counter(), modelo)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._iniciar(run_id, serialized, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._iniciar(run_id, serialized, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        inicio, modelo = self._inicios.pop(run_id, (None, None))
+        if inicio is None:
+            return
+        prompt, completion = _tokens(response)
+        registrar("openai", modelo, inicio, time.perf_counter() - inicio,
+                  atributos={"prompt": prompt, "completion": completion})
+        registrar_tokens(modelo, prompt=prompt, completion=completion)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        inicio, modelo = self._inicios.pop(run_id, (None, None))
+        if inicio is not None:
+            registrar("openai", modelo, inicio, time.perf_counter() - inicio, erro=True)
+
+
+# Instância única compartilhada pelos modelos do agente e do grafo de raciocínio
+callback_llm = MetricasLLM()
@@ -0,0 +1,225 @@
+"""
+Reindexa os embeddings na dimensão (EMBED_DIM) e quantização (EMBED_QUANTIZACAO)
+configuradas, no índice FAISS e em manuais.embedding, e relata o efeito no corpus atual:
+memória, latência da busca e recall@k contra o índice de antes.
+
+Os vetores do text-embedding-3-* são encurtados sem chamar a API (primeiras coordenadas
++ renormalização, o mesmo que o parâmetro "dimensions" devolve). Só quando o índice atual
+não guarda os vetores exatos (PQ, SQ), é mais curto que o alvo ou com --reembedar, os
+textos são reembedados a partir do armazém de chunks.
+
+Pare o escritor (API em processo único ou utils.escritor_indice) antes de migrar e
+reinicie os workers depois, já com a nova configuração.
+
+Uso:
+    python -m utils.migrar_embeddings --simular --dim 1024 --quantizacao int8   # só o relatório
+    python -m utils.migrar_embeddings                                          # migra para a configuração
+    python -m utils.migrar_embeddings --reembedar --json relatorio.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+import faiss
+from utils.armazem_chunks import ArmazemChunks
+from utils.embeddings import gerar_embeddings
+from utils.indices_faiss import (
+    criar_index, aplicar_parametros_padrao, buscar, precisa_migrar, migrar_index, descricao_factory
+)
+from utils.persistencia_faiss import PersistenciaIncremental
+from utils.quantizacao import codificar, decodificar, reduzir_dimensao, validar_quantizacao
+from utils.rag_memory import travar_escritor
+from configuracoes.config import (
+    CAMINHO_FAISS, CAMINHO_SEGMENTOS_FAISS, COMPACTAR_APOS_SEGMENTOS, CAMINHO_VERSOES_FAISS,
+    RAG_VERSOES_MANTIDAS, CAMINHO_CHUNKS, DB_PATH, EMBED_DIM, EMBED_QUANTIZACAO, FAISS_INDEX_TIPO
+)
+
+LOTE_REEMBEDAR = 1000  # textos por chamada a gerar_embeddings
+
+
+def _guarda_vetores_exatos(index) -> bool:
+    return isinstance(index, (faiss.IndexFlat, faiss.IndexIVFFlat, faiss.IndexHNSWFlat))
+
+
+def _vetores_do_indice(index, n: int) -> np.ndarray:
+    try:
+        faiss.extract_index_ivf(index).make_direct_map()  # o IVF só reconstrói por id com o mapa direto
+    except (RuntimeError, AttributeError):
+        pass
+    return index.reconstruct_n(0, n)
+
+
+def _reembedar(textos: list[str]) -> np.ndarray:
+    partes = []
+    for i in range(0, len(textos), LOTE_REEMBEDAR):
+        partes.append(gerar_embeddings(textos[i:i + LOTE_REEMBEDAR]))
+        print(f"[INFO] {min(i + LOTE_REEMBEDAR, len(textos))}/{len(textos)} textos reembedados")
+    return np.vstack(partes) if partes else np.empty((0, EMBED_DIM), dtype="float32")
+
+
+def _novos_vetores(antigos: np.ndarray | None, textos, dim: int, reembedar: bool) -> tuple[np.ndarray, str]:
+    """Vetores na dimensão `dim`, encurtando os antigos quando possível; devolve também a origem."""
+    if antigos is not None and not reembedar and antigos.shape[1] >= dim:
+        return reduzir_dimensao(antigos, dim), "encurtados"
+    novos = _reembedar(textos() if callable(textos) else textos)
+    if novos.shape[1] < dim:
+        raise ValueError(f"A API devolveu vetores de dimensão {novos.shape[1]}; configure EMBED_DIM={dim} para reembedar.")
+    return reduzir_dimensao(novos, dim), "reembedados"
+
+
+def _construir(vetores: np.ndarray, tipo: str, quantizacao: str):
+    """Mesmo backend que o RAGMemory adotaria para esse corpus: flat float32 até haver vetores para treinar."""
+    index = criar_index(vetores.shape[1], "flat", quantizacao="nenhuma")
+    index.add(vetores)
+    if precisa_migrar(index, tipo, quantizacao=quantizacao):
+        index = migrar_index(index, tipo, quantizacao=quantizacao)
+    return aplicar_parametros_padrao(index)
+
+
+def _medir(index, consultas: np.ndarray, ids_consulta: np.ndarray, k: int):
+    """Top-k de cada consulta sem o próprio chunk, e a latência de cada busca em ms."""
+    resultados, latencias = [], []
+    for q, proprio in zip(consultas, ids_consulta):
+        inicio = time.perf_counter()
+        _, I = buscar(index, q.reshape(1, -1), k + 1)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        resultados.append([i for i in I[0] if i >= 0 and i != proprio][:k])
+    return resultados, np.array(latencias)
+
+
+def _recall(resultados: list[list[int]], referencia: list[list[int]]) -> float:
+    acertos = sum(len(set(r) & set(ref)) for r, ref in zip(resultados, referencia))
+    total = sum(len(ref) for ref in referencia)
+    return acertos / total if total else 1.0
+
+
+def _comparar(antigo, vetores_antigos: np.ndarray, novo, vetores_novos: np.ndarray,
+              n_consultas: int, k: int) -> dict:
+    """Usa chunks do próprio corpus como consultas; o índice antigo é a referência do recall."""
+    n = len(vetores_novos)
+    if not n:
+        return {}
+    ids = np.random.default_rng(0).choice(n, min(n_consultas, n), replace=False)
+    referencia, lat_antigo = _medir(antigo, vetores_antigos[ids], ids, k)
+    resultados, lat_novo = _medir(novo, vetores_novos[ids], ids, k)
+    return {
+        "consultas": len(ids),
+        "k": k,
+        "recall": _recall(resultados, referencia),
+        "p50_ms_antes": float(np.percentile(lat_antigo, 50)),
+        "p50_ms_depois": float(np.percentile(lat_novo, 50)),
+        "p99_ms_antes": float(np.percentile(lat_antigo, 99)),
+        "p99_ms_depois": float(np.percentile(lat_novo, 99)),
+    }
+
+
+def _manuais() -> list[tuple[int, str, bytes, np.ndarray]]:
+    if not os.path.exists(DB_PATH):
+        return []
+    with sqlite3.connect(DB_PATH) as conn:
+        colunas = {linha[1] for linha in conn.execute("PRAGMA table_info(manuais)")}
+        formato = "embedding_formato" if "embedding_formato" in colunas else "NULL"
+        linhas = conn.execute(
+            f"SELECT id, titulo, embedding, {formato} FROM manuais WHERE embedding IS NOT NULL ORDER BY id"
+        ).fetchall()
+    return [(id_, titulo, blob, decodificar(blob, fmt)) for id_, titulo, blob, fmt in linhas]
+
+
+def migrar(dim: int = EMBED_DIM, quantizacao: str = EMBED_QUANTIZACAO, tipo: str = FAISS_INDEX_TIPO,
+           reembedar: bool = False, simular: bool = False, n_consultas: int = 200, k: int = 10) -> dict:
+    """Reconstrói índice e manuais em `dim`/`quantizacao` (só mede, com `simular`); retorna o relatório."""
+    validar_quantizacao(quantizacao)
+    trava = None if simular else travar_escritor()
+    persistencia = PersistenciaIncremental(
+        CAMINHO_FAISS, CAMINHO_SEGMENTOS_FAISS, COMPACTAR_APOS_SEGMENTOS,
+        pasta_versoes=CAMINHO_VERSOES_FAISS, versoes_mantidas=RAG_VERSOES_MANTIDAS, somente_leitura=simular
+    )
+    antigo = persistencia.carregar(lambda: criar_index(dim, "flat", quantizacao="nenhuma"))
+    aplicar_parametros_padrao(antigo)
+    chunks = ArmazemChunks(CAMINHO_CHUNKS)
+    n = min(antigo.ntotal, chunks.total())
+    vetores_antigos = _vetores_do_indice(antigo, n)
+    exatos = vetores_antigos if _guarda_vetores_exatos(antigo) else None
+
+    vetores, origem = _novos_vetores(exatos, lambda: chunks.textos(range(n)), dim, reembedar)
+    novo = _construir(vetores, tipo, quantizacao)
+
+    manuais = _manuais()
+    if manuais:
+        titulos = [titulo for _, titulo, _, _ in manuais]
+        matriz = np.vstack([emb for _, _, _, emb in manuais])
+        vetores_manuais, _ = _novos_vetores(matriz, titulos, dim, reembedar)
+        blobs = [codificar(v, quantizacao) for v in vetores_manuais]
+    else:
+        blobs = []
+
+    relatorio = {
+        "vetores": n,
+        "origem": origem,
+        "antes": {"dim": antigo.d, "index": type(antigo).__name__,
+                  "bytes_index": int(faiss.serialize_index(antigo).nbytes),
+                  "bytes_manuais": sum(len(blob) for _, _, blob, _ in manuais)},
+        # Abaixo do mínimo de treino o RAGMemory também mantém a base flat float32
+        "depois": {"dim": dim, "index": "Flat" if isinstance(novo, faiss.IndexFlat) else descricao_factory(tipo, quantizacao=quantizacao),
+                   "tipo_faiss": type(novo).__name__, "bytes_index": int(faiss.serialize_index(novo).nbytes),
+                   "bytes_manuais": sum(len(blob) for blob in blobs)},
+        "busca": _comparar(antigo, vetores_antigos, novo, vetores, n_consultas, k),
+        "simulado": simular,
+    }
+
+    if not simular:
+        # Base nova publicada como uma versão; os segmentos (na dimensão antiga) saem junto
+        persistencia.compactar(faiss.serialize_index(novo), persistencia.ultimo_segmento, novo.ntotal)
+        if n < chunks.total():
+            chunks.truncar(n)
+        if manuais:
+            with sqlite3.connect(DB_PATH) as conn:
+                conn.executemany(
+                    "UPDATE manuais SET embedding = ?, embedding_formato = ? WHERE id = ?",
+                    [(blob, quantizacao, id_) for blob, (id_, _, _, _) in zip(blobs, manuais)]
+                )
+                conn.commit()
+    if trava is not None:
+        trava.close()
+    return relatorio
+
+
+def _mb(n: int) -> str:
+    return f"{n / 2**20:.1f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--simular", action="store_true", help="só mede; não grava nada")
+    parser.add_argument("--dim", type=int, default=EMBED_DIM, help="dimensão alvo (fora de --simular, use a de EMBED_DIM)")
+    parser.add_argument("--quantizacao", default=EMBED_QUANTIZACAO, help="nenhuma, fp16 ou int8")
+    parser.add_argument("--reembedar", action="store_true", help="gera os embeddings de novo em vez de encurtar os atuais")
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--json", help="salva o relatório neste arquivo")
+    args = parser.parse_args()
+    if not args.simular and (args.dim != EMBED_DIM or args.quantizacao != EMBED_QUANTIZACAO):
+        parser.error("para migrar, ajuste EMBED_DIM/EMBED_QUANTIZACAO na configuração; --dim e --quantizacao são para --simular")
+
+    r = migrar(args.dim, args.quantizacao, reembedar=args.reembedar, simular=args.simular,
+               n_consultas=args.consultas, k=args.k)
+    antes, depois, busca = r["antes"], r["depois"], r["busca"]
+    print(f"{'Simulação' if r['simulado'] else 'Migração'}: {r['vetores']} vetores ({r['origem']}), "
+          f"dimensão {antes['dim']} -> {depois['dim']}, {antes['index']} -> {depois['tipo_faiss']} ({depois['index']})")
+    for chave, nome in (("bytes_index", "Índice FAISS"), ("bytes_manuais", "manuais.embedding")):
+        economia = 1 - depois[chave] / antes[chave] if antes[chave] else 0.0
+        print(f"{nome:<18} {_mb(antes[chave]):>10} -> {_mb(depois[chave]):>10}  ({economia:.0%} menor)")
+    if busca:
+        aceleracao = busca["p50_ms_antes"] / busca["p50_ms_depois"] if busca["p50_ms_depois"] else 0.0
+        print(f"Busca p50 {busca['p50_ms_antes']:.3f} -> {busca['p50_ms_depois']:.3f} ms ({aceleracao:.1f}x), "
+              f"p99 {busca['p99_ms_antes']:.3f} -> {busca['p99_ms_depois']:.3f} ms")
+        print(f"Recall@{busca['k']} contra o índice anterior: {busca['recall']:.3f} ({busca['consultas']} consultas)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(r, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
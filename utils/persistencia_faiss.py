@@ -0,0 +1,227 @@
+import os
+import glob
+import json
+import pickle
+import shutil
+import threading
+import numpy as np
+import faiss
+from utils.metricas import medido
+
+ARQUIVO_PUBLICACAO = "ATUAL"
+# Só leitura e mapeado em memória: as páginas do arquivo ficam no cache do sistema,
+# compartilhadas entre todos os workers. O MMAP_IFC mapeia os códigos de todos os
+# backends (flat, IVF, HNSW, SQ); somado ao IO_FLAG_MMAP antigo, a leitura de IVF falha
+FLAGS_MMAP = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def escrever_atomico(caminho: str, dados: bytes):
+    """Grava em arquivo temporário, faz fsync e troca por rename atômico."""
+    tmp = caminho + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(dados)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, caminho)
+    try:
+        fd = os.open(os.path.dirname(caminho) or ".", os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass  # fsync de diretório não é suportado em todas as plataformas
+
+
+class PersistenciaIncremental:
+    """
+    Persistência append-only do índice FAISS (os textos ficam no ArmazemChunks).
+
+    Cada inclusão vira um segmento imutável em `pasta_segmentos` com os vetores
+    e o offset (`inicio`) em que foram adicionados. A compactação grava o índice
+    base com rename atômico e só então apaga os segmentos cobertos.
+    Na carga, segmentos já contidos na base são ignorados pelo offset, o que torna
+    a reaplicação idempotente mesmo após uma queda no meio da compactação.
+
+    Com `pasta_versoes`, cada compactação também publica a base como uma versão
+    imutável (hard link do arquivo recém-gravado) e troca o ponteiro ATUAL com rename
+    atômico. Processos leitores (`somente_leitura`) abrem a versão publicada mapeada
+    em memória e aplicam por cima os segmentos posteriores a ela.
+    """
+
+    def __init__(self, caminho_index: str, pasta_segmentos: str, compactar_apos: int,
+                 pasta_versoes: str = None, versoes_mantidas: int = 3, somente_leitura: bool = False):
+        self.caminho_index = caminho_index
+        self.pasta_segmentos = pasta_segmentos
+        self.compactar_apos = compactar_apos
+        self.pasta_versoes = pasta_versoes
+        self.versoes_mantidas = versoes_mantidas
+        self._compactando = threading.Lock()
+        self._ate_seq_compactado = 0  # último segmento coberto por uma base gravada nesta execução
+        os.makedirs(pasta_segmentos, exist_ok=True)
+        if pasta_versoes:
+            os.makedirs(pasta_versoes, exist_ok=True)
+        if not somente_leitura:
+            for tmp in glob.glob(os.path.join(pasta_segmentos, "*.tmp")):
+                os.remove(tmp)  # escrita interrompida; o segmento nunca foi publicado
+        self._proximo_seq = max(self._sequencias(), default=0) + 1
+        # (inicio, textos) de segmentos do formato antigo, que também guardavam os textos
+        self.textos_legados = []
+
+    def _sequencias(self) -> list[int]:
+        seqs = []
+        for caminho in glob.glob(os.path.join(self.pasta_segmentos, "*.seg")):
+            try:
+                seqs.append(int(os.path.basename(caminho).split(".")[0]))
+            except ValueError:
+                continue
+        return sorted(seqs)
+
+    def _caminho_segmento(self, seq: int) -> str:
+        return os.path.join(self.pasta_segmentos, f"{seq:010d}.seg")
+
+    def _ler_segmento(self, seq: int):
+        try:
+            with open(self._caminho_segmento(seq), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None  # removido por uma compactação concorrente
+
+    def segmentos_apos(self, seq_inicial: int, ntotal: int):
+        """
+        Gera (seq, vetores) dos segmentos posteriores a `seq_inicial` que continuam um
+        índice com `ntotal` vetores, na ordem; para no primeiro que não encaixa.
+        """
+        for seq in self._sequencias():
+            if seq <= seq_inicial:
+                continue
+            segmento = self._ler_segmento(seq)
+            if segmento is None:
+                return
+            inicio, vetores = segmento["inicio"], segmento["vetores"]
+            if inicio + len(vetores) <= ntotal:
+                continue  # já contido na base
+            if inicio != ntotal:
+                print(f"[AVISO] Segmento {seq} fora de ordem (início {inicio}, índice {ntotal}); reaplicação interrompida.")
+                return
+            if "textos" in segmento:
+                self.textos_legados.append((inicio, segmento["textos"]))
+            yield seq, vetores
+            ntotal += len(vetores)
+
+    def carregar(self, criar_index):
+        """Carrega a base e reaplica os segmentos pendentes. Retorna o índice."""
+        if os.path.exists(self.caminho_index):
+            index = faiss.read_index(self.caminho_index)
+        else:
+            index = criar_index()
+
+        for _, vetores in self.segmentos_apos(0, index.ntotal):
+            index.add(vetores)
+        return index
+
+    def publicacao_atual(self) -> dict | None:
+        """Conteúdo do ponteiro ATUAL: versao, arquivo, ate_seq e ntotal da última base publicada."""
+        if not self.pasta_versoes:
+            return None
+        try:
+            with open(os.path.join(self.pasta_versoes, ARQUIVO_PUBLICACAO), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def abrir_publicacao(self, publicacao: dict):
+        """Abre a versão publicada só para leitura, mapeada em memória."""
+        return faiss.read_index(os.path.join(self.pasta_versoes, publicacao["arquivo"]), FLAGS_MMAP)
+
+    def _publicar(self, ate_seq: int, ntotal: int):
+        anterior = self.publicacao_atual()
+        versao = (anterior["versao"] if anterior else 0) + 1
+        arquivo = f"{versao:010d}.index"
+        destino = os.path.join(self.pasta_versoes, arquivo)
+        try:
+            # A próxima compactação troca a base por rename, então o link segue apontando para esta
+            os.link(self.caminho_index, destino)
+        except OSError:
+            shutil.copyfile(self.caminho_index, destino)
+        publicacao = {"versao": versao, "arquivo": arquivo, "ate_seq": ate_seq, "ntotal": ntotal}
+        escrever_atomico(
+            os.path.join(self.pasta_versoes, ARQUIVO_PUBLICACAO), json.dumps(publicacao).encode("utf-8")
+        )
+        # Versões antigas saem do diretório; leitores que ainda as mapeiam continuam válidos até trocar
+        antigas = sorted(glob.glob(os.path.join(self.pasta_versoes, "*.index")))[:-self.versoes_mantidas]
+        for caminho in antigas:
+            os.remove(caminho)
+
+    @medido("faiss", "segmento")
+    def anexar(self, inicio: int, vetores: np.ndarray) -> int:
+        """Grava um novo segmento; o custo depende só do que foi adicionado."""
+        seq = self._proximo_seq
+        self._proximo_seq += 1
+        dados = pickle.dumps({"inicio": inicio, "vetores": vetores})
+        escrever_atomico(self._caminho_segmento(seq), dados)
+        return seq
+
+    @property
+    def ultimo_segmento(self) -> int:
+        return self._proximo_seq - 1
+
+    def precisa_compactar(self) -> bool:
+        return len(self._sequencias()) >= self.compactar_apos
+
+    @medido("faiss", "gravar_base")
+    def _gravar_base(self, index_serializado: np.ndarray, ate_seq: int, ntotal: int = None) -> bool:
+        """Chamado com `_compactando` adquirido. Recusa um estado mais antigo que a base já gravada."""
+        if ate_seq < self._ate_seq_compactado:
+            print(f"[AVISO] Compactação até o segmento {ate_seq} descartada; a base já cobre até {self._ate_seq_compactado}.")
+            return False
+        pasta = os.path.dirname(self.caminho_index)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        escrever_atomico(self.caminho_index, index_serializado.tobytes())
+        if self.pasta_versoes:
+            self._publicar(ate_seq, ntotal)
+        self._ate_seq_compactado = ate_seq
+        for seq in self._sequencias():
+            if seq <= ate_seq:
+                os.remove(self._caminho_segmento(seq))
+        return True
+
+    def compactar(self, index_serializado: np.ndarray, ate_seq: int, ntotal: int = None) -> bool:
+        """
+        Grava o novo índice base (publicando-o, se houver pasta de versões) e remove os segmentos até `ate_seq`.
+        Retorna False se o estado for mais antigo que a última base gravada (nada é alterado).
+        """
+        with self._compactando:
+            return self._gravar_base(index_serializado, ate_seq, ntotal)
+
+    def compactar_estado(self, capturar_estado) -> bool:
+        """
+        Compactação síncrona: captura e gravação sob a mesma trava, para que nenhuma
+        compactação em segundo plano grave entre as duas etapas.
+        """
+        with self._compactando:
+            return self._gravar_base(*capturar_estado())
+
+    def compactar_em_segundo_plano(self, capturar_estado):
+        """
+        Dispara a compactação numa thread daemon, se nenhuma estiver em curso.
+        `capturar_estado` devolve (index_serializado, ate_seq, ntotal) de forma consistente;
+        a trava fica com a thread da captura até o fim da gravação.
+        """
+        if not self._compactando.acquire(blocking=False):
+            return
+
+        def _executar():
+            try:
+                self._gravar_base(*capturar_estado())
+            except Exception as e:
+                print(f"[AVISO] Falha na compactação do FAISS: {e}")
+            finally:
+                self._compactando.release()
+
+        try:
+            threading.Thread(target=_executar, name="compactacao-faiss", daemon=True).start()
+        except BaseException:
+            self._compactando.release()
+            raise
@@ -0,0 +1,50 @@
+import numpy as np
+from configuracoes.config import EMBED_QUANTIZACAO
+
+QUANTIZACOES = ("nenhuma", "fp16", "int8")
+
+
+def validar_quantizacao(quantizacao: str):
+    if quantizacao not in QUANTIZACOES:
+        raise ValueError(f"Quantização desconhecida: {quantizacao}. Use uma de {QUANTIZACOES}.")
+
+
+def codificar(vetor: np.ndarray, quantizacao: str = EMBED_QUANTIZACAO) -> bytes:
+    """
+    BLOB de um embedding: float32 cru, float16, ou int8 com a escala (float32) na frente.
+    O int8 é simétrico por vetor: o maior |valor| vira 127.
+    """
+    validar_quantizacao(quantizacao)
+    vetor = np.asarray(vetor, dtype="float32").ravel()
+    if quantizacao == "fp16":
+        return vetor.astype("float16").tobytes()
+    if quantizacao == "int8":
+        escala = np.float32(max(float(np.abs(vetor).max(initial=0.0)), 1e-12) / 127)
+        return escala.tobytes() + np.round(vetor / escala).astype("int8").tobytes()
+    return vetor.tobytes()
+
+
+def decodificar(blob: bytes, quantizacao: str | None) -> np.ndarray:
+    """Inverso de `codificar`; None é o float32 das linhas gravadas antes da quantização."""
+    if quantizacao in (None, "nenhuma"):
+        return np.frombuffer(blob, dtype="float32")
+    validar_quantizacao(quantizacao)
+    if quantizacao == "fp16":
+        return np.frombuffer(blob, dtype="float16").astype("float32")
+    escala = np.frombuffer(blob[:4], dtype="float32")[0]
+    return np.frombuffer(blob[4:], dtype="int8").astype("float32") * escala
+
+
+def bytes_por_vetor(dim: int, quantizacao: str = EMBED_QUANTIZACAO) -> int:
+    validar_quantizacao(quantizacao)
+    return {"nenhuma": 4 * dim, "fp16": 2 * dim, "int8": dim + 4}[quantizacao]
+
+
+def reduzir_dimensao(vetores: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Encurta embeddings do text-embedding-3-* para `dim`: mantém as primeiras
+    coordenadas e renormaliza, o mesmo que a API devolve com `dimensions=dim`.
+    """
+    vetores = np.array(np.atleast_2d(vetores)[:, :dim], dtype="float32")
+    vetores /= np.maximum(np.linalg.norm(vetores, axis=1, keepdims=True), 1e-12)
+    return vetores
@@ -1,59 +1,534 @@
-import os, pickle, numpy as np
+import asyncio
+import os
+import pickle
+import threading
+import time
+import numpy as np
 import faiss
-import tiktoken
-from openai import OpenAI
-from configuracoes.config import API_KEY, CAMINHO_FAISS, CAMINHO_META, EMBED_DIM, EMBEDDING_MODEL, TOKENIZER_ENCODING, MAX_TOKENS_PER_CHUNK
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+from utils.embeddings import gerar_embedding, gerar_embeddings, agerar_embedding, agerar_embeddings
+from utils.assincrono import em_thread
+from utils.cache_embeddings import hash_conteudo
+from utils.armazem_chunks import ArmazemChunks, Chunk, FiltroBusca
+from utils.persistencia_faiss import PersistenciaIncremental, FLAGS_MMAP
+from utils.fila_ingestao import FilaIngestao
+from utils.busca_lexica import consulta_fts, eh_consulta_exata, fundir_rrf
+from utils.inicializacao import preguicoso
+from utils.chunker_html import dividir_texto
+from utils.indices_faiss import (
+    criar_index, aplicar_parametros_padrao, precisa_migrar, normalizar, usa_cosseno, migrar_para_cosseno
+)
+from utils.instantaneo_faiss import Instantaneo
+from utils.metricas import medido
+from configuracoes.config import (
+    CAMINHO_FAISS, CAMINHO_META, CAMINHO_CHUNKS, CAMINHO_SEGMENTOS_FAISS, COMPACTAR_APOS_SEGMENTOS,
+    EMBED_DIM, FAISS_INDEX_TIPO, MAX_TOKENS_PER_CHUNK, RAG_DELTA_MAX_VETORES,
+    RAG_MODO, CAMINHO_VERSOES_FAISS, RAG_VERSOES_MANTIDAS, RAG_INTERVALO_RECARGA, RAG_INTERVALO_FILA,
+    RAG_ESPERA_INGESTAO, BUSCA_HIBRIDA, BUSCA_CANDIDATOS
+)
+from AgenteLang.categorias_intencao import categorias_intencao
+
+
+def validar_categoria(categoria: str | None):
+    """Aceita só as categorias de intenção conhecidas (ou nenhuma)."""
+    if categoria is not None and categoria not in categorias_intencao:
+        raise ValueError(f"Categoria de intenção desconhecida: {categoria}. Use uma de {list(categorias_intencao)}.")
+
+
+class EscritorOcupado(RuntimeError):
+    """Outro processo já detém a trava de escritor do índice."""
+
+
+def travar_escritor():
+    """
+    Garante um único processo escritor por diretório de índice. Devolve o arquivo da
+    trava, que precisa continuar aberto enquanto o processo escreve.
+    """
+    if fcntl is None:
+        return None
+    caminho = os.path.join(os.path.dirname(CAMINHO_FAISS) or ".", ".escritor.lock")
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    trava = open(caminho, "a")
+    try:
+        # lockf é por processo: outras instâncias no mesmo processo não se bloqueiam
+        fcntl.lockf(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        trava.close()
+        raise EscritorOcupado(
+            "Outro processo já é o escritor do índice FAISS. Rode os workers com RAG_MODO=leitor "
+            "e deixe a escrita com um único processo (python -m utils.escritor_indice)."
+        )
+    return trava
 
-client = OpenAI(api_key=API_KEY)
-tokenizador = tiktoken.get_encoding(TOKENIZER_ENCODING)
 
 class RAGMemory:
-    def __init__(self, embed_dim=EMBED_DIM):
+    """
+    Índice FAISS + armazém de chunks, seguro para buscas e inclusões concorrentes.
+
+    As buscas leem `self._estado`, um Instantaneo imutável, sem lock. As escritas são
+    serializadas por `self._lock`: gravam chunks e segmento, montam um novo Instantaneo
+    e o publicam com uma única atribuição. Como os chunks são gravados antes da
+    publicação, todo id visível numa busca já tem texto no armazém.
+
+    Com vários processos, só um é "escritor" (trava em arquivo). Os demais, em modo
+    "leitor", abrem a versão publicada do índice mapeada em memória (compartilhada
+    entre os workers), aplicam os segmentos mais novos e a recarregam sozinhos quando
+    o escritor publica outra; o que eles precisam indexar vai pela FilaIngestao.
+    """
+
+    def __init__(self, embed_dim=EMBED_DIM, modo: str = RAG_MODO):
+        if modo not in ("escritor", "leitor"):
+            raise ValueError(f"Modo da RAGMemory desconhecido: {modo}. Use 'escritor' ou 'leitor'.")
         self.embed_dim = embed_dim
+        self.somente_leitura = modo == "leitor"
+        self._lock = threading.Lock()  # só entre escritores (e recargas do leitor); as buscas não o usam
+        self.persistencia = PersistenciaIncremental(
+            CAMINHO_FAISS, CAMINHO_SEGMENTOS_FAISS, COMPACTAR_APOS_SEGMENTOS,
+            pasta_versoes=CAMINHO_VERSOES_FAISS, versoes_mantidas=RAG_VERSOES_MANTIDAS,
+            somente_leitura=self.somente_leitura
+        )
+        self.chunks = ArmazemChunks(CAMINHO_CHUNKS)
+        if self.somente_leitura:
+            self._iniciar_leitor()
+        else:
+            self._iniciar_escritor()
+
+    def _iniciar_escritor(self):
+        self._trava = travar_escritor()
+        # Começa sempre flat; o backend aproximado é adotado quando houver vetores para treiná-lo
+        index = self.persistencia.carregar(lambda: criar_index(self.embed_dim, "flat", quantizacao="nenhuma"))
+        self._verificar_dimensao(index)
+        aplicar_parametros_padrao(index)
+        self._estado = Instantaneo(index)
+        self._importar_meta_legada()
+        reconstruido = self._reconciliar()
+        if not usa_cosseno(self._estado.base):
+            # Índice antigo em L2 sobre vetores crus: converte uma vez e grava a nova base já
+            # na carga, para os próximos segmentos (normalizados) não se misturarem com ela
+            self._estado = Instantaneo(migrar_para_cosseno(self._estado.base))
+            self.compactar()
+        elif reconstruido:
+            # Grava a base sem o excedente, descartando os segmentos que o continham
+            self.compactar()
+        else:
+            consolidado = self._estado.consolidado()
+            if consolidado.base is not self._estado.base:
+                self._estado = consolidado
+                self.persistencia.compactar_em_segundo_plano(self._capturar_estado)
+
+    def _verificar_dimensao(self, index):
+        if index.d != self.embed_dim:
+            raise RuntimeError(
+                f"Índice FAISS com dimensão {index.d}, mas EMBED_DIM={self.embed_dim}. "
+                "Rode python -m utils.migrar_embeddings para reindexar na nova dimensão."
+            )
+
+    def _iniciar_leitor(self):
+        self.fila = FilaIngestao()
+        self._publicacao = None
+        self._ultimo_seq = 0
         if os.path.exists(CAMINHO_FAISS):
-            self.index = faiss.read_index(CAMINHO_FAISS)
-            with open(CAMINHO_META, "rb") as f:
-                self.meta = pickle.load(f)
+            # Escritor ainda sem versão publicada: usa a base dele, também mapeada
+            base = aplicar_parametros_padrao(faiss.read_index(CAMINHO_FAISS, FLAGS_MMAP))
         else:
-            self.index = faiss.IndexFlatL2(embed_dim)
-            self.meta = []
-        self.ids_set = set(hash(text) for text in self.meta)
+            base = criar_index(self.embed_dim, "flat", quantizacao="nenhuma")
+        self._estado = Instantaneo(base)
+        self._recarregar()
+        self._verificar_dimensao(self._estado.base)
+        threading.Thread(target=self._recarregar_periodicamente, name="recarga-faiss", daemon=True).start()
+
+    def _recarregar(self):
+        """
+        Leitor: adota a versão publicada mais nova, se mudou, e anexa ao delta os segmentos
+        gravados depois dela. A troca é uma atribuição, como nas escritas.
+        """
+        with self._lock:
+            estado, ultimo_seq = self._estado, self._ultimo_seq
+            publicacao = self.persistencia.publicacao_atual()
+            if publicacao and publicacao != self._publicacao:
+                try:
+                    base = self.persistencia.abrir_publicacao(publicacao)
+                except Exception as e:
+                    print(f"[AVISO] Não foi possível abrir a versão {publicacao['versao']} do índice: {e}")
+                else:
+                    estado, ultimo_seq = Instantaneo(aplicar_parametros_padrao(base)), publicacao["ate_seq"]
+                    self._publicacao = publicacao
+            novos = []
+            for seq, vetores in self.persistencia.segmentos_apos(ultimo_seq, estado.ntotal):
+                novos.append(vetores)
+                ultimo_seq = seq
+            if novos:
+                estado = estado.com_vetores(np.vstack(novos))
+            self._estado, self._ultimo_seq = estado, ultimo_seq
+
+    def _recarregar_periodicamente(self):
+        while True:
+            time.sleep(RAG_INTERVALO_RECARGA)
+            try:
+                self._recarregar()
+            except Exception as e:
+                print(f"[AVISO] Falha ao recarregar o índice FAISS: {e}")
+
+    def _enfileirar(self, documentos: list[tuple[list[str], int, str, str]]) -> tuple[int | None, int]:
+        """Leitor: entrega ao escritor os documentos com chunks ainda não indexados. Retorna (pedido, chunks novos)."""
+        pendentes, novos = [], 0
+        for textos, manual_id, url, categoria in documentos:
+            validar_categoria(categoria)
+            hashes = {hash_conteudo(t) for t in textos}
+            faltantes = len(hashes) - len(self.chunks.hashes_existentes(list(hashes)))
+            if faltantes:
+                pendentes.append((list(textos), manual_id, url, categoria))
+                novos += faltantes
+        if not pendentes:
+            return None, 0
+        return self.fila.enfileirar(pendentes), novos
+
+    def _indexado(self, pedido: int) -> bool:
+        """Leitor: o escritor já processou o pedido e este processo já enxerga o resultado?"""
+        ntotal, erro = self.fila.situacao(pedido)
+        if erro:
+            print(f"[AVISO] O escritor do índice falhou no pedido {pedido}: {erro}")
+            return True
+        if ntotal is None:
+            return False
+        if self._estado.ntotal < ntotal:
+            self._recarregar()
+        return self._estado.ntotal >= ntotal
+
+    def _aguardar(self, pedido: int) -> bool:
+        """Espera o pedido ficar visível; False se o escritor falhou ou não o processou a tempo."""
+        limite = time.monotonic() + RAG_ESPERA_INGESTAO
+        while not self._indexado(pedido):
+            if time.monotonic() > limite:
+                print(f"[AVISO] Pedido de indexação {pedido} não ficou visível em {RAG_ESPERA_INGESTAO}s; seguindo sem ele.")
+                return False
+            time.sleep(RAG_INTERVALO_FILA)
+        return self.fila.situacao(pedido)[1] is None
+
+    async def _aaguardar(self, pedido: int):
+        limite = time.monotonic() + RAG_ESPERA_INGESTAO
+        while not await em_thread(self._indexado, pedido):
+            if time.monotonic() > limite:
+                print(f"[AVISO] Pedido de indexação {pedido} não ficou visível em {RAG_ESPERA_INGESTAO}s; seguindo sem ele.")
+                return
+            await asyncio.sleep(RAG_INTERVALO_FILA)
+
+    @property
+    def index(self) -> Instantaneo:
+        """Instantâneo atual (ntotal, reconstruct_n); para buscar, use search/buscar_por_limiar."""
+        return self._estado
+
+    def _importar_meta_legada(self):
+        """
+        Copia a lista pickled antiga (CAMINHO_META) e os textos dos segmentos ainda não
+        compactados para o armazém de chunks, uma única vez.
+        """
+        if self.chunks.total() > 0 or not os.path.exists(CAMINHO_META):
+            return
+        with open(CAMINHO_META, "rb") as f:
+            meta = pickle.load(f)
+        meta = [m if isinstance(m, str) else str(m) for m in meta][:self.index.ntotal]
+        self.chunks.inserir(0, meta)
+        for inicio, textos in self.persistencia.textos_legados:
+            if inicio + len(textos) > len(meta):
+                self.chunks.inserir(inicio, textos)
+        print(f"[INFO] {self.chunks.total()} chunks importados de {CAMINHO_META} para {CAMINHO_CHUNKS}")
+
+    def _reconciliar(self) -> bool:
+        """
+        Alinha armazém e índice após uma queda entre a gravação dos chunks e a do segmento.
+        Retorna True se o índice foi refeito e ainda precisa ser gravado.
+        """
+        total = self.chunks.total()
+        if total > self.index.ntotal:
+            # Os chunks são gravados antes do segmento; os excedentes nunca chegaram ao índice
+            self.chunks.truncar(self.index.ntotal)
+        elif total < self.index.ntotal:
+            print(f"[AVISO] Índice com {self.index.ntotal} vetores e {total} chunks; descartando excedente.")
+            # Nem todo backend tem remove_ids (o HNSW não tem): refaz uma base flat, na métrica
+            # original, só com os `total` primeiros vetores; a compactação a migra de backend
+            base = self._estado.base
+            try:
+                faiss.extract_index_ivf(base).make_direct_map()  # o IVF só reconstrói por id com o mapa direto
+            except (RuntimeError, AttributeError):
+                pass
+            nova = faiss.IndexFlat(self.embed_dim, base.metric_type)
+            nova.add(self.index.reconstruct_n(0, total))
+            self._estado = Instantaneo(nova)
+            return True
+        return False
 
     def embed_text(self, texto: str):
-        resp = client.embeddings.create(model=EMBEDDING_MODEL, input=texto)
-        return np.array(resp.data[0].embedding, dtype="float32")
+        return gerar_embedding(texto)
 
     def chunk_text(self, texto: str, max_tokens=MAX_TOKENS_PER_CHUNK):
-        tokens = tokenizador.encode(texto)
-        chunks = []
-        for i in range(0, len(tokens), max_tokens):
-            chunk_tokens = tokens[i:i+max_tokens]
-            chunks.append(tokenizador.decode(chunk_tokens))
-        return chunks
-
-    def add_texts(self, textos: list[str]):
-        novos_chunks = []
-        embeddings = []
+        """Chunks de um texto puro, por linhas, com sobreposição (ver utils.chunker_html)."""
+        return list(dividir_texto(texto, max_tokens))
+
+    @property
+    def versao(self) -> int:
+        """Muda sempre que novos chunks entram no corpus (usado para invalidar caches de resposta)."""
+        return self._estado.ntotal
+
+    def _filtrar_novos(self, textos: list[str], manual_id: int = None, url: str = None, categoria: str = None) -> list[str]:
+        """
+        Remove duplicatas entre si e chunks já indexados (consulta por hash no armazém).
+        Os já indexados sem origem recebem o manual/URL/categoria informados, para
+        passarem a aparecer nas buscas filtradas.
+        """
+        por_hash = {}
         for t in textos:
-            h = hash(t)
-            if h not in self.ids_set:
-                embeddings.append(self.embed_text(t))
-                novos_chunks.append(t)
-                self.ids_set.add(h)
-        if embeddings:
-            self.index.add(np.array(embeddings))
-            self.meta.extend(novos_chunks)
-            self._persist()
-
-    def _persist(self):
-        os.makedirs("faiss", exist_ok=True)
-        faiss.write_index(self.index, CAMINHO_FAISS)
-        with open(CAMINHO_META, "wb") as f:
-            pickle.dump(self.meta, f)
-
-    def query(self, pergunta: str, k: int = 3):
+            por_hash.setdefault(hash_conteudo(t), t)
+        existentes = self.chunks.hashes_existentes(list(por_hash))
+        self.chunks.atribuir_origem(list(existentes), manual_id, url, categoria)
+        return [t for h, t in por_hash.items() if h not in existentes]
+
+    def _adicionar(self, novos_chunks: list[str], embeddings: np.ndarray, origens: list[tuple]) -> int:
+        """Indexa os chunks com (manual_id, url, categoria) de cada um em `origens`; retorna quantos entraram."""
+        with self._lock:
+            # Outra chamada concorrente pode ter indexado os mesmos textos depois do filtro
+            hashes = [hash_conteudo(t) for t in novos_chunks]
+            vistos = self.chunks.hashes_existentes(hashes)
+            manter = []
+            for i, h in enumerate(hashes):
+                if h not in vistos:
+                    vistos.add(h)
+                    manter.append(i)
+            if not manter:
+                return 0
+            novos_chunks = [novos_chunks[i] for i in manter]
+            origens = [origens[i] for i in manter]
+            embeddings = normalizar(embeddings[manter])
+
+            inicio = self._estado.ntotal
+            self._persist(inicio, embeddings, novos_chunks, origens)
+            # Copia só o delta; quem está buscando segue com o instantâneo anterior
+            self._estado = self._estado.com_vetores(embeddings)
+            consolidar = self._precisa_consolidar()
+        if consolidar or self.persistencia.precisa_compactar():
+            self.persistencia.compactar_em_segundo_plano(self._capturar_estado)
+        return len(manter)
+
+    def add_texts(self, textos: list[str], manual_id: int = None, url: str = None, categoria: str = None):
+        """
+        Indexa os chunks ainda não conhecidos, registrando manual, URL e categoria de origem.
+        No modo leitor, enfileira para o escritor e espera o resultado ficar visível.
+        """
+        validar_categoria(categoria)
+        if self.somente_leitura:
+            pedido, _ = self._enfileirar([(textos, manual_id, url, categoria)])
+            if pedido is not None:
+                self._aguardar(pedido)
+            return
+        novos_chunks = self._filtrar_novos(textos, manual_id, url, categoria)
+        if novos_chunks:
+            # Um único caminho em lote para a API e um único index.add para o FAISS
+            embeddings = gerar_embeddings(novos_chunks)
+            self._adicionar(novos_chunks, embeddings, [(manual_id, url, categoria)] * len(novos_chunks))
+
+    async def aadd_texts(self, textos: list[str], manual_id: int = None, url: str = None, categoria: str = None):
+        """Versão assíncrona de add_texts: embeddings via AsyncOpenAI, FAISS e disco no pool de threads."""
+        validar_categoria(categoria)
+        if self.somente_leitura:
+            pedido, _ = await em_thread(self._enfileirar, [(textos, manual_id, url, categoria)])
+            if pedido is not None:
+                await self._aaguardar(pedido)
+            return
+        novos_chunks = await em_thread(self._filtrar_novos, textos, manual_id, url, categoria)
+        if novos_chunks:
+            embeddings = await agerar_embeddings(novos_chunks)
+            await em_thread(self._adicionar, novos_chunks, embeddings, [(manual_id, url, categoria)] * len(novos_chunks))
+
+    def add_lote(self, documentos: list[tuple[list[str], int, str, str]], exigir_indexacao: bool = False) -> int:
+        """
+        Indexa vários documentos (textos, manual_id, url, categoria) de uma vez: uma única
+        chamada de embeddings em lote, um segmento FAISS e uma transação no armazém.
+        Retorna quantos chunks novos entraram no índice (no modo leitor, quantos foram
+        entregues ao escritor; com `exigir_indexacao`, lança TimeoutError se o escritor
+        não os indexar em RAG_ESPERA_INGESTAO segundos).
+        """
+        if self.somente_leitura:
+            pedido, novos = self._enfileirar(documentos)
+            if pedido is not None and not self._aguardar(pedido) and exigir_indexacao:
+                raise TimeoutError(
+                    f"O escritor do índice não indexou o pedido {pedido}. Ele roda na API em modo escritor "
+                    "ou em python -m utils.escritor_indice; confira se um dos dois está no ar."
+                )
+            return novos
+        textos, origens = [], []
+        for textos_doc, manual_id, url, categoria in documentos:
+            validar_categoria(categoria)
+            novos = self._filtrar_novos(textos_doc, manual_id, url, categoria)
+            textos.extend(novos)
+            origens.extend([(manual_id, url, categoria)] * len(novos))
+        if not textos:
+            return 0
+        return self._adicionar(textos, gerar_embeddings(textos), origens)
+
+    @medido("faiss", "persistir")
+    def _persist(self, inicio: int, embeddings: np.ndarray, textos: list[str], origens: list[tuple]):
+        """
+        Grava os chunks no armazém e anexa só os vetores do delta como segmento; a base
+        é reescrita pela compactação. Os chunks vão primeiro: numa queda entre os dois,
+        _reconciliar descarta os que ficaram sem vetor.
+        """
+        self.chunks.inserir(inicio, textos, origens=origens)
+        self.persistencia.anexar(inicio, embeddings)
+
+    def _precisa_consolidar(self) -> bool:
+        """Delta grande demais, ou vetores suficientes para trocar a base flat pelo backend configurado."""
+        estado = self._estado
+        return estado.tamanho_delta >= RAG_DELTA_MAX_VETORES or \
+            precisa_migrar(estado.base, FAISS_INDEX_TIPO, estado.ntotal)
+
+    def _capturar_estado(self):
+        """
+        Incorpora o delta numa cópia da base (migrando o backend se for o caso), publica o
+        resultado e o serializa. As buscas continuam durante todo o processo; só as
+        escritas esperam a consolidação.
+        """
+        with self._lock:
+            self._estado = self._estado.consolidado(FAISS_INDEX_TIPO)
+            base, ate_seq = self._estado.base, self.persistencia.ultimo_segmento
+        return faiss.serialize_index(base), ate_seq, base.ntotal
+
+    @medido("faiss", "compactar")
+    def compactar(self):
+        """Compacta os segmentos pendentes na base (e publica a nova versão) de forma síncrona."""
+        if self.somente_leitura:
+            raise RuntimeError("Só o processo escritor compacta o índice.")
+        self.persistencia.compactar_estado(self._capturar_estado)
+
+    def _ids_permitidos(self, filtro: FiltroBusca):
+        if filtro is None or not any(v is not None for v in filtro):
+            return None
+        validar_categoria(filtro.categoria)
+        return self.chunks.ids_filtrados(filtro)
+
+    @medido("faiss", "search")
+    def search(self, query_emb: np.ndarray, k: int, nprobe: int = None, ef_search: int = None,
+               filtro: FiltroBusca = None):
+        """
+        Busca no índice com nprobe/efSearch opcionais por consulta. Com `filtro`, só os
+        chunks do manual/URL/categoria têm a distância calculada. Retorna (D, I),
+        com D em similaridade de cosseno.
+        """
+        estado = self._estado
+        ids_permitidos = self._ids_permitidos(filtro)
+        return estado.buscar(normalizar(query_emb), k, nprobe=nprobe, ef_search=ef_search, ids_permitidos=ids_permitidos)
+
+    @medido("faiss", "buscar_por_limiar")
+    def buscar_por_limiar(self, query_emb: np.ndarray, limiar: float, max_resultados: int,
+                          nprobe: int = None, ef_search: int = None, filtro: FiltroBusca = None):
+        """
+        Todos os chunks com similaridade de cosseno acima de `limiar` (range_search), até
+        `max_resultados`, do mais para o menos parecido. Retorna (similaridades, ids).
+        """
+        estado = self._estado
+        ids_permitidos = self._ids_permitidos(filtro)
+        return estado.buscar_por_limiar(
+            normalizar(query_emb), limiar, max_resultados,
+            nprobe=nprobe, ef_search=ef_search, ids_permitidos=ids_permitidos
+        )
+
+    def _pontuar(self, D, I) -> list[tuple[float, Chunk]]:
+        chunks = self.chunks.obter(I)
+        return [(float(d), chunks[int(i)]) for d, i in zip(D, I) if int(i) in chunks]
+
+    def _resposta_exata(self, pergunta: str, k: int, filtro: FiltroBusca = None) -> list[tuple[float, Chunk]]:
+        """
+        Caminho rápido para perguntas de termos exatos (códigos, campos, menus): se o FTS5
+        acha chunks com todos os termos, responde com eles sem chamar a API de embeddings.
+        """
+        if not BUSCA_HIBRIDA or not self.chunks.fts or not eh_consulta_exata(pergunta):
+            return []
+        encontrados = self.chunks.buscar_texto(consulta_fts(pergunta, todos=True), k, filtro)
+        return self._pontuar([p for p, _ in encontrados], [i for _, i in encontrados])
+
+    def _fundir(self, I, lexicos: list[tuple[float, int]], k: int) -> list[tuple[float, Chunk]]:
+        """Junta os rankings vetorial e léxico por RRF; a pontuação devolvida é a do RRF."""
+        fundidos = fundir_rrf([[int(i) for i in I if i >= 0], [i for _, i in lexicos]])[:k]
+        return self._pontuar([p for p, _ in fundidos], [i for _, i in fundidos])
+
+    @medido("rag", "consultar")
+    def consultar(self, pergunta: str, k: int = 3, nprobe: int = None, ef_search: int = None,
+                  filtro: FiltroBusca = None) -> list[tuple[float, Chunk]]:
+        """
+        Como query, mas devolve (pontuação, Chunk) para a montagem do contexto. Com
+        BUSCA_HIBRIDA, funde a busca vetorial com a léxica (BM25) e tenta antes o caminho
+        rápido só léxico; sem ela, a pontuação é a similaridade de cosseno.
+        """
+        exata = self._resposta_exata(pergunta, k, filtro)
+        if exata:
+            return exata
         query_emb = self.embed_text(pergunta).reshape(1, -1)
-        D, I = self.index.search(query_emb, k)
-        return [self.meta[i] for i in I[0] if i < len(self.meta)]
+        if not BUSCA_HIBRIDA or not self.chunks.fts:
+            D, I = self.search(query_emb, k, nprobe=nprobe, ef_search=ef_search, filtro=filtro)
+            return self._pontuar(D[0], I[0])
+        candidatos = max(k, BUSCA_CANDIDATOS)
+        _, I = self.search(query_emb, candidatos, nprobe=nprobe, ef_search=ef_search, filtro=filtro)
+        return self._fundir(I[0], self.chunks.buscar_texto(consulta_fts(pergunta), candidatos, filtro), k)
+
+    def query(self, pergunta: str, k: int = 3, nprobe: int = None, ef_search: int = None, filtro: FiltroBusca = None):
+        return [chunk.texto for _, chunk in self.consultar(pergunta, k, nprobe, ef_search, filtro)]
+
+    def obter_chunks(self, ids) -> dict[int, Chunk]:
+        """Texto e metadados (manual, URL, tokens, hash) só dos ids pedidos."""
+        return self.chunks.obter(ids)
+
+    async def aembed_text(self, texto: str):
+        return await agerar_embedding(texto)
+
+    async def asearch(self, query_emb: np.ndarray, k: int, nprobe: int = None, ef_search: int = None,
+                      filtro: FiltroBusca = None):
+        """Versão assíncrona de search; a busca FAISS roda no pool de threads."""
+        return await em_thread(self.search, query_emb, k, nprobe=nprobe, ef_search=ef_search, filtro=filtro)
+
+    async def abuscar_por_limiar(self, query_emb: np.ndarray, limiar: float, max_resultados: int,
+                                 nprobe: int = None, ef_search: int = None, filtro: FiltroBusca = None):
+        return await em_thread(
+            self.buscar_por_limiar, query_emb, limiar, max_resultados,
+            nprobe=nprobe, ef_search=ef_search, filtro=filtro
+        )
+
+    @medido("rag", "consultar")
+    async def aconsultar(self, pergunta: str, k: int = 3, nprobe: int = None, ef_search: int = None,
+                         filtro: FiltroBusca = None) -> list[tuple[float, Chunk]]:
+        exata = await em_thread(self._resposta_exata, pergunta, k, filtro)
+        if exata:
+            return exata
+        if not BUSCA_HIBRIDA or not self.chunks.fts:
+            query_emb = (await self.aembed_text(pergunta)).reshape(1, -1)
+            D, I = await self.asearch(query_emb, k, nprobe=nprobe, ef_search=ef_search, filtro=filtro)
+            return await em_thread(self._pontuar, D[0], I[0])
+        candidatos = max(k, BUSCA_CANDIDATOS)
+        # A busca léxica roda enquanto o embedding da pergunta é gerado
+        query_emb, lexicos = await asyncio.gather(
+            self.aembed_text(pergunta),
+            em_thread(self.chunks.buscar_texto, consulta_fts(pergunta), candidatos, filtro)
+        )
+        _, I = await self.asearch(query_emb.reshape(1, -1), candidatos, nprobe=nprobe, ef_search=ef_search, filtro=filtro)
+        return await em_thread(self._fundir, I[0], lexicos, k)
+
+    async def aquery(self, pergunta: str, k: int = 3, nprobe: int = None, ef_search: int = None,
+                     filtro: FiltroBusca = None):
+        return [chunk.texto for _, chunk in await self.aconsultar(pergunta, k, nprobe, ef_search, filtro)]
+
 
-rag_memory = RAGMemory()
+@preguicoso("rag_memory")
+def obter_rag_memory() -> RAGMemory:
+    """
+    Índice e metadados são lidos do disco no primeiro uso, não no import. No modo escritor
+    o processo também atende a FilaIngestao, para quem não pode escrever enquanto ele
+    detém a trava (ex.: python -m utils.ingerir_manuais com a API no ar).
+    """
+    rag = RAGMemory()
+    if not rag.somente_leitura:
+        from utils.escritor_indice import atender_fila
+        threading.Thread(
+            target=atender_fila, args=(rag, FilaIngestao(), threading.Event()), name="fila-ingestao", daemon=True
+        ).start()
+    return rag
@@ -1,63 +1,182 @@
 import sqlite3
+import threading
 import numpy as np
-from openai import OpenAI
-from configuracoes.config import API_KEY, DB_PATH, EMBEDDING_MODEL
-
-client = OpenAI(api_key=API_KEY)
-
-# Cria tabela
-with sqlite3.connect(DB_PATH) as conn:
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS manuais (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            titulo TEXT NOT NULL,
-            url TEXT NOT NULL UNIQUE,
-            embedding BLOB
-        )
-    """)
-    conn.commit()
+from utils.embeddings import gerar_embedding, gerar_embeddings, agerar_embedding
+from utils.assincrono import em_thread
+from utils.inicializacao import preguicoso
+from utils.quantizacao import codificar, decodificar
+from utils.metricas import medido
+from configuracoes.config import DB_PATH, EMBED_QUANTIZACAO
+
+def _criar_tabela():
+    with sqlite3.connect(DB_PATH) as conn:
+        c = conn.cursor()
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS manuais (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                titulo TEXT NOT NULL,
+                url TEXT NOT NULL UNIQUE,
+                embedding BLOB,
+                embedding_formato TEXT
+            )
+        """)
+        colunas = {linha[1] for linha in c.execute("PRAGMA table_info(manuais)")}
+        if "embedding_formato" not in colunas:
+            # NULL = float32, o formato das linhas gravadas antes da quantização
+            c.execute("ALTER TABLE manuais ADD COLUMN embedding_formato TEXT")
+        conn.commit()
+
+class MatrizManuais:
+    """
+    Cache em memória dos embeddings de título dos manuais, já normalizados, numa
+    matriz NumPy com os arrays de id/título/url ao lado. É recarregada quando outra
+    conexão altera o banco (PRAGMA data_version) e recebe inclusões locais por append.
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._versao = None
+        self.matriz = None
+        self.ids, self.titulos, self.urls = [], [], []
+
+    def _versao_atual(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    @staticmethod
+    def _normalizar(vetores: np.ndarray) -> np.ndarray:
+        normas = np.linalg.norm(vetores, axis=-1, keepdims=True)
+        return vetores / np.maximum(normas, 1e-12)
+
+    def _carregar(self):
+        rows = self._conn.execute(
+            "SELECT id, titulo, url, embedding, embedding_formato FROM manuais WHERE embedding IS NOT NULL ORDER BY id"
+        ).fetchall()
+        self._versao = self._versao_atual()
+        self.ids = [r[0] for r in rows]
+        self.titulos = [r[1] for r in rows]
+        self.urls = [r[2] for r in rows]
+        if rows:
+            self.matriz = self._normalizar(np.vstack([decodificar(r[3], r[4]) for r in rows]))
+        else:
+            self.matriz = None
+
+    def anexar(self, id_: int, titulo: str, url: str, embedding: np.ndarray):
+        """Inclui um manual recém-inserido sem reler a tabela."""
+        with self._lock:
+            if self.matriz is None or self._versao is None:
+                self._versao = None  # ainda não carregada; a próxima busca lê tudo
+                return
+            linha = self._normalizar(embedding.reshape(1, -1))
+            self.matriz = np.vstack([self.matriz, linha])
+            self.ids.append(id_)
+            self.titulos.append(titulo)
+            self.urls.append(url)
+            self._versao = self._versao_atual()
+
+    def invalidar(self):
+        with self._lock:
+            self._versao = None
+
+    @medido("sqlite", "manuais_buscar")
+    def buscar(self, query_emb: np.ndarray, top_n: int = 3) -> list[tuple]:
+        """Similaridade de cosseno com todos os manuais num único produto matriz-vetor."""
+        with self._lock:
+            if self._versao is None or self._versao != self._versao_atual():
+                self._carregar()
+            matriz, ids, titulos, urls = self.matriz, self.ids, self.titulos, self.urls
+        if matriz is None or top_n <= 0:
+            return []
+        if matriz.shape[1] != query_emb.shape[-1]:
+            raise RuntimeError(
+                f"Embeddings dos manuais com dimensão {matriz.shape[1]} e da pergunta com {query_emb.shape[-1]}. "
+                "Rode python -m utils.migrar_embeddings."
+            )
 
-def gerar_embedding(texto: str):
-    resp = client.embeddings.create(model=EMBEDDING_MODEL, input=texto)
-    return np.array(resp.data[0].embedding, dtype="float32")
+        sims = matriz @ self._normalizar(query_emb.astype("float32"))
+        n = min(top_n, len(sims))
+        melhores = np.argpartition(-sims, n - 1)[:n]
+        melhores = melhores[np.argsort(-sims[melhores])]
+        return [(float(sims[i]), ids[i], titulos[i], urls[i]) for i in melhores]
 
-def inserir_manual_com_embedding(titulo: str, url: str):
+
+@preguicoso("manuais")
+def obter_matriz_manuais() -> MatrizManuais:
+    """Cria a tabela e a matriz de manuais no primeiro uso, não no import."""
+    _criar_tabela()
+    return MatrizManuais()
+
+
+def _conectar():
+    obter_matriz_manuais()  # garante que a tabela existe
+    return sqlite3.connect(DB_PATH)
+
+def inserir_manual_com_embedding(titulo: str, url: str) -> int:
+    """Insere o manual (se ainda não existir) e retorna o seu id."""
     embedding = gerar_embedding(titulo)
-    with sqlite3.connect(DB_PATH) as conn:
+    return _inserir_manual(titulo, url, embedding)
+
+async def ainserir_manual_com_embedding(titulo: str, url: str) -> int:
+    embedding = await agerar_embedding(titulo)
+    return await em_thread(_inserir_manual, titulo, url, embedding)
+
+@medido("sqlite", "manuais_inserir")
+def _inserir_manual(titulo: str, url: str, embedding: np.ndarray) -> int:
+    with _conectar() as conn:
         c = conn.cursor()
         try:
             c.execute(
-                "INSERT INTO manuais (titulo, url, embedding) VALUES (?, ?, ?)",
-                (titulo, url, embedding.tobytes())
+                "INSERT INTO manuais (titulo, url, embedding, embedding_formato) VALUES (?, ?, ?, ?)",
+                (titulo, url, codificar(embedding), EMBED_QUANTIZACAO)
             )
             conn.commit()
+            obter_matriz_manuais().anexar(c.lastrowid, titulo, url, embedding)
+            return c.lastrowid
         except sqlite3.IntegrityError:
             print(f"Manual já existe: {url}")
+            return c.execute("SELECT id FROM manuais WHERE url = ?", (url,)).fetchone()[0]
+
+@medido("sqlite", "manuais_inserir_lote")
+def inserir_manuais_com_embedding(manuais: list[tuple[str, str]]) -> dict[str, int]:
+    """
+    Insere vários manuais (titulo, url) gerando os embeddings dos títulos em lote, numa
+    única transação. Retorna {url: id}, inclusive dos que já existiam.
+    """
+    if not manuais:
+        return {}
+    embeddings = gerar_embeddings([titulo for titulo, _ in manuais])
+    urls = [url for _, url in manuais]
+    with _conectar() as conn:
+        c = conn.cursor()
+        c.executemany(
+            "INSERT OR IGNORE INTO manuais (titulo, url, embedding, embedding_formato) VALUES (?, ?, ?, ?)",
+            [(titulo, url, codificar(emb), EMBED_QUANTIZACAO) for (titulo, url), emb in zip(manuais, embeddings)]
+        )
+        ids = {}
+        for i in range(0, len(urls), 500):
+            bloco = urls[i:i + 500]
+            c.execute(f"SELECT url, id FROM manuais WHERE url IN ({','.join('?' * len(bloco))})", bloco)
+            ids.update(c.fetchall())
+        conn.commit()
+    obter_matriz_manuais().invalidar()
+    return ids
 
 def buscar_manual_por_pergunta_vetorial(pergunta: str, top_n: int = 3):
     query_emb = gerar_embedding(pergunta)
-    resultados = []
+    return obter_matriz_manuais().buscar(query_emb, top_n)
 
-    with sqlite3.connect(DB_PATH) as conn:
-        c = conn.cursor()
-        c.execute("SELECT id, titulo, url, embedding FROM manuais")
-        rows = c.fetchall()
-        for id_, titulo, url, emb_blob in rows:
-            emb = np.frombuffer(emb_blob, dtype="float32")
-            sim = np.dot(query_emb, emb) / (np.linalg.norm(query_emb) * np.linalg.norm(emb))
-            resultados.append((sim, id_, titulo, url))
-    
-    resultados.sort(reverse=True, key=lambda x: x[0])
-    return resultados[:top_n]
+async def abuscar_manual_por_pergunta_vetorial(pergunta: str, top_n: int = 3):
+    query_emb = await agerar_embedding(pergunta)
+    return await em_thread(lambda: obter_matriz_manuais().buscar(query_emb, top_n))
 
 def buscar_manual_por_id(id_: int):
-    with sqlite3.connect(DB_PATH) as conn:
+    with _conectar() as conn:
         c = conn.cursor()
-        c.execute("SELECT id, titulo, url, embedding FROM manuais WHERE id = ?", (id_,))
+        c.execute("SELECT id, titulo, url, embedding, embedding_formato FROM manuais WHERE id = ?", (id_,))
         row = c.fetchone()
         if row:
-            id_, titulo, url, emb_blob = row
-            emb = np.frombuffer(emb_blob, dtype="float32")
+            id_, titulo, url, emb_blob, formato = row
+            emb = decodificar(emb_blob, formato)
             return id_, titulo, url, emb
         return None
\ No newline at end of file
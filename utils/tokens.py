@@ -0,0 +1,13 @@
+from utils.inicializacao import preguicoso
+from configuracoes.config import TOKENIZER_ENCODING
+
+
+@preguicoso("tokenizador")
+def obter_tokenizador():
+    """Encoder tiktoken compartilhado por todos os módulos (carregar o BPE custa caro)."""
+    import tiktoken
+    return tiktoken.get_encoding(TOKENIZER_ENCODING)
+
+
+def contar_tokens(texto: str) -> int:
+    return len(obter_tokenizador().encode(texto))
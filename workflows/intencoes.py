@@ -0,0 +1,99 @@
+import re
+from typing import NamedTuple
+import numpy as np
+from AgenteLang.categorias_intencao import categorias_intencao
+from configuracoes.prompts import Prompts
+from configuracoes.config import ROTEADOR_LIMIAR, ROTEADOR_MARGEM
+from utils.embeddings import gerar_embedding, gerar_embeddings
+from utils.inicializacao import preguicoso
+from utils.metricas import medido
+
+# Intenções que precisam de uma ferramenta (busca na web, APIs externas); as demais vão para a síntese
+ROTAS_INTENCOES = {"busca_google": "tools_node", "apis": "tools_node", "buscas_geral": "tools_node"}
+ROTA_PADRAO = "sintese_node"
+
+# Perguntas típicas de cada intenção; junto com as descrições, definem os centróides
+EXEMPLOS_INTENCOES = {
+    "busca_google": ["pesquise na internet", "procure na web as notícias mais recentes sobre", "qual a cotação do dólar hoje"],
+    "buscas_geral": ["busque no site da Receita Federal", "procure informações gerais sobre este assunto"],
+    "apis": ["consulte a API do Google", "chame a API da OpenAI para gerar"],
+    "busca_vetorial": ["como configuro o cadastro de produtos no sistema", "onde fica no manual a emissão de nota fiscal"],
+    "contabilidade": ["qual CFOP usar na venda para outro estado", "como fazer a apuração do ICMS do mês"],
+    "assistencia_gestão": ["como gerar o relatório de vendas do mês", "como acompanho as contas a pagar no sistema"],
+    "assistencia_tecnica": ["o sistema dá erro ao abrir a tela", "não consigo fazer login no sistema"],
+    "assistencia+de_banco_de_dados": ["quantos clientes estão cadastrados no banco", "por que este registro não aparece na consulta"],
+    "analise_multimodal": ["analise esta imagem", "transcreva este áudio"],
+    "outros": ["oi, tudo bem?", "obrigado pela ajuda"],
+}
+
+
+def _intencoes_do_prompt(prompt: str) -> dict[str, str]:
+    """{intenção: descrição} das linhas "- 'nome': descrição" do prompt de detecção."""
+    return {nome: descricao.strip() for nome, descricao in re.findall(r"-\s*'([^']+)':\s*(.+)", prompt)}
+
+
+def descricoes_intencoes() -> dict[str, list[str]]:
+    """Textos de cada intenção: descrições do prompt e de categorias_intencao, mais os exemplos."""
+    textos = {}
+    for origem in (_intencoes_do_prompt(Prompts.DETECCAO_DE_INTENCOES), categorias_intencao):
+        for nome, descricao in origem.items():
+            textos.setdefault(nome, []).append(descricao)
+    for nome, exemplos in EXEMPLOS_INTENCOES.items():
+        textos.setdefault(nome, []).extend(exemplos)
+    return textos
+
+
+class Classificacao(NamedTuple):
+    intencao: str
+    rota: str
+    similaridade: float
+    margem: float  # vantagem da rota escolhida sobre a melhor intenção da outra rota
+
+    @property
+    def confiavel(self) -> bool:
+        return self.similaridade >= ROTEADOR_LIMIAR and self.margem >= ROTEADOR_MARGEM
+
+
+class RoteadorIntencoes:
+    """
+    Classifica a entrada pela similaridade de cosseno com o centróide de cada intenção.
+    Os centróides saem dos embeddings das descrições e exemplos (cache em disco, então só
+    a primeira execução chama a API); cada classificação custa um embedding, também em cache,
+    e um produto matriz-vetor.
+    """
+
+    def __init__(self, textos: dict[str, list[str]] = None, rotas: dict[str, str] = ROTAS_INTENCOES):
+        textos = textos or descricoes_intencoes()
+        self.intencoes = list(textos)
+        self.rotas = [rotas.get(nome, ROTA_PADRAO) for nome in self.intencoes]
+        todos = [texto for nome in self.intencoes for texto in textos[nome]]
+        vetores = self._normalizar(gerar_embeddings(todos))
+        centroides, inicio = [], 0
+        for nome in self.intencoes:
+            fim = inicio + len(textos[nome])
+            centroides.append(vetores[inicio:fim].mean(axis=0))
+            inicio = fim
+        self.centroides = self._normalizar(np.array(centroides, dtype="float32"))
+
+    @staticmethod
+    def _normalizar(vetores: np.ndarray) -> np.ndarray:
+        return vetores / np.maximum(np.linalg.norm(vetores, axis=-1, keepdims=True), 1e-12)
+
+    def classificar(self, texto: str) -> Classificacao:
+        sims = self.centroides @ self._normalizar(gerar_embedding(texto).astype("float32"))
+        melhor = int(np.argmax(sims))
+        rota = self.rotas[melhor]
+        outras = [s for s, r in zip(sims, self.rotas) if r != rota]
+        margem = float(sims[melhor] - max(outras)) if outras else 1.0
+        return Classificacao(self.intencoes[melhor], rota, float(sims[melhor]), margem)
+
+    @medido("roteador", "local")
+    def rotear(self, texto: str) -> str | None:
+        """Rota ("tools_node" ou "sintese_node"), ou None se a confiança for baixa."""
+        classificacao = self.classificar(texto)
+        return classificacao.rota if classificacao.confiavel else None
+
+
+@preguicoso("roteador_intencoes")
+def obter_roteador_intencoes() -> RoteadorIntencoes:
+    return RoteadorIntencoes()
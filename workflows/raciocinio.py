@@ -9,6 +9,9 @@ from configuracoes.settings import Settings
 from configuracoes.prompts import Prompts 
 from tools.web_tool import procura_web
 from agentes.sintese_e_resposta import criar_agente_sintese
+from utils.metricas import medido
+from utils.metricas_llm import callback_llm
+from workflows.intencoes import obter_roteador_intencoes
 
 
 # Definição do estado do agente do grafo
@@ -20,33 +23,45 @@ class AgentState(TypedDict):
 
 
 #definir os nós do grafo
-llm = ChatOpenAI(temperature=0, model="gpt-4o", api_key=Settings.OPENAI_API_KEY)
+llm = ChatOpenAI(temperature=0, model="gpt-4o", api_key=Settings.OPENAI_API_KEY, callbacks=[callback_llm])
 
 #ferramentas do agente aos nós
 tools=[procura_web]
 rendered_tools = render_text_description(tools)
 
 #nós de detecção de intenções(Roteador)
-def No_intent(state: AgentState) -> AgentState:
-    """
-    Nó de detecção de intenções(Roteador).
-    """
+@medido("roteador", "llm")
+def _rotear_com_llm(entrada: str) -> str:
+    """Roteamento pelo LLM, usado quando o roteador local não tem confiança suficiente."""
     prompt_roteamento = PromptTemplate(
     template = Prompts.AGENTE_ROTEADOR,
     input_variables=["input", "tools"]
     
 )
     chain_roteamento = prompt_roteamento | llm
-    resultado = chain_roteamento.invoke({"input": state['input'], "tools": rendered_tools})
+    resultado = chain_roteamento.invoke({"input": entrada, "tools": rendered_tools})
 
-    # Atualizar o estado com o resultado do roteamento
     if "ferramenta" in resultado.content.lower():
-        state['agent_outcome'] = "tools_node"
-    else:
-        state['agent_outcome'] = "sintese_node"
-    
+        return "tools_node"
+    return "sintese_node"
+
+@medido("no", "No_intent")
+def No_intent(state: AgentState) -> AgentState:
+    """
+    Nó de detecção de intenções(Roteador). Classifica a entrada pelos centróides das
+    intenções (embeddings em cache, milissegundos); o LLM só decide quando a confiança é baixa.
+    """
+    rota = None
+    try:
+        rota = obter_roteador_intencoes().rotear(state['input'])
+    except Exception as e:
+        print(f"[AVISO] Roteador local de intenções indisponível: {e}")
+
+    # Atualizar o estado com o resultado do roteamento
+    state['agent_outcome'] = rota or _rotear_com_llm(state['input'])
     return state
 
+@medido("no", "tools_node")
 def tools_node(state: AgentState) -> AgentState:
     """
     Nó de execução de ferramentas.
@@ -59,6 +74,7 @@ def tools_node(state: AgentState) -> AgentState:
     return state
 
 #nó de execução de ferramentas
+@medido("no", "sintese_node")
 def sintese_node(state: AgentState) -> AgentState:
     """
     Nó de execução de ferramentas, gerção de resposta final para o usuário.